@@ -26,35 +26,47 @@
 #
 
 
+import sys
+
+# batch mode runs without Qt, so hand it off before anything imports it
+if __name__ == '__main__' and sys.argv[1:2] == ['batch']:
+    import runpy
+    del sys.argv[1]
+    runpy.run_module('brbatch', run_name='__main__', alter_sys=True)
+
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 from collections import OrderedDict
 from copy import deepcopy
 
-import traceback, sys
-import struct, os, subprocess, platform, webbrowser, urllib, re, shutil
+import traceback, sys, bisect, io, threading, json, sqlite3, stat, hashlib
+import os, subprocess, platform, webbrowser, urllib, re, shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 import psutil
 
+import brcore
+from brcore import *
+
 
 ########################
 #       XML Data       #
 ########################
 
-def getEntityXML():
-    tree = ET.parse('resources/EntitiesAfterbirthPlus.xml')
-    root = tree.getroot()
+class EntityRegistry(brcore.EntityRegistry):
 
-    return root
+    def definition(self, t, v, s):
+        '''Returns the Entity.Definition shared by every entity with this type, variant, and subtype'''
 
-def getStageXML():
-    tree = ET.parse('resources/StagesAfterbirthPlus.xml')
-    root = tree.getroot()
+        key = (int(t), int(v), int(s))
+        definition = self.definitions.get(key)
+        if definition is None:
+            definition = self.definitions[key] = Entity.Definition(*key, self.find(*key))
 
-    return root
+        return definition
 
 def findInstallPath():
     installPath = ''
@@ -175,28 +187,142 @@ def findModsPath(installPath=None):
 
     return modsPath
 
-def linuxPathSensitivityTraining(path):
+class PathResolver:
+    '''Finds files whatever the case of their name, since mods are mostly written on case insensitive systems.
+    Each folder's listing is kept by case folded name, and only read again once the folder's modified time changes'''
 
-    path = path.replace("\\", "/")
+    def __init__(self):
+        # folder -> (modified time, { case folded name: name })
+        self.listings = {}
 
-    directory, file = os.path.split(os.path.normpath(path))
+    def folder(self, directory):
+        '''Returns the names in directory by their case folded form, or None if it isn't a folder'''
+        try:
+            st = os.stat(directory)
+            if not stat.S_ISDIR(st.st_mode):
+                return None
 
-    if not os.path.isdir(directory):
-        return None
+            listing = self.listings.get(directory)
+            if listing is None or listing[0] != st.st_mtime_ns:
+                names = {}
+                for item in os.listdir(directory):
+                    names.setdefault(item.casefold(), item)
 
-    contents = os.listdir(directory)
+                listing = self.listings[directory] = (st.st_mtime_ns, names)
 
-    for item in contents:
-        if item.lower() == file.lower():
-            return os.path.normpath(os.path.join(directory, item))
+            return listing[1]
+        except OSError:
+            return None
+
+    def resolve(self, path):
+        return self.resolveAll([ path ])[0]
+
+    def resolveAll(self, paths):
+        '''Resolves each path's file name against its folder, checking every folder once. A path whose folder
+        doesn't exist resolves to None, one with no file of that name is returned as is'''
+        folders = {}
+        resolved = []
+        for path in paths:
+            directory, file = os.path.split(os.path.normpath(path.replace("\\", "/")))
+
+            if directory not in folders:
+                folders[directory] = self.folder(directory)
 
-    return os.path.normpath(path)
+            names = folders[directory]
+            if names is None:
+                resolved.append(None)
+                continue
+
+            resolved.append(os.path.normpath(os.path.join(directory, names.get(file.casefold(), file))))
 
-def loadFromModXML(modPath, name, entRoot, resourcePath, fixIconFormat=False):
+        return resolved
+
+pathResolver = PathResolver()
+
+def linuxPathSensitivityTraining(path):
+    return pathResolver.resolve(path)
+
+class IconBuilder:
+    '''Draws entity icons from the first frame of their anm2 for mod autogen, on its own thread pool.
+    Each spritesheet is only decoded once no matter how many entities use it'''
+
+    def __init__(self, fixIconFormat=False):
+        self.fixIconFormat = fixIconFormat
+        self.pool = ThreadPoolExecutor()
+
+        # path -> [ lock, decoded image ]
+        self.sheets = {}
+        self.sheetsLock = threading.Lock()
+
+    def sheet(self, imgPath):
+        with self.sheetsLock:
+            entry = self.sheets.get(imgPath)
+            if entry is None:
+                entry = self.sheets[imgPath] = [ threading.Lock(), None ]
+
+        with entry[0]:
+            if entry[1] is None:
+                entry[1] = QImage(imgPath)
+                if self.fixIconFormat:
+                    entry[1].save(imgPath)
+
+            # a shallow copy of its own, QImage instances can't be shared between threads
+            return QImage(entry[1])
+
+    def submit(self, imgs, filename):
+        return self.pool.submit(self.build, imgs, filename)
+
+    def build(self, imgs, filename):
+        # Fetch each layer and establish the needed dimensions for the final image
+        layers = []
+        finalRect = QRect()
+        for imgPath, x, y, xc, yc, w, h, xs, ys, r, xp, yp in imgs:
+            cropRect = QRect(xc, yc, w, h)
+
+            mat = QTransform()
+            mat.rotate(r)
+            mat.scale(xs, ys)
+            mat.translate(xp, yp)
+
+            # Load the Image
+            sourceImage = self.sheet(imgPath).copy(cropRect).transformed(mat)
+
+            cropRect.moveTopLeft(QPoint())
+            cropRect = mat.mapRect(cropRect)
+            cropRect.translate(QPoint(x, y))
+            finalRect = finalRect.united(cropRect)
+            layers.append((sourceImage, cropRect))
+
+        # Create the destination
+        pixmapImg = QImage(finalRect.width(), finalRect.height(), QImage.Format_ARGB32)
+        pixmapImg.fill(0)
+
+        # Paint all the layers to it
+        RenderPainter = QPainter(pixmapImg)
+        for sourceImage, boundingRect in layers:
+            # Transfer the crop area to the pixmap
+            boundingRect.translate(-finalRect.topLeft())
+            RenderPainter.drawImage(boundingRect, sourceImage)
+        RenderPainter.end()
+
+        # Save it to a Temp file - better than keeping it in memory for user retrieval purposes?
+        pixmapImg.save(filename, "PNG")
+
+    def shutdown(self):
+        self.pool.shutdown()
+        self.sheets = {}
+
+def fileStamp(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def loadFromModXML(modPath, name, entRoot, resourcePath, fixIconFormat=False, icons=None):
 
     cleanUp = re.compile('[^\w\d]')
     outputDir = f"resources/Entities/ModTemp/{cleanUp.sub('', name)}"
-    if not os.path.isdir(outputDir): os.mkdir(outputDir)
+    os.makedirs(outputDir, exist_ok=True)
 
     anm2root = entRoot.get("anm2root")
 
@@ -209,6 +335,33 @@ def loadFromModXML(modPath, name, entRoot, resourcePath, fixIconFormat=False):
 
     print(f'-----------------------\nLoading entities from "{name}"')
 
+    ownIcons = icons is None
+    if ownIcons:
+        icons = IconBuilder(fixIconFormat)
+
+    resDir = os.path.join(outputDir, 'icons')
+    os.makedirs(resDir, exist_ok=True)
+
+    # icon -> the anm2 and spritesheets it was drawn from, with their modified times, so icons
+    # are only drawn again when one of those changes. Format fixes have to load every sheet regardless
+    manifestPath = os.path.join(resDir, 'icons.json')
+    manifest = {}
+    if not fixIconFormat:
+        try:
+            with open(manifestPath) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    newManifest = {}
+    builds = []
+
+    def iconCurrent(filename, anmPath):
+        entry = manifest.get(filename)
+        return entry is not None and entry['anm2'] == [ anmPath, fileStamp(anmPath) ] \
+            and all(fileStamp(sheet) == stamp for sheet, stamp in entry['sheets']) \
+            and os.path.isfile(filename)
+
     def mapEn(en):
         # Fix some shit
         i = int(en.get("id"))
@@ -231,100 +384,70 @@ def loadFromModXML(modPath, name, entRoot, resourcePath, fixIconFormat=False):
                 print('Skipping: Invalid anm2!')
                 return None
 
-        anm2Dir, anm2File = os.path.split(anmPath)
+        filename = os.path.join(resDir, f'{en.get("id")}.{v}.{s} - {en.get("name")}.png')
 
-        # Grab the first frame of the anm
-        anmTree = ET.parse(anmPath)
-        spritesheets = anmTree.findall(".Content/Spritesheets/Spritesheet")
-        layers = anmTree.findall(".Content/Layers/Layer")
-        default = anmTree.find("Animations").get("DefaultAnimation")
-
-        anim = anmTree.find(f"./Animations/Animation[@Name='{default}']")
-        framelayers = anim.findall(".//LayerAnimation[Frame]")
-
-        imgs = []
-        ignoreCount = 0
-        for layer in framelayers:
-            if layer.get('Visible') == 'false':
-                ignoreCount += 1
-                continue
+        if filename in newManifest:
+            pass # another entry for the same entity already drew it
+        elif iconCurrent(filename, anmPath):
+            newManifest[filename] = manifest[filename]
+        else:
+            anmStamp = fileStamp(anmPath)
+            anm2Dir, anm2File = os.path.split(anmPath)
+
+            # Grab the first frame of the anm
+            anmTree = ET.parse(anmPath)
+            spritesheets = anmTree.findall(".Content/Spritesheets/Spritesheet")
+            layers = anmTree.findall(".Content/Layers/Layer")
+            default = anmTree.find("Animations").get("DefaultAnimation")
+
+            anim = anmTree.find(f"./Animations/Animation[@Name='{default}']")
+            framelayers = anim.findall(".//LayerAnimation[Frame]")
+
+            imgs = []
+            ignoreCount = 0
+            for layer in framelayers:
+                if layer.get('Visible') == 'false':
+                    ignoreCount += 1
+                    continue
 
-            frame = layer.find('Frame')
-            if frame.get('Visible') == 'false':
-                ignoreCount += 1
-                continue
+                frame = layer.find('Frame')
+                if frame.get('Visible') == 'false':
+                    ignoreCount += 1
+                    continue
 
-            sheetPath = spritesheets[int(layers[int(layer.get("LayerId"))].get("SpritesheetId"))].get("Path")
-            image = os.path.abspath(os.path.join(anm2Dir, sheetPath))
-            imgPath = linuxPathSensitivityTraining(image)
-            if not (imgPath and os.path.isfile(imgPath)):
-                image = re.sub(r'.*resources', resourcePath, image)
+                sheetPath = spritesheets[int(layers[int(layer.get("LayerId"))].get("SpritesheetId"))].get("Path")
+                image = os.path.abspath(os.path.join(anm2Dir, sheetPath))
                 imgPath = linuxPathSensitivityTraining(image)
-
-            if imgPath and os.path.isfile(imgPath):
-                # Here's the anm specs
-                xp = -int(frame.get("XPivot")) # applied before rotation
-                yp = -int(frame.get("YPivot"))
-                r = int(frame.get("Rotation"))
-                x = int(frame.get("XPosition")) # applied after rotation
-                y = int(frame.get("YPosition"))
-                xc = int(frame.get("XCrop"))
-                yc = int(frame.get("YCrop"))
-                #xs = float(frame.get("XScale")) / 100
-                #ys = float(frame.get("YScale")) / 100
-                xs, ys = 1, 1 # this ended up being a bad idea since it's usually used for squash and stretch
-                w = int(frame.get("Width"))
-                h = int(frame.get("Height"))
-
-                imgs.append([imgPath, x, y, xc, yc, w, h, xs, ys, r, xp, yp])
-
-        filename = "resources/Entities/questionmark.png"
-        if len(imgs) == 0:
-            print(f'Entity Icon could not be generated due to {ignoreCount > 0 and "visibility" or "missing files"}')
-        else:
-
-            # Fetch each layer and establish the needed dimensions for the final image
-            finalRect = QRect()
-            for img in imgs:
-                imgPath, x, y, xc, yc, w, h, xs, ys, r, xp, yp = img
-                cropRect = QRect(xc, yc, w, h)
-
-                mat = QTransform()
-                mat.rotate(r)
-                mat.scale(xs, ys)
-                mat.translate(xp, yp)
-
-                # Load the Image
-                qimg = QImage(imgPath)
-                sourceImage = qimg.copy(cropRect).transformed(mat)
-                img.append(sourceImage)
-
-                if fixIconFormat:
-                    qimg.save(imgPath)
-
-                cropRect.moveTopLeft(QPoint())
-                cropRect = mat.mapRect(cropRect)
-                cropRect.translate(QPoint(x, y))
-                finalRect = finalRect.united(cropRect)
-                img.append(cropRect)
-
-            # Create the destination
-            pixmapImg = QImage(finalRect.width(), finalRect.height(), QImage.Format_ARGB32)
-            pixmapImg.fill(0)
-
-            # Paint all the layers to it
-            RenderPainter = QPainter(pixmapImg)
-            for imgPath, x, y, xc, yc, w, h, xs, ys, r, xp, yp, sourceImage, boundingRect in imgs:
-                # Transfer the crop area to the pixmap
-                boundingRect.translate(-finalRect.topLeft())
-                RenderPainter.drawImage(boundingRect, sourceImage)
-            RenderPainter.end()
-
-            # Save it to a Temp file - better than keeping it in memory for user retrieval purposes?
-            resDir = os.path.join(outputDir, 'icons')
-            if not os.path.isdir(resDir): os.mkdir(resDir)
-            filename = os.path.join(resDir, f'{en.get("id")}.{v}.{s} - {en.get("name")}.png')
-            pixmapImg.save(filename, "PNG")
+                if not (imgPath and os.path.isfile(imgPath)):
+                    image = re.sub(r'.*resources', resourcePath, image)
+                    imgPath = linuxPathSensitivityTraining(image)
+
+                if imgPath and os.path.isfile(imgPath):
+                    # Here's the anm specs
+                    xp = -int(frame.get("XPivot")) # applied before rotation
+                    yp = -int(frame.get("YPivot"))
+                    r = int(frame.get("Rotation"))
+                    x = int(frame.get("XPosition")) # applied after rotation
+                    y = int(frame.get("YPosition"))
+                    xc = int(frame.get("XCrop"))
+                    yc = int(frame.get("YCrop"))
+                    #xs = float(frame.get("XScale")) / 100
+                    #ys = float(frame.get("YScale")) / 100
+                    xs, ys = 1, 1 # this ended up being a bad idea since it's usually used for squash and stretch
+                    w = int(frame.get("Width"))
+                    h = int(frame.get("Height"))
+
+                    imgs.append([imgPath, x, y, xc, yc, w, h, xs, ys, r, xp, yp])
+
+            if len(imgs) == 0:
+                print(f'Entity Icon could not be generated due to {ignoreCount > 0 and "visibility" or "missing files"}')
+                filename = "resources/Entities/questionmark.png"
+            else:
+                newManifest[filename] = {
+                    'anm2': [ anmPath, anmStamp ],
+                    'sheets': [ [ sheet, fileStamp(sheet) ] for sheet in sorted({ img[0] for img in imgs }) ]
+                }
+                builds.append(icons.submit(imgs, filename))
 
         # Write the modded entity to the entityXML temporarily for runtime
         etmp = ET.Element("entity")
@@ -359,7 +482,20 @@ def loadFromModXML(modPath, name, entRoot, resourcePath, fixIconFormat=False):
 
         return etmp
 
-    result = list(filter(lambda x: x != None, map(mapEn, enList)))
+    try:
+        result = list(filter(lambda x: x != None, map(mapEn, enList)))
+
+        # the icons have to be on disk before anything shows them
+        for build in builds:
+            build.result()
+    finally:
+        if ownIcons:
+            icons.shutdown()
+
+    try:
+        writeFileAtomic(manifestPath, lambda f: f.write(json.dumps(newManifest, indent=1).encode()))
+    except OSError as e:
+        print('Could not save icon manifest:', e)
 
     outputRoot = ET.Element('data')
     outputRoot.extend(result)
@@ -389,9 +525,22 @@ def loadFromMod(modPath, brPath, name, entRoot, fixIconFormat=False):
     if len(enList) == 0:
         return
 
+    # entities2 entries by id and variant, with and without subtype; first entry wins like find()
+    entities2 = {}
+    for entry in entRoot.findall('entity'):
+        i, v, s = entry.get('id'), entry.get('variant'), entry.get('subtype')
+        if i is None or v is None: continue
+
+        entities2.setdefault((i, v), entry)
+        if s is not None:
+            entities2.setdefault((i, v, s), entry)
+
+    images = [ os.path.join(brPath, en.get('Image')) for en in enList if en.get('Image') ]
+    images = dict(zip(images, pathResolver.resolveAll(images)))
+
     cleanUp = re.compile('[^\w\d]')
     def mapEn(en):
-        imgPath = en.get('Image') and linuxPathSensitivityTraining(os.path.join(brPath, en.get('Image')))
+        imgPath = en.get('Image') and images[os.path.join(brPath, en.get('Image'))]
 
         i = en.get('ID')
         v = en.get('Variant') or '0'
@@ -401,13 +550,12 @@ def loadFromMod(modPath, brPath, name, entRoot, fixIconFormat=False):
 
         if en.get('Metadata') != '1':
             adjustedId = i == '999' and '1000' or i
-            query = f"entity[@id='{adjustedId}'][@variant='{v}']"
 
             validMissingSubtype = False
 
-            entXML = entRoot.find(query + f"[@subtype='{s}']")
+            entXML = entities2.get((adjustedId, v, s))
             if entXML is None:
-                entXML = entRoot.find(query)
+                entXML = entities2.get((adjustedId, v))
                 validMissingSubtype = entXML is not None
 
             if entXML == None:
@@ -458,6 +606,9 @@ def loadStagesFromMod(modPath, brPath, name):
     stageList = root.findall('stage')
     if len(stageList) == 0: return
 
+    prefixes = [ os.path.join(brPath, stage.get('BGPrefix')) for stage in stageList if stage.get('BGPrefix') is not None ]
+    prefixes = dict(zip(prefixes, pathResolver.resolveAll(prefixes)))
+
     def mapStage(stage):
         if stage.get('Stage') is None or stage.get('StageType') is None or stage.get('Name') is None:
             print('Tried to load stage, but had missing stage, stage type, or name!', str(stage.attrib))
@@ -465,15 +616,181 @@ def loadStagesFromMod(modPath, brPath, name):
 
         prefix = stage.get('BGPrefix')
         if prefix is not None:
-            prefixPath = linuxPathSensitivityTraining(os.path.join(brPath, prefix))
+            prefixPath = prefixes[os.path.join(brPath, prefix)]
             stage.set('BGPrefix', prefixPath)
 
         return stage
 
     return list(filter(lambda x: x != None, map(mapStage, stageList)))
 
+class ThreadOutput:
+    '''Stands in for stdout while work runs on a thread pool. Prints from a thread inside capture()
+    go to that call's buffer, so the messages can come out together and in order afterwards'''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, s):
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer or self.stream).write(s)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def capture(self, func, *args):
+        '''Runs func, returns its result and everything it printed'''
+        self.local.buffer = io.StringIO()
+        try:
+            return func(*args), self.local.buffer.getvalue()
+        except:
+            self.stream.write(self.local.buffer.getvalue())
+            raise
+        finally:
+            self.local.buffer = None
+
+def loadMod(modPath, brPath, mod, autogenerate, resourcePath, fixIconFormat, icons=None):
+    '''Reads a mod's entities and stages, returns (name, entities, stages).
+    Runs on a worker thread, so this only reads; loadMods adds the results to the registry'''
+
+    # Get the mod name
+    modName = mod
+    try:
+        tree = ET.parse(os.path.join(modPath, 'metadata.xml'))
+        root = tree.getroot()
+        modName = root.find("name").text
+    except ET.ParseError:
+        print(f'Failed to parse mod metadata "{modName}", falling back on default name')
+
+    # add dedicated entities
+    entPath = os.path.join(modPath, 'content/entities2.xml')
+    if not os.path.exists(entPath):
+        return modName, None, None
+
+    # Grab their Entities2.xml
+    entRoot = None
+    try:
+        entRoot = ET.parse(entPath).getroot()
+    except ET.ParseError as e:
+        print(f'ERROR parsing entities2 xml for mod "{modName}": {e}')
+        return modName, None, None
+
+    ents = None
+    if autogenerate:
+        ents = loadFromModXML(modPath, modName, entRoot, resourcePath, fixIconFormat=fixIconFormat, icons=icons)
+    else:
+        ents = loadFromMod(modPath, brPath, modName, entRoot, fixIconFormat=fixIconFormat)
+
+    stages = loadStagesFromMod(modPath, brPath, modName)
+
+    return modName, ents, stages
+
+class ModCache:
+    '''Entities and stages read from mods on earlier launches, so unchanged mods skip the xml entirely.
+    An entry is only used while every file it was read from, and every folder its images were found in,
+    has the same modified time and size as when it was stored'''
+
+    # bump whenever the loaders change what they produce
+    Version = 1
+
+    def __init__(self, path):
+        self.db = None
+
+        # it's only a cache, so a damaged one gets started over
+        for attempt in range(2):
+            try:
+                self.db = sqlite3.connect(path)
+                self.db.execute('''CREATE TABLE IF NOT EXISTS mods (
+                    path TEXT PRIMARY KEY, version INTEGER, deps TEXT,
+                    name TEXT, entities TEXT, stages TEXT, log TEXT)''')
+                return
+            except sqlite3.Error as e:
+                if self.db: self.db.close()
+                self.db = None
+
+                if attempt == 0 and os.path.isfile(path):
+                    print('Rebuilding mod cache:', e)
+                    try:
+                        os.remove(path)
+                        continue
+                    except OSError:
+                        pass
+
+                print('Mod cache unavailable, loading every mod:', e)
+                return
+
+    @staticmethod
+    def sources(modPath, brPath):
+        return [
+            os.path.join(modPath, 'metadata.xml'),
+            os.path.join(modPath, 'content/entities2.xml'),
+            os.path.join(brPath, 'EntitiesMod.xml'),
+            os.path.join(brPath, 'StagesMod.xml')
+        ]
+
+    def stamps(self, paths):
+        '''path -> [ modified time, size ], or None if it doesn't exist'''
+        stamps = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+                stamps[path] = [ st.st_mtime_ns, st.st_size ]
+            except OSError:
+                stamps[path] = None
+        return stamps
+
+    def get(self, modPath):
+        '''Returns (name, entities, stages, log) if the mod is unchanged since it was cached'''
+        if not self.db: return None
+
+        try:
+            row = self.db.execute('SELECT version, deps, name, entities, stages, log FROM mods WHERE path = ?', (modPath,)).fetchone()
+        except sqlite3.Error as e:
+            print('Error reading mod cache:', e)
+            return None
+
+        if not row or row[0] != ModCache.Version: return None
+
+        deps = json.loads(row[1])
+        if self.stamps(deps) != deps: return None
+
+        def build(tag, rows):
+            return rows and [ ET.Element(tag, attrib) for attrib in rows ]
+
+        return row[2], build('entity', json.loads(row[3])), build('stage', json.loads(row[4])), row[5]
+
+    def put(self, modPath, deps, name, ents, stages, log):
+        if not self.db: return
+
+        # images are looked up case insensitively, so renaming one changes what they resolve to
+        folders = { os.path.dirname(en.get('Image')) for en in ents or [] if en.get('Image') } \
+                | { os.path.dirname(stage.get('BGPrefix')) for stage in stages or [] if stage.get('BGPrefix') }
+        deps = { **deps, **self.stamps(sorted(folders)) }
+
+        def rows(elements):
+            return elements and [ dict(el.attrib) for el in elements ]
+
+        try:
+            self.db.execute('INSERT OR REPLACE INTO mods VALUES (?, ?, ?, ?, ?, ?, ?)', (
+                modPath, ModCache.Version, json.dumps(deps),
+                name, json.dumps(rows(ents)), json.dumps(rows(stages)), log))
+        except sqlite3.Error as e:
+            print('Error writing mod cache:', e)
+
+    def close(self):
+        if not self.db: return
+
+        try:
+            self.db.commit()
+            self.db.close()
+        except sqlite3.Error as e:
+            print('Error writing mod cache:', e)
+
 def loadMods(autogenerate, installPath, resourcePath):
-    global entityXML
+    global entityRegistry
     global stageXML
 
     # Each mod in the mod folder is a Group
@@ -490,7 +807,11 @@ def loadMods(autogenerate, installPath, resourcePath):
     if autogenerate and not os.path.exists(autogenPath):
         os.mkdir(autogenPath)
 
+    # autogen icons for every mod are drawn on one pool, sharing the spritesheets they load
+    icons = autogenerate and IconBuilder(fixIconFormat) or None
+
     print('LOADING MOD CONTENT')
+    mods = []
     for mod in modsInstalled:
         modPath = os.path.join(modsPath, mod)
         brPath = os.path.join(modPath, 'basementrenovator')
@@ -503,54 +824,266 @@ def loadMods(autogenerate, installPath, resourcePath):
         if not (autogenerate or os.path.exists(brPath)):
             continue
 
-        # Get the mod name
-        modName = mod
+        mods.append((modPath, brPath, mod, autogenerate, resourcePath, fixIconFormat, icons))
+
+    # mods that haven't changed since the last launch come straight out of the cache. Icon format
+    # fixes have to touch the files and autogen builds icons, so those always go through the xml
+    cache = None
+    if not (autogenerate or fixIconFormat or settings.value('DisableModCache') == '1'):
+        cache = ModCache(os.path.join(os.path.dirname(os.path.abspath(settings.fileName())), 'modcache.sqlite'))
+
+    # mods are read in parallel, but added in folder order, so the same mod wins when two
+    # of them define an entity. Each mod's messages are held back and printed in that order too
+    output = ThreadOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor() as pool:
+            jobs = []
+            for args in mods:
+                modPath, brPath = args[:2]
+                cached = cache and cache.get(modPath)
+                if cached:
+                    jobs.append((cached, None))
+                else:
+                    # stamped before reading, so an edit made while loading isn't cached as current
+                    deps = cache.stamps(ModCache.sources(modPath, brPath)) if cache else {}
+                    jobs.append((pool.submit(output.capture, loadMod, *args), deps))
+
+            for args, (job, deps) in zip(mods, jobs):
+                if deps is None:
+                    modName, ents, stages, log = job
+                else:
+                    (modName, ents, stages), log = job.result()
+                    if cache:
+                        cache.put(args[0], deps, modName, ents, stages, log)
+
+                output.stream.write(log)
+
+                if ents:
+                    for ent in ents:
+                        name, i, v, s = ent.get('Name'), int(ent.get('ID')), int(ent.get('Variant')), int(ent.get('Subtype'))
+
+                        if i >= 1000:
+                            print(f'Entity "{name}" has a type outside the 0 - 999 range! ({i}) It will not load properly from rooms!')
+                        if v >= 4096:
+                            print(f'Entity "{name}" has a variant outside the 0 - 4095 range! ({v})')
+                        if s >= 256:
+                            print(f'Entity "{name}" has a subtype outside the 0 - 255 range! ({s})')
+
+                        existingEn = entityRegistry.add(ent)
+                        if existingEn != None:
+                            print(f'Entity "{name}" in "{ent.get("Kind")}" > "{ent.get("Group")}" ({i}.{v}.{s}) is overriding "{existingEn.get("Name")}" from "{existingEn.get("Kind")}" > "{existingEn.get("Group")}"!')
+                            ent.set('Invalid', existingEn.get('Invalid'))
+
+                if stages:
+                    stageXML.extend(stages)
+    finally:
+        sys.stdout = output.stream
+        if cache:
+            cache.close()
+        if icons:
+            icons.shutdown()
+
+########################
+#     Image Cache      #
+########################
+
+class ImageCache:
+    '''Process-wide pixmap cache. Entries are keyed by the source path plus
+    whatever was done to it (sub-rect, mirroring, rotation), and the least
+    recently used ones are dropped once the cache grows past its byte budget.'''
+
+    def __init__(self, budget=64 * 1024 * 1024):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.atlas = {}
+
+        # entity image paths, and what is actually drawn for them once it's known whether they exist
+        self.found = {}
+
+        # decoded atlas pages, kept outside the budget so evicting one image never means decoding a whole page again
+        self.pages = {}
+
+        # (size, modified time) of atlas images whose contents were found to match, so they're only hashed once
+        self.atlasChecked = {}
+        self.atlasChecksPath = None
+        self.atlasChecksChanged = False
+
+    AtlasVersion = 2
+
+    MissingImage = 'resources/Entities/questionmark.png'
+
+    def loadAtlas(self, index='resources/Atlas/atlas.json'):
+        '''Serves the built in entity images out of the pages atlas_build.py packs them into, so
+        each page is decoded once instead of every image being opened on its own. Does nothing if
+        the atlas hasn't been built'''
         try:
-            tree = ET.parse(os.path.join(modPath, 'metadata.xml'))
-            root = tree.getroot()
-            modName = root.find("name").text
-        except ET.ParseError:
-            print(f'Failed to parse mod metadata "{modName}", falling back on default name')
-
-        # add dedicated entities
-        entPath = os.path.join(modPath, 'content/entities2.xml')
-        if os.path.exists(entPath):
-            # Grab their Entities2.xml
-            entRoot = None
-            try:
-                entRoot = ET.parse(entPath).getroot()
-            except ET.ParseError as e:
-                print(f'ERROR parsing entities2 xml for mod "{modName}": {e}')
-                continue
+            with open(index) as f:
+                atlas = json.load(f)
+        except (OSError, ValueError):
+            return
 
-            ents = None
-            if autogenerate:
-                ents = loadFromModXML(modPath, modName, entRoot, resourcePath, fixIconFormat=fixIconFormat)
-            else:
-                ents = loadFromMod(modPath, brPath, modName, entRoot, fixIconFormat=fixIconFormat)
+        if atlas.get('version') != ImageCache.AtlasVersion:
+            print('Atlas is out of date, run atlas_build.py again')
+            return
 
-            if ents:
-                for ent in ents:
-                    name, i, v, s = ent.get('Name'), int(ent.get('ID')), int(ent.get('Variant')), int(ent.get('Subtype'))
+        folder = os.path.dirname(index)
+        pages = [ os.path.join(folder, page) for page in atlas['pages'] ]
 
-                    if i >= 1000:
-                        print(f'Entity "{name}" has a type outside the 0 - 999 range! ({i}) It will not load properly from rooms!')
-                    if v >= 4096:
-                        print(f'Entity "{name}" has a variant outside the 0 - 4095 range! ({v})')
-                    if s >= 256:
-                        print(f'Entity "{name}" has a subtype outside the 0 - 255 range! ({s})')
+        self.atlas = { path: (pages[e['page']], tuple(e['rect']), tuple(e['stamp'])) for path, e in atlas['images'].items() }
 
-                    existingEn = entityXML.find(f"entity[@ID='{i}'][@Subtype='{s}'][@Variant='{v}']")
-                    if existingEn != None:
-                        print(f'Entity "{name}" in "{ent.get("Kind")}" > "{ent.get("Group")}" ({i}.{v}.{s}) is overriding "{existingEn.get("Name")}" from "{existingEn.get("Kind")}" > "{existingEn.get("Group")}"!')
-                        entityXML.remove(existingEn)
-                        ent.set('Invalid', existingEn.get('Invalid'))
+        self.atlasChecksPath = os.path.join(folder, 'checked.json')
+        try:
+            with open(self.atlasChecksPath) as f:
+                self.atlasChecked = { path: tuple(stamp) for path, stamp in json.load(f).items() }
+        except (OSError, ValueError):
+            self.atlasChecked = {}
+
+    def atlasEntry(self, path):
+        '''Where path is in the atlas, unless it isn't in there or has changed since the atlas was built'''
+        entry = self.atlas.get(path)
+        if entry is None:
+            return None
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        size, digest = entry[2]
+        if st.st_size != size:
+            return None
+
+        # git and installers don't keep modified times, so a file that doesn't match the last check
+        # is compared by its contents. Ones that changed are loaded from their own file from then on
+        checkStamp = (st.st_size, st.st_mtime_ns)
+        if self.atlasChecked.get(path) != checkStamp:
+            try:
+                with open(path, 'rb') as f:
+                    changed = hashlib.sha256(f.read()).hexdigest() != digest
+            except OSError:
+                return None
+
+            if changed:
+                del self.atlas[path]
+                return None
 
-                    entityXML.append(ent)
+            self.atlasChecked[path] = checkStamp
+            self.atlasChecksChanged = True
 
-            stages = loadStagesFromMod(modPath, brPath, modName)
-            if stages:
-                stageXML.extend(stages)
+        return entry
+
+    def saveAtlasChecks(self):
+        '''Keeps which atlas images were checked for the next launch, so they aren't hashed again'''
+        if not self.atlasChecksChanged:
+            return
+
+        checks = json.dumps({ path: list(stamp) for path, stamp in self.atlasChecked.items() }).encode()
+        try:
+            writeFileAtomic(self.atlasChecksPath, lambda f: f.write(checks))
+            self.atlasChecksChanged = False
+        except OSError as e:
+            print('Could not save atlas checks:', e)
+
+    def loadPixmap(self, path):
+        entry = self.atlasEntry(path)
+        if entry is None:
+            return QPixmap(path)
+
+        pagePath, rect, stamp = entry
+        page = self.pages.get(pagePath)
+        if page is None:
+            page = self.pages[pagePath] = QPixmap(pagePath)
+        return page.copy(*rect)
+
+    @staticmethod
+    def pixmapSize(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def cached(self, key, load):
+        pixmap = self.entries.get(key)
+        if pixmap is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return pixmap
+
+        self.misses += 1
+        pixmap = load()
+        self.entries[key] = pixmap
+        self.size += ImageCache.pixmapSize(pixmap)
+
+        # never evict what was just asked for, even if it alone is over budget
+        while self.size > self.budget and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.size -= ImageCache.pixmapSize(old)
+
+        return pixmap
+
+    def pixmap(self, path, rect=None, mirrorX=False, mirrorY=False, rotation=0):
+        '''rect is an (x, y, w, h) tuple cut out of the source image before it's transformed'''
+
+        if rect is None and not mirrorX and not mirrorY and not rotation:
+            return self.cached((path, None, False, False, 0), lambda: self.loadPixmap(path))
+
+        def load():
+            pixmap = self.pixmap(path)
+            if rect is not None:
+                pixmap = pixmap.copy(*rect)
+            if mirrorX or mirrorY:
+                pixmap = QPixmap.fromImage(pixmap.toImage().mirrored(mirrorX, mirrorY))
+            if rotation:
+                pixmap = pixmap.transformed(QTransform().rotate(rotation))
+            return pixmap
+
+        return self.cached((path, rect, mirrorX, mirrorY, rotation), load)
+
+    def icon(self, path, rect=None):
+        return QIcon(self.pixmap(path, rect))
+
+    def entityImage(self, path):
+        '''path, or the question mark if there's no image there. Each path is only checked the first time
+        something needs to draw it'''
+        found = self.found.get(path)
+        if found is None:
+            found = self.found[path] = path if path and os.path.exists(path) else ImageCache.MissingImage
+        return found
+
+    def imageSize(self, path):
+        '''Size of the image at path, read from the file header so the image doesn't need to be decoded'''
+        size = self.sizes.get(path)
+        if size is None:
+            pixmap = self.entries.get((path, None, False, False, 0))
+            entry = self.atlasEntry(path)
+            if pixmap is not None:
+                size = pixmap.size()
+            elif entry is not None:
+                size = QSize(*entry[1][2:])
+            else:
+                size = QImageReader(path).size()
+            self.sizes[path] = size
+        return size
+
+    def clear(self):
+        self.entries.clear()
+        self.sizes.clear()
+        self.size = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'budget': self.budget,
+            'pages': len(self.pages),
+            'pageBytes': sum(ImageCache.pixmapSize(page) for page in self.pages.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / total if total else 0
+        }
 
 ########################
 #      Scene/View      #
@@ -558,8 +1091,72 @@ def loadMods(autogenerate, installPath, resourcePath):
 
 class RoomScene(QGraphicsScene):
 
+    class Grid:
+        '''Entities in the scene indexed by the tile they sit on, kept up to date as they're added, moved and removed'''
+
+        def __init__(self):
+            self.tiles = {}
+            self.gridEnts = {}
+            self.locations = {}
+
+        def add(self, ent):
+            x, y = ent.entity.x, ent.entity.y
+            isGridEnt = ent.entity.Type > 999
+
+            self.tiles.setdefault((x, y), []).append(ent)
+            if isGridEnt:
+                self.gridEnts[(x, y)] = self.gridEnts.get((x, y), 0) + 1
+
+            self.locations[ent] = (x, y, isGridEnt)
+
+        def remove(self, ent):
+            loc = self.locations.pop(ent, None)
+            if loc is None: return
+
+            x, y, isGridEnt = loc
+
+            stack = self.tiles[(x, y)]
+            stack.remove(ent)
+            if not stack:
+                del self.tiles[(x, y)]
+
+            if isGridEnt:
+                self.gridEnts[(x, y)] -= 1
+                if self.gridEnts[(x, y)] == 0:
+                    del self.gridEnts[(x, y)]
+
+        def update(self, ent):
+            '''Call after an entity's position or type changes'''
+            if ent not in self.locations: return
+            x, y, isGridEnt = self.locations[ent]
+            if x == ent.entity.x and y == ent.entity.y and isGridEnt == (ent.entity.Type > 999): return
+
+            self.remove(ent)
+            self.add(ent)
+
+        def clear(self):
+            self.tiles.clear()
+            self.gridEnts.clear()
+            self.locations.clear()
+
+        def entitiesAt(self, x, y):
+            return self.tiles.get((x, y), [])
+
+        def stackDepth(self, x, y):
+            return len(self.tiles.get((x, y), ()))
+
+        def hasGridEntity(self, x, y):
+            return (x, y) in self.gridEnts
+
+        def stacks(self):
+            '''Yields (x, y, count) for every tile with more than one entity on it'''
+            for (x, y), stack in self.tiles.items():
+                if len(stack) > 1:
+                    yield x, y, len(stack)
+
     def __init__(self):
         QGraphicsScene.__init__(self, 0, 0, 0, 0)
+        self.grid = RoomScene.Grid()
         self.newRoomSize(1)
 
         # Make the bitfont
@@ -570,6 +1167,8 @@ class RoomScene(QGraphicsScene):
         self.bitText = True
 
         self.tile = None
+        self.bgKey = None
+        self.bgPixmap = None
 
     def newRoomSize(self, shape):
         self.roomInfo = Room.Info(shape=shape)
@@ -579,11 +1178,30 @@ class RoomScene(QGraphicsScene):
 
         self.setSceneRect(-1 * 26, -1 * 26, (self.roomWidth + 2) * 26, (self.roomHeight + 2) * 26)
 
+    def addItem(self, item):
+        QGraphicsScene.addItem(self, item)
+        if isinstance(item, Entity):
+            self.grid.add(item)
+
+    def removeItem(self, item):
+        if isinstance(item, Entity):
+            self.grid.remove(item)
+        QGraphicsScene.removeItem(self, item)
+
+    def clear(self):
+        self.grid.clear()
+        QGraphicsScene.clear(self)
+
     def clearDoors(self):
         for item in self.items():
             if isinstance(item, Door):
                 item.remove()
 
+    def setDoors(self, doors):
+        self.clearDoors()
+        for door in doors:
+            self.addItem(Door(door))
+
     def drawForeground(self, painter, rect):
 
         # Bitfont drawing: moved to the RoomEditorWidget.drawForeground for easier anti-aliasing
@@ -638,15 +1256,9 @@ class RoomScene(QGraphicsScene):
         #     painter.drawLine(wlvl * gs + h, wmin * gs + h, wlvl * gs + h, wmax * gs + h)
 
 
-    def loadBackground(self):
+    def loadBackground(self, roomBG):
         gs = 26
 
-        roomBG = None
-        if mainWindow.roomList.selectedRoom():
-            roomBG = mainWindow.roomList.selectedRoom().roomBG
-        else:
-            roomBG = stageXML.find('stage[@Name="Basement"]')
-
         self.tile = QImage()
         self.tile.load(roomBG.get('OuterBG'))
 
@@ -660,7 +1272,35 @@ class RoomScene(QGraphicsScene):
 
     def drawBackground(self, painter, rect):
 
-        self.loadBackground()
+        roomBG = None
+        room = mainWindow.roomList.selectedRoom()
+        if room:
+            if room.roomBG is None:
+                room.setRoomBG(mainWindow.path)
+            roomBG = room.roomBG
+        else:
+            roomBG = stageXML.find('stage[@Name="Basement"]')
+
+        # the composited background only changes along with the stage or the room shape
+        key = ('RoomBackground', roomBG.get('OuterBG'), roomBG.get('InnerBG'), self.roomInfo.shape)
+        if key != self.bgKey:
+            self.bgKey = key
+            self.bgPixmap = imageCache.cached(key, lambda: self.composeBackground(roomBG))
+
+        painter.drawPixmap(self.sceneRect().topLeft(), self.bgPixmap)
+
+    def composeBackground(self, roomBG):
+        """Renders the walls and floor for the current stage and shape into one pixmap covering the scene rect"""
+
+        self.loadBackground(roomBG)
+
+        sceneRect = self.sceneRect()
+        pixmap = QPixmap(int(sceneRect.width()), int(sceneRect.height()))
+        pixmap.fill(Qt.transparent)
+
+        painter = QPainter(pixmap)
+        painter.translate(-sceneRect.x(), -sceneRect.y())
+        rect = QRectF(sceneRect)
 
         if not self.roomInfo.shapeData:
             print (f"This room has an unknown shape: {self.roomInfo.shape}")
@@ -683,6 +1323,13 @@ class RoomScene(QGraphicsScene):
         elif self.roomInfo.shape in [9, 10, 11, 12]:
             self.drawBGCornerRooms(painter, rect)
 
+        painter.end()
+
+        # the source images aren't needed until the next stage or shape change
+        self.tile = self.corner = self.vert = self.horiz = self.innerCorner = self.center = None
+
+        return pixmap
+
     def drawBGRegularRooms(self, painter, rect):
         gs = 26
 
@@ -1004,17 +1651,16 @@ class RoomEditorWidget(QGraphicsView):
         if settings.value('SnapToBounds') == '1':
             x, y = self.scene().roomInfo.snapToBounds(x, y)
 
-        for i in self.scene().items():
-            if isinstance(i, Entity):
-                if i.entity.x == x and i.entity.y == y:
-                    if i.stackDepth == EntityStack.MAX_STACK_DEPTH:
-                        return
+        grid = self.scene().grid
+        if grid.stackDepth(x, y) >= EntityStack.MAX_STACK_DEPTH:
+            return
 
-                    i.hideWeightPopup()
+        for i in grid.entitiesAt(x, y):
+            i.hideWeightPopup()
 
-                    # Don't stack multiple grid entities
-                    if int(i.entity.Type) > 999 and int(self.objectToPaint.ID) > 999:
-                        return
+        # Don't stack multiple grid entities
+        if int(self.objectToPaint.ID) > 999 and grid.hasGridEntity(x, y):
+            return
 
         # Make sure we're not spawning oodles
         if (x, y) in self.lastTile: return
@@ -1104,16 +1750,13 @@ class RoomEditorWidget(QGraphicsView):
         room = mainWindow.roomList.selectedRoom()
         if room:
             # Room Type Icon
-            q = QPixmap()
-            q.load('resources/UI/RoomIcons.png')
-
-            painter.drawPixmap(2, 3, q.copy(room.info.type * 16, 0, 16, 16))
+            painter.drawPixmap(2, 3, imageCache.pixmap('resources/UI/RoomIcons.png', (room.info.type * 16, 0, 16, 16)))
 
             # Top Text
             font = painter.font()
             font.setPixelSize(13)
             painter.setFont(font)
-            painter.drawText(20, 16, f"{room.info.variant} - {room.data(0x100)}" )
+            painter.drawText(20, 16, f"{room.info.variant} - {room.name}" )
 
             # Bottom Text
             font = painter.font()
@@ -1178,120 +1821,110 @@ class RoomEditorWidget(QGraphicsView):
         painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
 
         # Display the number of entities on a given tile, in bitFont or regular font
-        tiles = [ [ 0 for x in range(self.scene().roomWidth) ] for y in range(self.scene().roomHeight) ]
-        for e in self.scene().items():
-            if isinstance(e, Entity):
-                tiles[e.entity.y][e.entity.x] += 1
-
         useAliased = settings.value('BitfontEnabled') == '0'
 
         if useAliased:
             painter.setPen(Qt.white)
             painter.font().setPixelSize(5)
 
-        for y, row in enumerate(tiles):
+        for x, y, count in self.scene().grid.stacks():
             yc = (y + 1) * 26 - 12
 
-            for x, count in enumerate(row):
-                if count <= 1: continue
-
-                if not useAliased:
-                    xc = (x + 1) * 26 - 12
+            if not useAliased:
+                xc = (x + 1) * 26 - 12
 
-                    digits = [ int(i) for i in str(count) ]
+                digits = [ int(i) for i in str(count) ]
 
-                    fontrow = count == EntityStack.MAX_STACK_DEPTH and 1 or 0
+                fontrow = count == EntityStack.MAX_STACK_DEPTH and 1 or 0
 
-                    numDigits = len(digits) - 1
-                    for i, digit in enumerate(digits):
-                        painter.drawPixmap( xc - 12 * (numDigits - i), yc, self.scene().bitfont[digit + fontrow * 10] )
-                else:
-                    if count == EntityStack.MAX_STACK_DEPTH: painter.setPen(Qt.red)
+                numDigits = len(digits) - 1
+                for i, digit in enumerate(digits):
+                    painter.drawPixmap( xc - 12 * (numDigits - i), yc, self.scene().bitfont[digit + fontrow * 10] )
+            else:
+                if count == EntityStack.MAX_STACK_DEPTH: painter.setPen(Qt.red)
 
-                    painter.drawText( x * 26, y * 26, 26, 26, Qt.AlignBottom | Qt.AlignRight, str(count) )
+                painter.drawText( x * 26, y * 26, 26, 26, Qt.AlignBottom | Qt.AlignRight, str(count) )
 
-                    if count == EntityStack.MAX_STACK_DEPTH: painter.setPen(Qt.white)
+                if count == EntityStack.MAX_STACK_DEPTH: painter.setPen(Qt.white)
 
 class Entity(QGraphicsItem):
     GRID_SIZE = 26
 
-    class Info:
-        def __init__(self, x=0, y=0, t=0, v=0, s=0, weight=0, changeAtStart=True):
-            # Supplied entity info
-            self.x = x
-            self.y = y
-            self.weight = weight
-
-            if changeAtStart:
-                self.changeTo(t, v, s)
-
-        def changeTo(self, t, v, s):
-            self.Type = t
-            self.Variant = v
-            self.Subtype = s
-
-            # Derived Entity Info
-            self.name = None
-            self.isGridEnt = False
-            self.baseHP = None
-            self.boss = None
-            self.champion = None
-            self.pixmap = None
-            self.known = False
-            self.invalid = False
-            self.placeVisual = None
-
-            self.mirrorX = None
-            self.mirrorY = None
-
-            self.getEntityInfo(t, v, s)
-
-        def getEntityInfo(self, t, variant, subtype):
+    class Definition:
+        """Read-only entity data shared by every placed entity of the same type, variant, and subtype"""
 
-            en = None
-            try:
-                global entityXML
-                en = entityXML.find(f"entity[@ID='{t}'][@Subtype='{subtype}'][@Variant='{variant}']")
-            except:
-                print (f"Entity {t}, Variant {variant}, Subtype {subtype} expected, but was not found")
-                en = None
-
-            if en == None:
-                self.pixmap = QPixmap("resources/Entities/questionmark.png")
-                return
+        __slots__ = (
+            'Type', 'Variant', 'Subtype',
+            'name', 'isGridEnt', 'baseHP', 'boss', 'champion', 'pixmap',
+            'known', 'invalid', 'placeVisual', 'mirrorX', 'mirrorY'
+        )
 
-            self.name = en.get('Name')
-            self.isGridEnt = en.get('Kind') == 'Stage' and \
-                            en.get('Group') in [ 'Grid', 'Poop', 'Fireplaces', 'Other', 'Props', 'Special Exits', 'Broken' ]
+        GridGroups = [ 'Grid', 'Poop', 'Fireplaces', 'Other', 'Props', 'Special Exits', 'Broken' ]
+
+        def __init__(self, t, variant, subtype, en):
+            fields = {
+                'Type': t,
+                'Variant': variant,
+                'Subtype': subtype,
+
+                # Derived Entity Info
+                'name': None,
+                'isGridEnt': False,
+                'baseHP': None,
+                'boss': None,
+                'champion': None,
+                'pixmap': None,
+                'known': False,
+                'invalid': False,
+                'placeVisual': None,
+                'mirrorX': None,
+                'mirrorY': None
+            }
 
-            self.baseHP = en.get('BaseHP')
-            self.boss = en.get('Boss') == '1'
-            self.champion = en.get('Champion') == '1'
-            self.placeVisual = en.get('PlaceVisual')
+            if en is None:
+                fields['pixmap'] = imageCache.pixmap('resources/Entities/questionmark.png')
+            else:
+                fields.update(Entity.Definition.parse(t, variant, subtype, en))
+
+            for name, val in fields.items():
+                object.__setattr__(self, name, val)
+
+        def __setattr__(self, name, val):
+            raise AttributeError(f"Entity definitions are shared between entities, {name} can't be changed")
+
+        @staticmethod
+        def parse(t, variant, subtype, en):
+            fields = {
+                'name': en.get('Name'),
+                'isGridEnt': en.get('Kind') == 'Stage' and en.get('Group') in Entity.Definition.GridGroups,
+                'baseHP': en.get('BaseHP'),
+                'boss': en.get('Boss') == '1',
+                'champion': en.get('Champion') == '1',
+                'invalid': en.get('Invalid') == '1',
+                'known': True
+            }
 
             def getEnt(s):
-                return list(map(int, s.split('.')))
+                return tuple(map(int, s.split('.')))
 
             mirrorX, mirrorY = en.get('MirrorX'), en.get('MirrorY')
-            if mirrorX: self.mirrorX = getEnt(mirrorX)
-            if mirrorY: self.mirrorY = getEnt(mirrorY)
+            if mirrorX: fields['mirrorX'] = getEnt(mirrorX)
+            if mirrorY: fields['mirrorY'] = getEnt(mirrorY)
 
             if t == 5 and variant == 100:
-                i = QImage()
-                i.load('resources/Entities/5.100.0 - Collectible.png')
+                i = imageCache.pixmap('resources/Entities/5.100.0 - Collectible.png').toImage()
                 i = i.convertToFormat(QImage.Format_ARGB32)
 
-                d = QImage()
-                d.load(en.get('Image'))
+                d = imageCache.pixmap(imageCache.entityImage(en.get('Image'))).toImage()
 
                 p = QPainter(i)
                 p.drawImage(0, 0, d)
                 p.end()
 
-                self.pixmap = QPixmap.fromImage(i)
+                fields['pixmap'] = QPixmap.fromImage(i)
 
             else:
-                self.pixmap = QPixmap(en.get('Image'))
+                fields['pixmap'] = imageCache.pixmap(imageCache.entityImage(en.get('Image')))
 
             def checkNum(s):
                 try:
@@ -1300,16 +1933,39 @@ class Entity(QGraphicsItem):
                 except ValueError:
                     return False
 
-            if self.placeVisual:
-                parts = list(map(lambda x: x.strip(), self.placeVisual.split(',')))
+            placeVisual = en.get('PlaceVisual')
+            if placeVisual:
+                parts = list(map(lambda x: x.strip(), placeVisual.split(',')))
                 if len(parts) == 2 and checkNum(parts[0]) and checkNum(parts[1]):
-                    self.placeVisual = (float(parts[0]), float(parts[1]))
+                    placeVisual = (float(parts[0]), float(parts[1]))
                 else:
-                    self.placeVisual = parts[0]
+                    placeVisual = parts[0]
+            fields['placeVisual'] = placeVisual
+
+            return fields
+
+    class Info:
+        """Per-entity placement data, everything else is looked up from the shared definition"""
 
-            self.invalid = en.get('Invalid') == '1'
-            self.known = True
+        __slots__ = ( 'x', 'y', 'weight', 'definition' )
 
+        def __init__(self, x=0, y=0, t=0, v=0, s=0, weight=0, changeAtStart=True):
+            # Supplied entity info
+            self.x = x
+            self.y = y
+            self.weight = weight
+
+            self.definition = None
+            if changeAtStart:
+                self.changeTo(t, v, s)
+
+        def changeTo(self, t, v, s):
+            global entityRegistry
+            self.definition = entityRegistry.definition(t, v, s)
+
+        def __getattr__(self, name):
+            # Type, Variant, Subtype, name, pixmap, etc.
+            return getattr(self.definition, name)
 
     def __init__(self, x, y, mytype, variant, subtype, weight):
         QGraphicsItem.__init__(self)
@@ -1342,6 +1998,8 @@ class Entity(QGraphicsItem):
 
     def setData(self, t, v, s):
         self.entity.changeTo(t, v, s)
+        if self.scene():
+            self.scene().grid.update(self)
         self.updateTooltip()
 
     def updateTooltip(self):
@@ -1394,6 +2052,8 @@ class Entity(QGraphicsItem):
             if xc != currentX or yc != currentY:
                 self.entity.x = x
                 self.entity.y = y
+                if self.scene():
+                    self.scene().grid.update(self)
 
                 self.updateTooltip()
                 if self.isSelected():
@@ -1426,8 +2086,9 @@ class Entity(QGraphicsItem):
         painter.setBrush(Qt.Dense5Pattern)
         painter.setPen(QPen(Qt.white))
 
-        if self.entity.pixmap:
-            w, h = self.entity.pixmap.width(), self.entity.pixmap.height()
+        pixmap = self.entity.pixmap
+        if pixmap:
+            w, h = pixmap.width(), pixmap.height()
             xc, yc = 0, 0
 
             typ, var, sub = self.entity.Type, self.entity.Variant, self.entity.Subtype
@@ -1489,23 +2150,23 @@ class Entity(QGraphicsItem):
 
             # Curse room special case
             if typ == 5 and var == 50 and mainWindow.roomList.selectedRoom().info.type == 10:
-                self.entity.pixmap = QPixmap('resources/Entities/5.360.0 - Red Chest.png')
+                pixmap = imageCache.pixmap('resources/Entities/5.360.0 - Red Chest.png')
 
             # Crawlspace special case
             if (typ == 0 or typ == 1900) and mainWindow.roomList.selectedRoom().info.type == 16:
                 if typ == 1900 and var == 0:
-                    self.entity.pixmap = QPixmap('resources/Entities/1900.0.0 - Crawlspace Brick.png')
+                    pixmap = imageCache.pixmap('resources/Entities/1900.0.0 - Crawlspace Brick.png')
                     self.setZValue(-1 * self.entity.y)
                     recenter = (0, 0)
                 elif typ == 0:
                     if var == 10:
-                        self.entity.pixmap = QPixmap('resources/Entities/0.10.0 - Ladder.png')
+                        pixmap = imageCache.pixmap('resources/Entities/0.10.0 - Ladder.png')
                     elif var == 20:
-                        self.entity.pixmap = QPixmap('resources/Entities/0.20.0 - Ladder Base.png')
+                        pixmap = imageCache.pixmap('resources/Entities/0.20.0 - Ladder Base.png')
                     elif var == 30:
-                        self.entity.pixmap = QPixmap('resources/Entities/0.30.0 - Ladder Through.png')
+                        pixmap = imageCache.pixmap('resources/Entities/0.30.0 - Ladder Through.png')
 
-            painter.drawPixmap(x, y, self.entity.pixmap)
+            painter.drawPixmap(x, y, pixmap)
 
             # if the offset is high enough, draw an indicator of the actual position
             if abs(1 - yc) > 0.5 or abs(1 - xc) > 0.5:
@@ -1558,12 +2219,14 @@ class Entity(QGraphicsItem):
         self.hideWeightPopup()
 
     def getStack(self):
-        # Get the stack
-        stack = self.collidingItems(Qt.IntersectsItemBoundingRect)
+        # Get the stack, topmost first with this entity last
+        stack = []
+        if self.scene():
+            stack = [ x for x in reversed(self.scene().grid.entitiesAt(self.entity.x, self.entity.y)) if x is not self ]
+            stack.sort(key=lambda x: -x.zValue())
         stack.append(self)
 
-        # Make sure there are no doors or popups involved
-        self.stack = [x for x in stack if isinstance(x,Entity)]
+        self.stack = stack
 
         # 1 is not a stack.
         self.stackDepth = len(self.stack)
@@ -1727,21 +2390,21 @@ class Door(QGraphicsItem):
 
         self.setPos(self.doorItem[0] * 26 - 13, self.doorItem[1] * 26 - 13)
 
-        tr = QTransform()
+        rotation = 0
         if doorItem[0] in [0, 13]:
-            tr.rotate(270)
+            rotation = 270
             self.moveBy(-13, 0)
         elif doorItem[0] in [14, 27]:
-            tr.rotate(90)
+            rotation = 90
             self.moveBy(13, 0)
         elif doorItem[1] in [8, 15]:
-            tr.rotate(180)
+            rotation = 180
             self.moveBy(0, 13)
         else:
             self.moveBy(0, -13)
 
-        self.image = QImage('resources/Backgrounds/Door.png').transformed(tr)
-        self.disabledImage = QImage('resources/Backgrounds/DisabledDoor.png').transformed(tr)
+        self.image = imageCache.pixmap('resources/Backgrounds/Door.png', rotation=rotation)
+        self.disabledImage = imageCache.pixmap('resources/Backgrounds/DisabledDoor.png', rotation=rotation)
 
     @property
     def exists(self): return self.doorItem[2]
@@ -1755,9 +2418,9 @@ class Door(QGraphicsItem):
         painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
 
         if self.exists:
-            painter.drawImage(0, 0, self.image)
+            painter.drawPixmap(0, 0, self.image)
         else:
-            painter.drawImage(0, 0, self.disabledImage)
+            painter.drawPixmap(0, 0, self.disabledImage)
 
     def boundingRect(self):
         return QRectF(0.0, 0.0, 64.0, 52.0)
@@ -1782,457 +2445,301 @@ class Door(QGraphicsItem):
 # Room Selector
 ########################
 
-class Room(QListWidgetItem):
+class RoomListModel(QAbstractListModel):
+    """Backs the room list with plain Room objects, rows are only built when the view asks for them"""
 
-    # contains concrete room information necessary for examining a room's game qualities
-    # such as type, variant, subtype, and shape information
-    class Info:
-        ########## SHAPE DEFINITIONS
-        # w x h
-        # 1 = 1x1, 2 = 1x0.5, 3 = 0.5x1, 4 = 1x2, 5 = 0.5x2, 6 = 2x1, 7 = 2x0.5, 8 = 2x2
-        # 9 = DR corner, 10 = DL corner, 11 = UR corner, 12 = UL corner
-        # all coords must be offset -1, -1 when saving
-        Shapes = {
-            1: { # 1x1
-                'Doors': [[7, 0], [0, 4], [14, 4], [7, 8]],
-                # format: min, max on axis, cross axis coord, normal direction along cross axis
-                'Walls': {
-                    'X': [ (0, 14, 0, 1), (0, 14, 8, -1) ],
-                    'Y': [ (0, 8, 0, 1), (0, 8, 14, -1) ]
-                },
-                'Dims': (15, 9)
-            },
-            2: { # horizontal closet (1x0.5)
-                'Doors': [[0, 4], [14, 4]],
-                'Walls': {
-                    'X': [ (0, 14, 2, 1), (0, 14, 6, -1) ],
-                    'Y': [ (2, 6, 0, 1), (2, 6, 14, -1) ]
-                },
-                'TopLeft': 30, # Grid coord
-                'BaseShape': 1, # Base Room shape this is rendered over
-                'Dims': (15, 5)
-            },
-            3: { # vertical closet (0.5x1)
-                'Doors': [[7, 0], [7, 8]],
-                'Walls': {
-                    'X': [ (4, 10, 0, 1), (4, 10, 8, -1) ],
-                    'Y': [ (0, 8, 4, 1), (0, 8, 10, -1) ]
-                },
-                'TopLeft': 4,
-                'BaseShape': 1,
-                'Dims': (7, 9)
-            },
-            4: { # 1x2 room
-                'Doors': [[7, 0], [14, 4], [0, 4], [14, 11], [0, 11], [7, 15]],
-                'Walls': {
-                    'X': [ (0, 14, 0, 1), (0, 14, 15, -1) ],
-                    'Y': [ (0, 15, 0, 1), (0, 15, 14, -1) ]
-                },
-                'Dims': (15, 16)
-            },
-            5: { # tall closet (0.5x2)
-                'Doors': [[7, 0], [7, 15]],
-                'Walls': {
-                    'X': [ (4, 10, 0, 1), (4, 10, 15, -1) ],
-                    'Y': [ (0, 15, 4, 1), (0, 15, 10, -1) ]
-                },
-                'TopLeft': 4,
-                'BaseShape': 4,
-                'Dims': (7, 16)
-            },
-            6: { # 2x1 room
-                'Doors': [[7, 0], [0, 4], [7, 8], [20, 8], [27, 4], [20, 0]],
-                'Walls': {
-                    'X': [ (0, 27, 0, 1), (0, 27, 8, -1) ],
-                    'Y': [ (0, 8, 0, 1), (0, 8, 27, -1) ]
-                },
-                'Dims': (28, 9)
-            },
-            7: { # wide closet (2x0.5)
-                'Doors': [[0, 4], [27, 4]],
-                'Walls': {
-                    'X': [ (0, 27, 2, 1), (0, 27, 6, -1) ],
-                    'Y': [ (2, 6, 0, 1), (2, 6, 27, -1) ]
-                },
-                'TopLeft': 56,
-                'BaseShape': 6,
-                'Dims': (28, 5)
-            },
-            8: { # 2x2 room
-                'Doors': [[7, 0], [0, 4], [0, 11], [20, 0], [7, 15], [20, 15], [27, 4], [27, 11]],
-                'Walls': {
-                    'X': [ (0, 27, 0, 1), (0, 27, 15, -1) ],
-                    'Y': [ (0, 15, 0, 1), (0, 15, 27, -1) ]
-                },
-                'Dims': (28, 16)
-            },
-            9: { # mirrored L room
-                'Doors': [[20, 0], [27, 4], [7, 15], [20, 15], [13, 4], [0, 11], [27, 11], [7, 7]],
-                'Walls': {
-                    'X': [ (0, 13, 7, 1), (13, 27, 0, 1), (0, 27, 15, -1) ],
-                    'Y': [ (7, 15, 0, 1), (0, 7, 13, 1), (0, 15, 27, -1) ]
-                },
-                'BaseShape': 8,
-                'MirrorX': 10,
-                'MirrorY': 11,
-                'Dims': (28, 16)
-            },
-            10: { # L room
-                'Doors': [[0, 4], [14, 4], [7, 0], [20, 7], [7, 15], [20, 15], [0, 11], [27, 11]],
-                'Walls': {
-                    'X': [ (0, 14, 0, 1), (14, 27, 7, 1), (0, 27, 15, -1) ],
-                    'Y': [ (0, 15, 0, 1), (0, 7, 14, -1), (7, 15, 27, -1) ]
-                },
-                'BaseShape': 8,
-                'MirrorX': 9,
-                'MirrorY': 12,
-                'Dims': (28, 16)
-            },
-            11: { # mirrored r room
-                'Doors': [[0, 4], [7, 8], [7, 0], [13, 11], [20, 0], [27, 4], [20, 15], [27, 11]],
-                'Walls': {
-                    'X': [ (0, 27, 0, 1), (0, 13, 8, -1), (13, 27, 15, -1) ],
-                    'Y': [ (0, 8, 0, 1), (8, 15, 13, 1), (0, 15, 27, -1) ]
-                },
-                'BaseShape': 8,
-                'MirrorX': 12,
-                'MirrorY': 9,
-                'Dims': (28, 16)
-            },
-            12: { # r room
-                'Doors': [[0, 4], [7, 0], [20, 0], [14, 11], [27, 4], [7, 15], [0, 11], [20, 8]],
-                'Walls': {
-                    'X': [ (0, 27, 0, 1), (14, 27, 8, -1), (0, 14, 15, -1) ],
-                    'Y': [ (0, 15, 0, 1), (8, 15, 14, -1), (0, 8, 27, -1) ]
-                },
-                'BaseShape': 8,
-                'MirrorX': 11,
-                'MirrorY': 10,
-                'Dims': (28, 16)
-            }
-        }
+    RoomRole = Qt.UserRole + 1
 
-        for shape in Shapes.values():
-            for door in shape['Doors']:
-                door.append(True)
+    def __init__(self):
+        QAbstractListModel.__init__(self)
 
-        def __init__(self, t=0, v=0, s=0, shape=1):
-            self.type = t
-            self.variant = v
-            self.subtype = s
-            self.shape = shape
+        self.rooms = []
+        self.rows = None
+        self.entityIndex = RoomSelector.EntityIndex()
 
-        @property
-        def shape(self):
-            return self._shape
-
-        @shape.setter
-        def shape(self, val):
-            self._shape = val
-            self.shapeData = Room.Info.Shapes[self.shape]
-            bs = self.shapeData.get('BaseShape')
-            self.baseShapeData = bs and Room.Info.Shapes[bs]
-            self.makeNewDoors()
-
-        # represents the actual dimensions of the room, including out of bounds
-        @property
-        def dims(self): return (self.baseShapeData or self.shapeData)['Dims']
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rooms)
 
-        @property
-        def width(self): return self.shapeData['Dims'][0]
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
 
-        @property
-        def height(self): return self.shapeData['Dims'][1]
+        room = self.rooms[index.row()]
+
+        if role == Qt.DisplayRole:
+            return f"{room.info.variant} - {room.name}"
+        elif role == Qt.EditRole:
+            return room.name
+        elif role == Qt.ToolTipRole:
+            return Room.getDesc(room.info, room.name, room.difficulty, room.weight)
+        elif role == Qt.DecorationRole:
+            return imageCache.icon('resources/UI/RoomIcons.png', (room.info.type * 16, 0, 16, 16))
+        elif role == Qt.ForegroundRole:
+            return QColor.fromHsvF(1, 1, min(max(room.difficulty / 15, 0), 1), 1)
+        elif role == RoomListModel.RoomRole:
+            return room
+
+        return None
 
-        def makeNewDoors(self):
-            self.doors = [ door[:] for door in self.shapeData['Doors'] ]
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole: return False
 
-        def gridLen(self):
-            dims = self.dims
-            return dims[0] * dims[1]
+        self.rooms[index.row()].name = value
+        self.dataChanged.emit(index, index)
+        mainWindow.dirt()
+        return True
 
-        def gridIndex(x,y,w):
-            return y * w + x
+    def flags(self, index):
+        # rooms can only be dropped between other rooms, not onto them
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
 
-        def _axisBounds(a, c, w):
-            wmin, wmax, wlvl, wdir = w
-            return a < wmin or a > wmax or ((c > wlvl) - (c < wlvl)) == wdir
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable | Qt.ItemIsDragEnabled
 
-        def isInBounds(self, x,y):
-            return all(Room.Info._axisBounds(x,y,w) for w in self.shapeData['Walls']['X']) and \
-                   all(Room.Info._axisBounds(y,x,w) for w in self.shapeData['Walls']['Y'])
+    def supportedDropActions(self):
+        return Qt.MoveAction
 
-        def snapToBounds(self, x,y,dist=1):
-            for w in self.shapeData['Walls']['X']:
-                if not Room.Info._axisBounds(x,y,w):
-                    y = w[2] + w[3] * dist
+    def row(self, room):
+        '''Row of the room in the list, or -1 if it isn't in it'''
+        if self.rows is None:
+            self.rows = { room: i for i, room in enumerate(self.rooms) }
+        return self.rows.get(room, -1)
 
-            for w in self.shapeData['Walls']['Y']:
-                if not Room.Info._axisBounds(y,x,w):
-                    x = w[2] + w[3] * dist
+    def indexOf(self, room):
+        row = self.row(room)
+        return self.index(row) if row >= 0 else QModelIndex()
 
-            return (x, y)
+    def update(self, room):
+        index = self.indexOf(room)
+        if index.isValid():
+            self.dataChanged.emit(index, index)
 
+    def updateAll(self):
+        if self.rooms:
+            self.dataChanged.emit(self.index(0), self.index(len(self.rooms) - 1))
 
-    def __init__(self, name="New Room", spawns=[], difficulty=1, weight=1.0, mytype=1, variant=0, subtype=0, shape=1, doors=None):
-        """Initializes the room item."""
+    def _attach(self, rooms):
+        for room in rooms:
+            room.model = self
+            self.entityIndex.add(room)
 
-        QListWidgetItem.__init__(self)
+    def _detach(self, rooms):
+        for room in rooms:
+            room.model = None
+            self.entityIndex.remove(room)
+
+    def setRooms(self, rooms):
+        self.beginResetModel()
+        self._detach(self.rooms)
+        self.rooms = list(rooms)
+        self.rows = None
+        self._attach(self.rooms)
+        self.endResetModel()
+
+    def insertRooms(self, row, rooms):
+        if not rooms: return
 
-        self.setData(0x100, name)
+        self.beginInsertRows(QModelIndex(), row, row + len(rooms) - 1)
+        self.rooms[row:row] = rooms
+        self.rows = None
+        self._attach(rooms)
+        self.endInsertRows()
 
-        self.info = Room.Info(mytype, variant, subtype, shape)
-        if doors:
-            if len(self.info.doors) != len(doors):
-                print(f'{name} ({variant}): Invalid doors!', doors)
-            self.info.doors = doors
+    def removeRooms(self, rooms):
+        # remove back to front, one contiguous run at a time
+        rows = sorted(set(self.row(room) for room in rooms) - { -1 }, reverse=True)
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
 
-        self.gridSpawns = spawns or [ [] for x in range(self.info.gridLen()) ]
-        if self.info.gridLen() != len(self.gridSpawns):
-            print(f'{name} ({variant}): Invalid grid spawns!')
+            self.beginRemoveRows(QModelIndex(), first, last)
+            removed = self.rooms[first:last + 1]
+            del self.rooms[first:last + 1]
+            self.rows = None
+            self._detach(removed)
+            self.endRemoveRows()
 
-        self.difficulty = difficulty
-        self.weight = weight
+    def _reorder(self, rooms):
+        '''Swaps in a new ordering of the same rooms, keeping selections pointed at the same rooms'''
 
-        self.setRoomBG()
+        self.layoutAboutToBeChanged.emit()
 
-        self.setFlags(self.flags() | Qt.ItemIsEditable)
-        self.setToolTip()
+        persistent = self.persistentIndexList()
+        persistentRooms = [ self.rooms[index.row()] for index in persistent ]
 
-        self.renderDisplayIcon()
+        self.rooms = rooms
+        self.rows = None
 
-    @property
-    def difficulty(self): return self._difficulty
+        self.changePersistentIndexList(persistent, [ self.indexOf(room) for room in persistentRooms ])
 
-    @difficulty.setter
-    def difficulty(self, d):
-        self._difficulty = d
-        self.setForeground(QColor.fromHsvF(1, 1, min(max(d / 15, 0), 1), 1))
+        self.layoutChanged.emit()
 
-    @property
-    def gridSpawns(self): return self._gridSpawns
+    def sortRooms(self, key):
+        self._reorder(sorted(self.rooms, key=key))
 
-    @gridSpawns.setter
-    def gridSpawns(self, g):
-        self._gridSpawns = g
+    def moveRooms(self, rooms, row):
+        '''Moves the rooms, in the given order, to sit before what is currently at row'''
+        moving = set(rooms)
+        before = [ room for room in self.rooms[:row] if room not in moving ]
+        after = [ room for room in self.rooms[row:] if room not in moving ]
+        self._reorder(before + list(rooms) + after)
 
-        self._spawnCount = 0
-        for entStack in self.gridSpawns:
-            if entStack: self._spawnCount += 1
+class RoomFilterProxy(QAbstractProxyModel):
+    """Hides filtered out rooms from the room list.
 
-    DoorSortKey = lambda door: (door[0], door[1])
+    Unlike QSortFilterProxyModel this doesn't ask about each row one at a time, the filter
+    hands over the full set of hidden rooms and the view is re-laid out in one go."""
 
-    def clearDoors(self):
-        mainWindow.scene.clearDoors()
-        for door in self.info.doors:
-            mainWindow.scene.addItem(Door(door))
+    def __init__(self):
+        QAbstractProxyModel.__init__(self)
 
-    def getSpawnCount(self):
-        return self._spawnCount
+        self.hidden = set()
+        self.sourceRows = []
+        self.proxyRows = {}
 
-    def reshape(self, shape, doors=None):
-        spawnIter = self.spawns()
+        self.pendingRooms = None
+        self.pendingRemoval = False
 
-        self.info.shape = shape
-        if doors: self.info.doors = doors
-        realWidth = self.info.dims[0]
+    def setSourceModel(self, model):
+        QAbstractProxyModel.setSourceModel(self, model)
 
-        gridLen = self.info.gridLen()
-        newGridSpawns = [ [] for x in range(gridLen) ]
+        model.dataChanged.connect(self.sourceDataChanged)
+        model.rowsInserted.connect(self.sourceRowsInserted)
+        model.rowsAboutToBeRemoved.connect(self.sourceRowsAboutToBeRemoved)
+        model.rowsRemoved.connect(self.sourceRowsRemoved)
+        model.layoutAboutToBeChanged.connect(self.beginLayoutChange)
+        model.layoutChanged.connect(self.endLayoutChange)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self.sourceModelReset)
 
-        for stack, x, y in spawnIter:
-            idx = Room.Info.gridIndex(x, y, realWidth)
-            if idx < gridLen:
-                newGridSpawns[idx] = stack
+        self.rebuild()
 
-        self.gridSpawns = newGridSpawns
+    def rebuild(self):
+        rooms = self.sourceModel().rooms
+        if self.hidden:
+            self.sourceRows = [ i for i, room in enumerate(rooms) if room not in self.hidden ]
+        else:
+            self.sourceRows = list(range(len(rooms)))
+        self.proxyRows = { srow: prow for prow, srow in enumerate(self.sourceRows) }
 
-    def getDesc(info, name, difficulty, weight):
-        return f'{name} ({info.type}.{info.variant}.{info.subtype}) ({info.width-2}x{info.height-2}) - Difficulty: {difficulty}, Weight: {weight}, Shape: {info.shape}'
+    def setHiddenRooms(self, hidden):
+        if hidden == self.hidden: return
 
-    def setToolTip(self):
-        self.setText(f"{self.info.variant} - {self.data(0x100)}")
-        tip = Room.getDesc(self.info, self.data(0x100), self.difficulty, self.weight)
-        QListWidgetItem.setToolTip(self, tip)
+        self.beginLayoutChange()
+        self.hidden = hidden
+        self.endLayoutChange()
 
-    def renderDisplayIcon(self):
-        """Renders the mini-icon for display."""
+    # Mirroring source model changes
 
-        q = QImage()
-        q.load('resources/UI/RoomIcons.png')
+    def beginLayoutChange(self):
+        self.layoutAboutToBeChanged.emit()
 
-        i = QIcon(QPixmap.fromImage(q.copy(self.info.type * 16, 0, 16, 16)))
+        rooms = self.sourceModel().rooms
+        self.pendingRooms = [ rooms[self.sourceRows[index.row()]] for index in self.persistentIndexList() ]
 
-        self.setIcon(i)
+    def endLayoutChange(self):
+        self.rebuild()
 
-    class _SpawnIter:
-        def __init__(self, gridSpawns, dims):
-            self.idx = -1
-            self.spawns = gridSpawns
-            self.width, self.height = dims
+        source = self.sourceModel()
+        self.changePersistentIndexList(self.persistentIndexList(),
+            [ self.mapFromSource(source.indexOf(room)) for room in self.pendingRooms ])
+        self.pendingRooms = None
 
-        def __iter__(self): return self
+        self.layoutChanged.emit()
 
-        def __next__(self):
-            stack = None
-            while True:
-                self.idx += 1
-                if self.idx >= self.width * self.height or self.idx >= len(self.spawns):
-                    raise StopIteration
+    def sourceModelReset(self):
+        self.rebuild()
+        self.endResetModel()
 
-                stack = self.spawns[self.idx]
-                if stack: break
-            x = int(self.idx % self.width)
-            y = int(self.idx / self.width)
-            return (stack, x, y)
+    def sourceRowsInserted(self, parent, first, last):
+        rooms = self.sourceModel().rooms
+        visible = sum(1 for room in rooms[first:last + 1] if room not in self.hidden)
 
-    def spawns(self):
-        return Room._SpawnIter(self.gridSpawns, self.info.dims)
+        if visible == 0:
+            self.rebuild()
+            return
 
-    SpecialBG = [
-        "0a_library", "0b_shop", "0c_isaacsroom", "0d_barrenroom",
-        "0e_arcade", "0e_diceroom", "0f_secretroom"
-    ]
+        # the new rows go after every visible row that comes before them in the source
+        row = bisect.bisect_left(self.sourceRows, first)
+        self.beginInsertRows(QModelIndex(), row, row + visible - 1)
+        self.rebuild()
+        self.endInsertRows()
 
-    for i in range(len(SpecialBG)):
-        prefix = SpecialBG[i]
-        SpecialBG[i] = ET.Element('room', {
-            "OuterBG": os.path.join("resources/Backgrounds", prefix + ".png"),
-            "InnerBG": os.path.join("resources/Backgrounds", prefix + "Inner.png")
-        })
+    def sourceRowsAboutToBeRemoved(self, parent, first, last):
+        rows = [ self.proxyRows[r] for r in range(first, last + 1) if r in self.proxyRows ]
 
-    def setRoomBG(self):
-        global stageXML
+        self.pendingRemoval = len(rows) > 0
+        if self.pendingRemoval:
+            self.beginRemoveRows(QModelIndex(), rows[0], rows[-1])
 
-        roomsByStage = stageXML.findall('stage')
-
-        getBG = lambda name: stageXML.find(f'stage[@Name="{name}"]')
-
-        self.roomBG = getBG('Basement')
-
-        for room in roomsByStage:
-            if room.get('Pattern') in mainWindow.path:
-                self.roomBG = room
-
-        c = self.info.type
-        v = self.info.variant
-
-        if c == 12: # library
-            self.roomBG = Room.SpecialBG[0]
-        elif c == 2: # shop
-            self.roomBG = Room.SpecialBG[1]
-        elif c == 18: # bedroom
-            self.roomBG = Room.SpecialBG[2]
-        elif c == 19: # barren room
-            self.roomBG = Room.SpecialBG[3]
-        elif c == 9: # arcade
-            self.roomBG = Room.SpecialBG[4]
-        elif c == 21: # dice room
-            self.roomBG = Room.SpecialBG[5]
-        elif c == 7: # secret room
-            self.roomBG = Room.SpecialBG[6]
-
-        # curse, challenge, sacrifice, devil, boss rush, black market
-        elif c in [10, 11, 13, 14, 17, 22]:
-            self.roomBG = getBG('Sheol')
-        # angel
-        elif c in [15]:
-            self.roomBG = getBG('Cathedral')
-        # chest room
-        elif c in [20]:
-            self.roomBG = getBG('Chest')
-        # error, crawlspace
-        elif c in [3, 16]:
-            self.roomBG = getBG('Dark Room')
-
-        # super secret
-        elif c in [8]:
-            if v in [0, 11, 15]:
-                self.roomBG = getBG('Womb')
-            elif v in [1, 12, 16]:
-                self.roomBG = getBG('Cathedral')
-            elif v in [2, 13, 17]:
-                self.roomBG = getBG('Sheol')
-            elif v in [3]:
-                self.roomBG = getBG('Necropolis')
-            elif v in [4]:
-                self.roomBG = getBG('Cellar')
-            elif v in [5, 19]:
-                self.roomBG = getBG('Basement')
-            elif v in [6]:
-                self.roomBG = Room.SpecialBG[0]
-            elif v in [7]:
-                self.roomBG = getBG('Dark Room')
-            elif v in [8]:
-                self.roomBG = getBG('Burning Basement')
-            elif v in [9]:
-                self.roomBG = getBG('Flooded Caves')
-            elif v in [14, 18]:
-                self.roomBG = Room.SpecialBG[1]
-            else:
-                self.roomBG = getBG('Dark Room')
-        # grave rooms
-        elif c == 1 and v > 2 and 'special rooms' in mainWindow.path:
-            self.roomBG = getBG('Dark Room')
-
-    def mirrorX(self):
-        # Flip Spawns
-        width, height = self.info.dims
-        for y in range(height):
-            for x in range(int(width / 2)):
-                ox = Room.Info.gridIndex(x,y,width)
-                mx = Room.Info.gridIndex(width-x-1,y,width)
-                oxs = self.gridSpawns[ox]
-                self.gridSpawns[ox] = self.gridSpawns[mx]
-                self.gridSpawns[mx] = oxs
-
-        # Flip Doors
-        for door in self.info.doors:
-            door[0] = width - door[0] - 1
-
-        # Flip Directional Entities
-        info = Entity.Info(changeAtStart=False)
-        for stack, x, y in self.spawns():
-            for spawn in stack:
-                info.changeTo(spawn[0], spawn[1], spawn[2])
-                if info.mirrorX:
-                    for i in range(3):
-                        spawn[i] = info.mirrorX[i]
-
-        # Flip Shape
-        shape = self.info.shapeData.get('MirrorX')
-        if shape:
-            self.reshape(shape, self.info.doors)
-
-    def mirrorY(self):
-        # Flip Spawns
-        width, height = self.info.dims
-        for x in range(width):
-            for y in range(int(height / 2)):
-                oy = Room.Info.gridIndex(x,y,width)
-                my = Room.Info.gridIndex(x,height-y-1,width)
-                oys = self.gridSpawns[oy]
-                self.gridSpawns[oy] = self.gridSpawns[my]
-                self.gridSpawns[my] = oys
-
-
-        # Flip Doors
-        for door in self.info.doors:
-            door[1] = height - door[1] - 1
-
-        # Flip Directional Entities
-        info = Entity.Info(changeAtStart=False)
-        for stack, x, y in self.spawns():
-            for spawn in stack:
-                info.changeTo(spawn[0], spawn[1], spawn[2])
-                if info.mirrorY:
-                    for i in range(3):
-                        spawn[i] = info.mirrorY[i]
-
-        # Flip Shape
-        shape = self.info.shapeData.get('MirrorY')
-        if shape:
-            self.reshape(shape, self.info.doors)
+    def sourceRowsRemoved(self, parent, first, last):
+        self.rebuild()
+        if self.pendingRemoval:
+            self.pendingRemoval = False
+            self.endRemoveRows()
+
+    def sourceDataChanged(self, topLeft, bottomRight, roles=[]):
+        rows = [ self.proxyRows[r] for r in range(topLeft.row(), bottomRight.row() + 1) if r in self.proxyRows ]
+        if rows:
+            self.dataChanged.emit(self.index(rows[0], 0), self.index(rows[-1], 0), roles)
+
+    # QAbstractProxyModel
+
+    def index(self, row, column=0, parent=QModelIndex()):
+        if parent.isValid() or column != 0 or row < 0 or row >= len(self.sourceRows):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.sourceRows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def mapToSource(self, index):
+        if not index.isValid(): return QModelIndex()
+        return self.sourceModel().index(self.sourceRows[index.row()])
+
+    def mapFromSource(self, index):
+        if not index.isValid(): return QModelIndex()
+
+        row = self.proxyRows.get(index.row())
+        if row is None: return QModelIndex()
+        return self.index(row)
+
+class RoomList(QListView):
+    """Room list view, dragging rooms around reorders them in the list"""
+
+    def dropEvent(self, event):
+        if event.source() is not self:
+            event.ignore()
+            return
+
+        proxy = self.model()
+        source = proxy.sourceModel()
+
+        rooms = mainWindow.roomList.orderedSelectedRooms()
+        if not rooms:
+            event.ignore()
+            return
+
+        target = self.indexAt(event.pos())
+        if target.isValid():
+            row = proxy.mapToSource(target).row()
+            if self.dropIndicatorPosition() == QAbstractItemView.BelowItem:
+                row += 1
+        else:
+            row = len(source.rooms)
+
+        source.moveRooms(rooms, row)
+
+        # the move is already done, don't let the drag remove anything
+        event.setDropAction(Qt.IgnoreAction)
+        event.accept()
+        mainWindow.dirt()
 
 class RoomDelegate(QStyledItemDelegate):
 
@@ -2247,8 +2754,8 @@ class RoomDelegate(QStyledItemDelegate):
 
         QStyledItemDelegate.paint(self, painter, option, index)
 
-        item = mainWindow.roomList.list.item(index.row())
-        if item and item.data(100):
+        room = index.data(RoomListModel.RoomRole)
+        if room and room.marked:
             painter.drawPixmap(option.rect.right() - 19, option.rect.top(), self.pixmap)
 
 class FilterMenu(QMenu):
@@ -2270,6 +2777,66 @@ class FilterMenu(QMenu):
 
 class RoomSelector(QWidget):
 
+    class EntityIndex:
+        '''Maps each (type, variant, subtype) to the ids of the rooms in the list that contain it
+        (ids rather than rooms, so the filter worker can use them without touching the rooms)
+
+        Rooms that haven't been decoded yet are only indexed once something looks them up.'''
+
+        def __init__(self):
+            self.rooms = {}
+            self.indexed = {}
+            self.pending = {}
+
+        def add(self, room):
+            if room.entityIndex and room.entityIndex is not self:
+                room.entityIndex.remove(room)
+
+            room.entityIndex = self
+            if room.body is not None:
+                self.pending[id(room)] = room
+                return
+
+            self.indexed[id(room)] = (room, room.entities)
+            for key in room.entities:
+                self.rooms.setdefault(key, set()).add(id(room))
+
+        def remove(self, room):
+            if self.pending.pop(id(room), None):
+                room.entityIndex = None
+                return
+
+            entry = self.indexed.pop(id(room), None)
+            if entry is None: return
+
+            room.entityIndex = None
+            for key in entry[1]:
+                rooms = self.rooms[key]
+                rooms.discard(id(room))
+                if not rooms:
+                    del self.rooms[key]
+
+        def update(self, room):
+            entry = self.indexed.get(id(room))
+            if entry and entry[1] is room.entities: return
+            self.remove(room)
+            self.add(room)
+
+        def clear(self):
+            for room, entities in self.indexed.values():
+                room.entityIndex = None
+            for room in self.pending.values():
+                room.entityIndex = None
+            self.indexed.clear()
+            self.pending.clear()
+            self.rooms.clear()
+
+        def roomsWith(self, key):
+            # decoding a room moves it from pending into the index through update()
+            if self.pending:
+                decodeRoomBodies(list(self.pending.values()))
+            return self.rooms.get(key, set())
+
     def __init__(self):
         """Initialises the widget."""
 
@@ -2279,6 +2846,15 @@ class RoomSelector(QWidget):
         self.layout.setSpacing(0)
 
         self.filterEntity = None
+        self.currentRoom = None
+
+        self.filterGeneration = 0
+        self.filterRooms = None
+
+        self.filterTimer = QTimer(self)
+        self.filterTimer.setSingleShot(True)
+        self.filterTimer.setInterval(100)
+        self.filterTimer.timeout.connect(self.runFilter)
 
         self.setupFilters()
         self.setupList()
@@ -2434,12 +3010,22 @@ class RoomSelector(QWidget):
         self.filter.addWidget(self.clearSize, 1, 5)
 
     def setupList(self):
-        self.list = QListWidget()
+        self.model = RoomListModel()
+        self.proxy = RoomFilterProxy()
+        self.proxy.setSourceModel(self.model)
+
+        self.list = RoomList()
+        self.list.setModel(self.proxy)
         self.list.setViewMode(self.list.ListMode)
         self.list.setSelectionMode(self.list.ExtendedSelection)
         self.list.setResizeMode(self.list.Adjust)
         self.list.setContextMenuPolicy(Qt.CustomContextMenu)
 
+        # every row is the same size, so lay them out without measuring each one
+        self.list.setUniformItemSizes(True)
+        self.list.setLayoutMode(self.list.Batched)
+        self.list.setBatchSize(1000)
+
         self.list.setAutoScroll(True)
         self.list.setDragEnabled(True)
         self.list.setDragDropMode(4)
@@ -2451,11 +3037,36 @@ class RoomSelector(QWidget):
         d = RoomDelegate()
         self.list.setItemDelegate(d)
 
-        self.list.itemSelectionChanged.connect(self.setButtonStates)
-        self.list.doubleClicked.connect(self.activateEdit)
+        self.list.selectionModel().selectionChanged.connect(self.setButtonStates)
+        self.list.selectionModel().currentChanged.connect(self.handleCurrentChanged)
         self.list.customContextMenuRequested.connect(self.customContextMenu)
 
-        self.list.itemDelegate().closeEditor.connect(self.editComplete)
+    @property
+    def entityIndex(self): return self.model.entityIndex
+
+    currentRoomChanged = pyqtSignal(object, object)
+
+    def handleCurrentChanged(self, current, previous):
+        room = current.data(RoomListModel.RoomRole) if current.isValid() else None
+        prev = self.currentRoom
+        self.currentRoom = room
+        self.currentRoomChanged.emit(room, prev)
+
+    def setRooms(self, rooms):
+        self.model.setRooms(rooms)
+
+    def roomIndex(self, room):
+        '''Index of the room in the list view, invalid if it's filtered out or not in the list'''
+        return self.proxy.mapFromSource(self.model.indexOf(room))
+
+    def setCurrentRoom(self, room, flags=QItemSelectionModel.ClearAndSelect):
+        index = self.roomIndex(room) if room else QModelIndex()
+        self.list.selectionModel().setCurrentIndex(index, flags)
+
+    def scrollToRoom(self, room):
+        index = self.roomIndex(room) if room else QModelIndex()
+        if index.isValid():
+            self.list.scrollTo(index)
 
     def setupToolbar(self):
         self.toolbar = QToolBar()
@@ -2471,17 +3082,6 @@ class RoomSelector(QWidget):
         # self.IDButton.setCheckable(True)
         # self.IDButton.setChecked(True)
 
-    def activateEdit(self):
-        room = self.selectedRoom()
-        room.setText(room.data(0x100))
-        self.list.editItem(self.selectedRoom())
-
-    def editComplete(self, lineEdit):
-        room = self.selectedRoom()
-        room.setData(0x100, lineEdit.text())
-        room.setText(f"{room.info.variant} - {room.data(0x100)}")
-        mainWindow.dirt()
-
     #@pyqtSlot(bool)
     def turnIDsOn(self):
         return
@@ -2503,11 +3103,8 @@ class RoomSelector(QWidget):
             "Isaac's Room", "Barren Room", "Chest Room", "Dice Room", "Black Market", "Greed Mode Descent"
         ]
 
-        q = QImage()
-        q.load('resources/UI/RoomIcons.png')
-
         for i, t in enumerate(types):
-            c.addItem(QIcon(QPixmap.fromImage(q.copy(i * 16, 0, 16, 16))), t)
+            c.addItem(imageCache.icon('resources/UI/RoomIcons.png', (i * 16, 0, 16, 16)), t)
         c.setCurrentIndex(self.selectedRoom().info.type)
         c.currentIndexChanged.connect(self.changeType)
         Type.setDefaultWidget(c)
@@ -2568,11 +3165,8 @@ class RoomSelector(QWidget):
         Shape = QWidgetAction(menu)
         c = QComboBox()
 
-        q = QImage()
-        q.load('resources/UI/ShapeIcons.png')
-
         for shapeName in range(1, 13):
-            c.addItem(QIcon(QPixmap.fromImage(q.copy((shapeName - 1) * 16, 0, 16, 16))), str(shapeName))
+            c.addItem(imageCache.icon('resources/UI/ShapeIcons.png', ((shapeName - 1) * 16, 0, 16, 16)), str(shapeName))
         c.setCurrentIndex(self.selectedRoom().info.shape - 1)
         c.currentIndexChanged.connect(self.changeSize)
         Shape.setDefaultWidget(c)
@@ -2684,55 +3278,108 @@ class RoomSelector(QWidget):
         else:
             self.clearAll.setStyleSheet("")
 
-    #@pyqtSlot()
-    def changeFilter(self):
-        self.colourizeClearFilterButtons()
+    class FilterTask(QRunnable):
+        '''Evaluates the room filters on a worker thread against a plain snapshot of the room list'''
+
+        class Signals(QObject):
+            finished = pyqtSignal(int, list)
 
-        uselessEntities = None
+        def __init__(self, generation, rows, query, isStale):
+            QRunnable.__init__(self)
 
-        # Here we go
-        for room in self.getRooms():
-            IDCond = entityCond = typeCond = weightCond = sizeCond = True
+            self.generation = generation
+            self.rows = rows
+            self.query = query
+            self.isStale = isStale
+            self.signals = RoomSelector.FilterTask.Signals()
 
-            IDCond = self.IDFilter.text().lower() in room.text().lower()
+        @staticmethod
+        def matches(row, query):
+            text, rtype, weight, shape, entities, roomId = row
+
+            if query['text'] not in text:
+                return False
 
             # Check if the right entity is in the room
-            if self.entityToggle.checked and self.filterEntity:
-                entityCond = any(int(self.filterEntity.ID) == e[0] and \
-                                 int(self.filterEntity.subtype) == e[2] and \
-                                 int(self.filterEntity.variant) == e[1] \
-                                 for stack, x, y in room.spawns() for e in stack)
+            if query['entityRooms'] is not None and roomId not in query['entityRooms']:
+                return False
 
             # Check if the room is the right type
-            if self.filter.typeData is not -1:
-                # All the normal rooms
-                typeCond = self.filter.typeData == room.info.type
-
+            if query['type'] != -1 and query['type'] != rtype:
                 # For null rooms, include "empty" rooms regardless of type
-                if not typeCond and self.filter.typeData == 0:
-                    if uselessEntities is None:
-                        global entityXML
-                        uselessEntities = list(map(lambda e: [ int(e.get('ID')), int(e.get('Variant') or 0), int(e.get('Subtype') or 0) ],
-                                                entityXML.findall("entity[@InEmptyRooms='1']")))
+                if query['type'] != 0 or not entities <= query['uselessEntities']:
+                    return False
 
-                    hasUsefulEntities = any(entity[:3] not in uselessEntities \
-                                            for stack, x, y in room.spawns() for entity in stack)
+            # Check if the room is the right weight
+            if query['weight'] != -1 and abs(query['weight'] - weight) >= 0.0001:
+                return False
 
-                    typeCond = not hasUsefulEntities
+            # Check if the room is the right size
+            if query['shape'] != -1 and query['shape'] != shape:
+                return False
 
+            return True
 
-            # Check if the room is the right weight
-            if self.filter.weightData is not -1:
-                eps = 0.0001
-                weightCond = abs(self.filter.weightData - room.weight) < eps
+        def run(self):
+            matches = RoomSelector.FilterTask.matches
 
-            # Check if the room is the right size
-            if self.filter.sizeData is not -1:
-                sizeCond = self.filter.sizeData == room.info.shape
+            visible = []
+            for i, row in enumerate(self.rows):
+                # bail out as soon as a newer query comes in
+                if i % 512 == 0 and self.isStale(self.generation): return
+                visible.append(matches(row, self.query))
+
+            self.signals.finished.emit(self.generation, visible)
+
+    filterApplied = pyqtSignal()
+
+    #@pyqtSlot()
+    def changeFilter(self):
+        '''Schedules a filter update, rapid changes (e.g. typing) are coalesced into one query'''
+        self.colourizeClearFilterButtons()
+
+        self.filterGeneration += 1
+        self.filterTimer.start()
+
+    def runFilter(self):
+        query = {
+            'text': self.IDFilter.text().lower(),
+            'entityRooms': None,
+            'type': self.filter.typeData,
+            'weight': self.filter.weightData,
+            'shape': self.filter.sizeData,
+            'uselessEntities': None
+        }
+
+        if self.entityToggle.checked and self.filterEntity:
+            key = (int(self.filterEntity.ID), int(self.filterEntity.variant), int(self.filterEntity.subtype))
+            query['entityRooms'] = set(self.entityIndex.roomsWith(key))
+
+        if query['type'] == 0:
+            query['uselessEntities'] = entityRegistry.inEmptyRooms()
 
-            # Filter em' out
-            isMatch = IDCond and entityCond and typeCond and weightCond and sizeCond
-            room.setHidden(not isMatch)
+        # the worker only gets plain data, never the rooms themselves
+        generation = self.filterGeneration
+        rooms = self.getRooms()
+        # only the null room type check looks at entities, avoid decoding every room otherwise
+        needEntities = query['type'] == 0
+        rows = [ (f"{room.info.variant} - {room.name}".lower(), room.info.type, room.weight, room.info.shape, needEntities and room.entities, id(room)) for room in rooms ]
+
+        self.filterRooms = rooms
+
+        task = RoomSelector.FilterTask(generation, rows, query, lambda gen: gen != self.filterGeneration)
+        task.signals.finished.connect(self.applyFilter)
+        QThreadPool.globalInstance().start(task)
+
+    def applyFilter(self, generation, visible):
+        if generation != self.filterGeneration: return
+
+        rooms = self.filterRooms
+        self.filterRooms = None
+
+        # one batched update through the proxy rather than hiding rows one by one
+        self.proxy.setHiddenRooms(set(room for room, isMatch in zip(rooms, visible) if not isMatch))
+        self.filterApplied.emit()
 
     def setEntityFilter(self, entity):
         self.filterEntity = entity
@@ -2774,7 +3421,7 @@ class RoomSelector(QWidget):
         # Clear the room and reset the size
         mainWindow.scene.clear()
 
-        self.selectedRoom().clearDoors()
+        mainWindow.scene.setDoors(self.selectedRoom().info.doors)
 
         mainWindow.scene.newRoomSize(s)
 
@@ -2788,17 +3435,16 @@ class RoomSelector(QWidget):
                 e = Entity(x, y, entity[0], entity[1], entity[2], entity[3])
                 mainWindow.scene.addItem(e)
 
-        self.selectedRoom().setToolTip()
+        self.selectedRoom().update()
         mainWindow.dirt()
 
     #@pyqtSlot(int)
     def changeType(self, rtype):
         for r in self.selectedRooms():
             r.info.type = rtype
-            r.renderDisplayIcon()
-            r.setRoomBG()
+            r.setRoomBG(mainWindow.path)
 
-            r.setToolTip()
+            r.update()
 
         mainWindow.scene.update()
         mainWindow.dirt()
@@ -2807,7 +3453,7 @@ class RoomSelector(QWidget):
     def changeVariant(self, var):
         for r in self.selectedRooms():
             r.info.variant = var
-            r.setToolTip()
+            r.update()
         mainWindow.dirt()
         mainWindow.scene.update()
 
@@ -2815,7 +3461,7 @@ class RoomSelector(QWidget):
     def changeSubtype(self, var):
         for r in self.selectedRooms():
             r.info.subtype = var
-            r.setToolTip()
+            r.update()
         mainWindow.dirt()
         mainWindow.scene.update()
 
@@ -2823,7 +3469,7 @@ class RoomSelector(QWidget):
     def changeDifficulty(self, var):
         for r in self.selectedRooms():
             r.difficulty = var
-            r.setToolTip()
+            r.update()
         mainWindow.dirt()
         mainWindow.scene.update()
 
@@ -2832,7 +3478,7 @@ class RoomSelector(QWidget):
         for r in self.selectedRooms():
             #r.weight = float(action.text())
             r.weight = action
-            r.setToolTip()
+            r.update()
         mainWindow.dirt()
         mainWindow.scene.update()
 
@@ -2846,8 +3492,9 @@ class RoomSelector(QWidget):
         """Creates a new room."""
 
         r = Room()
-        self.list.insertItem(self.list.currentRow()+1, r)
-        self.list.setCurrentItem(r, QItemSelectionModel.ClearAndSelect)
+        current = self.selectedRoom()
+        self.model.insertRooms(self.model.row(current) + 1 if current else 0, [ r ])
+        self.setCurrentRoom(r)
         mainWindow.dirt()
 
     def removeRoom(self):
@@ -2865,11 +3512,11 @@ class RoomSelector(QWidget):
         if msgBox.exec_() == QMessageBox.AcceptRole:
 
             self.list.clearSelection()
-            for item in rooms:
-                self.list.takeItem(self.list.row(item))
+            self.model.removeRooms(rooms)
 
-            self.list.scrollToItem(self.list.currentItem())
-            self.list.setCurrentItem(self.list.currentItem(), QItemSelectionModel.Select)
+            current = self.selectedRoom()
+            self.scrollToRoom(current)
+            self.setCurrentRoom(current, QItemSelectionModel.Select)
             mainWindow.dirt()
 
     def duplicateRoom(self):
@@ -2882,9 +3529,10 @@ class RoomSelector(QWidget):
 
         mainWindow.storeEntityList()
 
-        lastPlace = self.list.indexFromItem(rooms[-1]).row() + 1
-        self.selectedRoom().setData(100, False)
-        self.list.setCurrentItem(None, QItemSelectionModel.ClearAndSelect)
+        lastPlace = self.model.row(rooms[-1]) + 1
+        self.selectedRoom().marked = False
+        self.selectedRoom().update()
+        self.setCurrentRoom(None)
 
         for room in reversed(rooms):
             if self.mirrorY:
@@ -2898,7 +3546,7 @@ class RoomSelector(QWidget):
                 extra = ' (copy)'
 
             r = Room(
-                deepcopy(room.data(0x100) + extra),
+                deepcopy(room.name + extra),
                 deepcopy(room.gridSpawns),
                 deepcopy(room.difficulty),
                 deepcopy(room.weight),
@@ -2916,8 +3564,8 @@ class RoomSelector(QWidget):
                 else:
                     r.mirrorX()
 
-            self.list.insertItem(lastPlace, r)
-            self.list.setCurrentItem(r, QItemSelectionModel.Select)
+            self.model.insertRooms(lastPlace, [ r ])
+            self.setCurrentRoom(r, QItemSelectionModel.Select)
 
         mainWindow.dirt()
 
@@ -2952,15 +3600,15 @@ class RoomSelector(QWidget):
 
         path = target
 
-        # Append these rooms onto the new STB
+        # Append these rooms onto the STB, or make a new one with them
         rooms = self.orderedSelectedRooms()
-        if os.path.exists(path):
-            oldRooms = mainWindow.open(path)
-            oldRooms.extend(rooms)
-            mainWindow.save(oldRooms, path)
-        # Make a new STB with the selected rooms
-        else:
-            mainWindow.save(rooms, path)
+        try:
+            mainWindow.save(rooms, path, append=True)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", f"Failed exporting rooms: {e}")
+        except:
+            traceback.print_exception(*sys.exc_info())
+            QMessageBox.warning(self, "Error", "Failed exporting rooms. The target may not be a valid STB.")
 
     def setButtonStates(self):
         rooms = len(self.selectedRooms()) > 0
@@ -2970,17 +3618,18 @@ class RoomSelector(QWidget):
         self.exportRoomButton.setEnabled(rooms)
 
     def selectedRoom(self):
-        return self.list.currentItem()
+        index = self.list.currentIndex()
+        return index.data(RoomListModel.RoomRole) if index.isValid() else None
 
     def selectedRooms(self):
-        return self.list.selectedItems()
+        return [ index.data(RoomListModel.RoomRole) for index in self.list.selectionModel().selectedIndexes() ]
 
     def orderedSelectedRooms(self):
         sortedIndexes = sorted(self.list.selectionModel().selectedIndexes(), key=lambda x: (x.column(), x.row()))
-        return [ self.list.itemFromIndex(i) for i in sortedIndexes ]
+        return [ index.data(RoomListModel.RoomRole) for index in sortedIndexes ]
 
     def getRooms(self):
-        return [ self.list.item(i) for i in range(self.list.count()) ]
+        return list(self.model.rooms)
 
 # Entity Palette
 ########################
@@ -2997,15 +3646,6 @@ class EntityGroupItem(object):
         self.name = name
         self.alignment = Qt.AlignCenter
 
-    def getItem(self, index):
-        ''' Retrieves an item of a specific index. The index is already checked for validity '''
-
-        if index == self.startIndex:
-            return self
-
-        if (index <= self.startIndex + len(self.objects)):
-            return self.objects[index - self.startIndex - 1]
-
     def calculateIndices(self, index):
         self.startIndex = index
         self.endIndex = len(self.objects) + index
@@ -3020,10 +3660,33 @@ class EntityItem(QStandardItem):
         self.ID = ID
         self.subtype = subtype
         self.variant = variant
-        self.icon = QIcon(iconPath)
+        self.iconPath = iconPath
+        self._icon = None
 
         self.setToolTip(name)
 
+    @property
+    def icon(self):
+        '''Only decoded once it's first shown, the pixmap is shared with every other palette through the image cache'''
+        if self._icon is None:
+            self._icon = imageCache.icon(imageCache.entityImage(self.iconPath))
+        return self._icon
+
+    @property
+    def shown(self):
+        return self._icon is not None
+
+    def iconSize(self, bounds):
+        '''The size the icon is drawn at when it has to fit in bounds. Until it's been shown
+        that's all of bounds, so laying out the palette doesn't open any images'''
+        if not self.shown:
+            return QSize(bounds)
+
+        size = QSize(imageCache.imageSize(imageCache.entityImage(self.iconPath)))
+        if size.width() > bounds.width() or size.height() > bounds.height():
+            size.scale(bounds, Qt.KeepAspectRatio)
+        return size
+
 class EntityGroupModel(QAbstractListModel):
     """Model containing all the grouped objects in a tileset"""
 
@@ -3033,9 +3696,20 @@ class EntityGroupModel(QAbstractListModel):
         self.groups = {}
         self.kind = kind
         self.view = None
+        self.sizeHints = {}
+
+        # laying the view out again as soon as a row is painted would do it once for every row,
+        # since painting lays out anything that's pending; this waits until the paint is done
+        self.layoutTimer = QTimer(self)
+        self.layoutTimer.setSingleShot(True)
+        self.layoutTimer.setInterval(0)
+        self.layoutTimer.timeout.connect(self.layoutShown)
 
         self.filter = ""
 
+        # the entities that are shown, paired with their items
+        listed = []
+        ungrouped = []
         for en in enList:
             g = en.get('Group')
             k = en.get('Kind')
@@ -3044,27 +3718,36 @@ class EntityGroupModel(QAbstractListModel):
                 if g and g not in self.groups:
                     self.groups[g] = EntityGroupItem(g)
 
-                imgPath = en.get('Image')
-                if not (imgPath and os.path.exists(imgPath)):
-                    en.set("Image", "resources/Entities/questionmark.png")
-
                 e = EntityItem(en.get('Name'), en.get('ID'), en.get('Subtype'), en.get('Variant'), en.get('Image'))
 
                 if g != None:
                     self.groups[g].objects.append(e)
+                    listed.append((en, e))
 
-        i = 0
+                # the search model has no tabs to fit into, so it can find entities that aren't in a group too
+                elif self.kind == None:
+                    ungrouped.append(e)
+                    listed.append((en, e))
+
+        # every row in order, each group's header followed by its entities and then anything ungrouped,
+        # so looking one up is just an index
+        self.rows = []
         for key, group in sorted(self.groups.items()):
-            group.calculateIndices(i)
-            i = group.endIndex + 1
+            group.calculateIndices(len(self.rows))
+            self.rows.append(group)
+            self.rows.extend(group.objects)
+        self.rows.extend(ungrouped)
 
-    def rowCount(self, parent=None):
-        c = 0
+        # the row each entity's xml ended up in, for mapping search results back
+        rowOf = { id(item): row for row, item in enumerate(self.rows) }
+        self.entityRows = { en: rowOf[id(e)] for en, e in listed }
 
-        for group in self.groups.values():
-            c += len(group.objects) + 1
+    def rowCount(self, parent=None):
+        return len(self.rows)
 
-        return c
+    def layoutShown(self):
+        '''Fits the rows that were just painted for the first time to their icons'''
+        self.view.scheduleDelayedItemsLayout()
 
     def flags(self, index):
         item = self.getItem(index.row())
@@ -3075,9 +3758,8 @@ class EntityGroupModel(QAbstractListModel):
             return Qt.ItemIsEnabled | Qt.ItemIsSelectable
 
     def getItem(self, index):
-        for group in self.groups.values():
-            if (group.startIndex <= index) and (index <= group.endIndex):
-                return group.getItem(index)
+        if 0 <= index < len(self.rows):
+            return self.rows[index]
 
     def data(self, index, role=Qt.DisplayRole):
         # Should return the contents of a row when asked for the index
@@ -3096,15 +3778,20 @@ class EntityGroupModel(QAbstractListModel):
 
 
         if not index.isValid(): return None
-        n = index.row()
-
-        if n < 0: return None
-        if n >= self.rowCount(): return None
 
-        item = self.getItem(n)
+        item = self.getItem(index.row())
+        if item is None: return None
 
         if role == Qt.DecorationRole:
             if isinstance(item, EntityItem):
+                # rows are laid out at full size until they're first painted, so shrink them to fit their icon
+                if not item.shown:
+                    icon = item.icon
+                    bounds = self.view.iconSize()
+                    if item.iconSize(bounds) != bounds:
+                        self.layoutTimer.start()
+                    return icon
+
                 return item.icon
 
         if role == Qt.ToolTipRole or role == Qt.StatusTipRole or role == Qt.WhatsThisRole:
@@ -3119,6 +3806,21 @@ class EntityGroupModel(QAbstractListModel):
             if isinstance(item, EntityGroupItem):
                 return QSize(self.view.viewport().width(), 24)
 
+            # otherwise the view lays out every row by asking for its icon, decoding the whole palette up front.
+            # Rows that haven't been painted yet don't know their size, see DecorationRole
+            elif isinstance(item, EntityItem):
+                decoration = item.iconSize(self.view.iconSize())
+
+                # only a handful of icon sizes, so don't go through the style for every row
+                key = (decoration.width(), decoration.height())
+                size = self.sizeHints.get(key)
+                if size is None:
+                    option = self.view.viewOptions()
+                    option.features |= QStyleOptionViewItem.HasDecoration
+                    option.decorationSize = decoration
+                    size = self.sizeHints[key] = self.view.style().sizeFromContents(QStyle.CT_ItemViewItem, option, QSize(), self.view)
+                return size
+
         elif role == Qt.BackgroundRole:
             if isinstance(item, EntityGroupItem):
 
@@ -3140,6 +3842,60 @@ class EntityGroupModel(QAbstractListModel):
 
         return None
 
+class EntitySearchProxy(QAbstractProxyModel):
+    """Shows the entities in a palette model that match a search, best matches first.
+
+    Like RoomFilterProxy, the view gets the whole result in one go; the search index finds
+    the matches instead of every row in the palette being checked and hidden one at a time."""
+
+    def __init__(self, model):
+        QAbstractProxyModel.__init__(self)
+
+        self.sourceRows = []
+        self.proxyRows = {}
+
+        self.setSourceModel(model)
+        self.search = EntitySearch(model.entityRows)
+
+    def setSearch(self, text):
+        model = self.sourceModel()
+
+        self.beginResetModel()
+        self.sourceRows = [ model.entityRows[en] for en in self.search.search(text) ]
+        self.proxyRows = { srow: prow for prow, srow in enumerate(self.sourceRows) }
+        self.endResetModel()
+
+    def getItem(self, index):
+        if 0 <= index < len(self.sourceRows):
+            return self.sourceModel().getItem(self.sourceRows[index])
+
+    # QAbstractProxyModel
+
+    def index(self, row, column=0, parent=QModelIndex()):
+        if parent.isValid() or column != 0 or row < 0 or row >= len(self.sourceRows):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.sourceRows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def mapToSource(self, index):
+        if not index.isValid(): return QModelIndex()
+        return self.sourceModel().index(self.sourceRows[index.row()])
+
+    def mapFromSource(self, index):
+        if not index.isValid(): return QModelIndex()
+
+        row = self.proxyRows.get(index.row())
+        if row is None: return QModelIndex()
+        return self.index(row)
+
 class EntityPalette(QWidget):
 
     def __init__(self):
@@ -3163,10 +3919,13 @@ class EntityPalette(QWidget):
         global entityXML
         allEnts = entityXML.findall("entity")
 
-        # Funky model setup
+        # Funky model setup, the search results are the matches out of every entity, best first
         listView = EntityList()
-        listView.setModel(EntityGroupModel(None, allEnts))
-        listView.model().view = listView
+        model = EntityGroupModel(None, allEnts)
+        model.view = listView
+
+        self.searchResults = EntitySearchProxy(model)
+        listView.setModel(self.searchResults)
         listView.clicked.connect(self.objSelected)
 
         # Hide the search results
@@ -3195,16 +3954,11 @@ class EntityPalette(QWidget):
             "Mods": []
         }
 
-        global entityXML
-        enList = entityXML.findall("entity")
-
-        for en in enList:
-            k = en.get('Kind')
-            if k is None: continue
-
+        global entityRegistry
+        for k, ents in entityRegistry.byKind.items():
             if k not in groups:
                 groups[k] = []
-            groups[k].append(en)
+            groups[k].extend(ents)
 
         for group, ents in groups.items():
             numEnts = len(ents)
@@ -3260,8 +4014,7 @@ class EntityPalette(QWidget):
     def updateSearch(self, text):
         if len(self.searchBar.text()) > 0:
             self.tabs.hide()
-            self.searchTab.widget(0).filter = text
-            self.searchTab.widget(0).filterList()
+            self.searchResults.setSearch(text)
             self.searchTab.show()
         else:
             self.tabs.show()
@@ -3284,8 +4037,6 @@ class EntityList(QListView):
 
         self.setMouseTracking(True)
 
-        self.filter = ""
-
     def mouseMoveEvent(self, event):
 
         index = self.indexAt(event.pos()).row()
@@ -3296,31 +4047,6 @@ class EntityList(QListView):
             if isinstance(item, EntityItem):
                 QToolTip.showText(event.globalPos(), item.name)
 
-    def filterList(self):
-        m = self.model()
-        rows = m.rowCount()
-
-        # First loop for entity items
-        for row in range(rows):
-            item = m.getItem(row)
-
-            if isinstance(item, EntityItem):
-                if self.filter.lower() in item.name.lower():
-                    self.setRowHidden(row, False)
-                else:
-                    self.setRowHidden(row, True)
-
-        # Second loop for Group titles, check to see if all contents are hidden or not
-        for row in range(rows):
-            item = m.getItem(row)
-
-            if isinstance(item, EntityGroupItem):
-                self.setRowHidden(row, True)
-
-                for i in range(item.startIndex, item.endIndex):
-                    if not self.isRowHidden(i):
-                        self.setRowHidden(row, False)
-
 
 class ReplaceDialog(QDialog):
 
@@ -3645,6 +4371,68 @@ class TestConfigDialog(QDialog):
 
 class MainWindow(QMainWindow):
 
+    class SaveTask(QRunnable):
+        '''Writes a room snapshot out and then runs the save hooks on it, off the UI thread'''
+
+        # how many save hooks can run at once
+        MaxHooks = 4
+
+        class Signals(QObject):
+            progress = pyqtSignal(str)
+            # path, error message (empty if it worked)
+            saved = pyqtSignal(str, str)
+            # hook, result
+            hookFinished = pyqtSignal(str, str)
+
+        def __init__(self, path, snapshot, append=False, hooks=None):
+            QRunnable.__init__(self)
+
+            self.path = path
+            self.snapshot = snapshot
+            self.append = append
+            self.hooks = hooks or []
+            self.error = None
+            self.signals = MainWindow.SaveTask.Signals()
+
+        def run(self):
+            self.signals.progress.emit(f'Saving {self.path}...')
+            try:
+                if self.append and os.path.exists(self.path):
+                    appendSTB(self.path, self.snapshot)
+                else:
+                    data = packSTB(self.snapshot)
+                    writeFileAtomic(self.path, lambda f: f.write(data))
+            except Exception as e:
+                traceback.print_exception(*sys.exc_info())
+                self.error = e
+                self.signals.saved.emit(self.path, str(e) or type(e).__name__)
+                return
+
+            self.signals.saved.emit(self.path, '')
+
+            if self.hooks:
+                self.runHooks()
+
+        def runHooks(self):
+            stbPath = os.path.abspath(self.path)
+
+            def runHook(hook):
+                path, name = os.path.split(hook)
+                subprocess.run([hook, stbPath, '--save'], cwd = path, timeout=60)
+
+            self.signals.progress.emit(f'Running {len(self.hooks)} save hook(s)...')
+            with ThreadPoolExecutor(max_workers=min(len(self.hooks), MainWindow.SaveTask.MaxHooks)) as pool:
+                futures = { pool.submit(runHook, hook): hook for hook in self.hooks }
+                for future in as_completed(futures):
+                    hook = futures[future]
+                    try:
+                        future.result()
+                        result = 'finished'
+                    except Exception as e:
+                        print('Save hook failed! Reason:', e)
+                        result = f'failed: {e}'
+                    self.signals.hookFinished.emit(hook, result)
+
     def keyPressEvent(self, event):
         QMainWindow.keyPressEvent(self, event)
         if event.key() == Qt.Key_Alt:
@@ -3667,6 +4455,13 @@ class MainWindow(QMainWindow):
 
         self.dirty = False
 
+        # saves run one at a time, in the order they were made
+        self.savePool = QThreadPool(self)
+        self.savePool.setMaxThreadCount(1)
+
+        # background saves that haven't reported back through saveFinished yet, oldest first
+        self.pendingSaves = []
+
         self.wroteModFolder = False
         self.disableTestModTimer = None
 
@@ -3815,7 +4610,7 @@ class MainWindow(QMainWindow):
         self.roomListDock.visibilityChanged.connect(self.updateDockVisibility)
         self.roomListDock.setObjectName("RoomListDock")
 
-        self.roomList.list.currentItemChanged.connect(self.handleSelectedRoomChanged)
+        self.roomList.currentRoomChanged.connect(self.handleSelectedRoomChanged)
 
         self.addDockWidget(Qt.RightDockWidgetArea, self.roomListDock)
 
@@ -3865,11 +4660,11 @@ class MainWindow(QMainWindow):
         return True
 
     def dirt(self):
-        self.setWindowIcon(QIcon('resources/UI/BasementRenovator-SmallDirty.png'))
+        self.setWindowIcon(imageCache.icon('resources/UI/BasementRenovator-SmallDirty.png'))
         self.dirty = True
 
     def clean(self):
-        self.setWindowIcon(QIcon('resources/UI/BasementRenovator-Small.png'))
+        self.setWindowIcon(imageCache.icon('resources/UI/BasementRenovator-Small.png'))
         self.dirty = False
 
     def storeEntityList(self, room=None):
@@ -3898,9 +4693,22 @@ class MainWindow(QMainWindow):
 
         self.disableTestMod()
 
+        # let any saves still in progress finish. Their saveFinished calls won't get to run once the
+        # app quits, so failures are reported here, and the window stays open with the map dirty
+        self.savePool.waitForDone()
+        failed = [ task for task in self.pendingSaves if task.error ]
+        self.pendingSaves = []
+        if failed:
+            for task in failed:
+                self.saveFailed(task.path, str(task.error) or type(task.error).__name__)
+            event.ignore()
+            return
+
         if self.checkDirty():
             event.ignore()
         else:
+            imageCache.saveAtlasChecks()
+
             settings = QSettings('settings.ini', QSettings.IniFormat)
 
             # Save our state
@@ -3926,7 +4734,8 @@ class MainWindow(QMainWindow):
             self.storeEntityList(prev)
 
             # Clear the current room mark
-            prev.setData(100, False)
+            prev.marked = False
+            prev.update()
 
         # Clear the room and reset the size
         self.scene.clear()
@@ -3935,7 +4744,7 @@ class MainWindow(QMainWindow):
         self.editor.resizeEvent(QResizeEvent(self.editor.size(), self.editor.size()))
 
         # Make some doors
-        current.clearDoors()
+        self.scene.setDoors(current.info.doors)
 
         # Spawn those entities
         for stack, x, y in current.spawns():
@@ -3943,7 +4752,8 @@ class MainWindow(QMainWindow):
                 self.scene.addItem(Entity(x, y, ent[0], ent[1], ent[2], ent[3]))
 
         # Make the current Room mark for clearer multi-selection
-        current.setData(100, True)
+        current.marked = True
+        current.update()
 
     #@pyqtSlot(EntityItem)
     def handleObjectChanged(self, entity, setFilter=True):
@@ -3969,7 +4779,7 @@ class MainWindow(QMainWindow):
 
     def newMap(self):
         if self.checkDirty(): return
-        self.roomList.list.clear()
+        self.roomList.setRooms([])
         self.scene.clear()
         self.path = ''
 
@@ -4097,13 +4907,10 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Error", "This is not a valid Afterbirth+ STB file. It may be a Rebirth STB, or it may be one of the prototype STB files accidentally included in the AB+ release.")
             return
 
-        self.roomList.list.clear()
+        self.roomList.setRooms(rooms)
         self.scene.clear()
         self.updateTitlebar()
 
-        for room in rooms:
-            self.roomList.list.addItem(room)
-
         self.clean()
         self.roomList.changeFilter()
 
@@ -4119,116 +4926,21 @@ class MainWindow(QMainWindow):
                 return []
 
         # Let's read the file and parse it into our list items
-        stb = None
         try:
-            stb = open(path, 'rb').read()
+            ret = openSTB(path)
         except:
             QMessageBox.warning(self, "Error", "Failed opening rooms. The file may not exist.")
             return
 
-        # Header
-        try:
-            header = struct.unpack_from('<4s', stb, 0)[0].decode()
-            if header != "STB1":
-                return
-        except:
+        if ret is None:
             return
 
-        off = 4
-
-        # Room count
-        rooms = struct.unpack_from('<I', stb, off)[0]
-        off += 4
-        ret = []
-
-        seenSpawns = {}
-        for room in range(rooms):
-
-            # Room Type, Room Variant, Subtype, Difficulty, Length of Room Name String
-            roomData = struct.unpack_from('<IIIBH', stb, off)
-            rtype, rvariant, rsubtype, difficulty, nameLen = roomData
-            off += 0xF
-            #print ("Room Data: {0}".format(roomData))
-
-            # Room Name
-            roomName = struct.unpack_from('<{0}s'.format(nameLen), stb, off)[0].decode()
-            off += nameLen
-            #print ("Room Name: {0}".format(roomName))
-
-            # Weight, width, height, shape, number of doors, number of entities
-            entityTable = struct.unpack_from('<fBBBBH', stb, off)
-            rweight, width, height, shape, numDoors, numEnts = entityTable
-            off += 0xA
-            #print ("Entity Table: {0}".format(entityTable))
-
-            doors = []
-            for door in range(numDoors):
-                # X, Y, exists
-                doorX, doorY, exists = struct.unpack_from('<hh?', stb, off)
-                doors.append([ doorX + 1, doorY + 1, exists ])
-                off += 5
-
-            def sameDoorLocs(a, b):
-                for ad, bd in zip(a, b):
-                    if ad[0] != bd[0] or ad[1] != bd[1]:
-                        return False
-                return True
-
-            roomInfo = Room.Info(rtype, rvariant, rsubtype, shape)
-            def getRoomPrefix():
-                return Room.getDesc(roomInfo, roomName, difficulty, rweight)
-
-            normalDoors = sorted(roomInfo.shapeData['Doors'], key=Room.DoorSortKey)
-            sortedDoors = sorted(doors, key=Room.DoorSortKey)
-            if len(normalDoors) != numDoors or not sameDoorLocs(normalDoors, sortedDoors):
-                print (f'Invalid doors in room {getRoomPrefix()}: Expected {normalDoors}, Got {sortedDoors}')
-
-            realWidth = roomInfo.dims[0]
-            gridLen = roomInfo.gridLen()
-            spawns = [ [] for x in range(gridLen) ]
-            for entity in range(numEnts):
-                # x, y, number of entities at this position
-                ex, ey, stackedEnts = struct.unpack_from('<hhB', stb, off)
-                ex += 1
-                ey += 1
-                off += 5
-
-                if not roomInfo.isInBounds(ex, ey):
-                    print (f'Found entity with out of bounds spawn loc in room {getRoomPrefix()}: {ex-1}, {ey-1}')
-
-                idx = Room.Info.gridIndex(ex, ey, realWidth)
-                if idx >= gridLen:
-                    print ('Discarding the current entity due to invalid position!')
-                    off += 0xA * stackedEnts
-                    continue
-
-                spawnSquare = spawns[idx]
-
-                for spawn in range(stackedEnts):
-                    #  type, variant, subtype, weight
-                    etype, evariant, esubtype, eweight = struct.unpack_from('<HHHf', stb, off)
-                    spawnSquare.append([ etype, evariant, esubtype, eweight ])
-
-                    if (etype, esubtype, evariant) not in seenSpawns:
-                        global entityXML
-                        en = entityXML.find(f"entity[@ID='{etype}'][@Subtype='{esubtype}'][@Variant='{evariant}']")
-                        if en == None or en.get('Invalid') == '1':
-                            print(f"Room {getRoomPrefix()} has invalid entity '{en is None and 'UNKNOWN' or en.get('Name')}'! ({etype}.{evariant}.{esubtype})")
-                        seenSpawns[(etype, esubtype, evariant)] = en == None or en.get('Invalid') == '1'
-
-                    off += 0xA
-
-
-            r = Room(roomName, spawns, difficulty, rweight, rtype, rvariant, rsubtype, shape, doors)
-            ret.append(r)
-
         # Update recent files
         if addToRecent:
             self.updateRecent(path)
 
         return ret
 
-    # HA HA HA FUNNY MODE FUNNY MODE
     def openTXT(self, path=None):
         path = path or self.path
 
@@ -4238,136 +4950,7 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Error", "Failed opening rooms. The file may not exist.")
             return
 
-        text = text.splitlines()
-        numLines = len(text)
-
-        def skipWS(i):
-            for j in range(i, numLines):
-                if text[j]: return j
-            return numLines
-
-        entMap = {}
-
-        # Initial section: entity definitions
-        # [Character]=[type].[variant].[subtype]
-        # one per line, continues until it hits a line starting with ---
-        roomBegin = 0
-        for i in range(numLines):
-            line = text[i]
-            line = re.sub(r'\s', '', line)
-            roomBegin = i
-
-            if line.startswith('---'): break
-            if not line: continue
-
-            char, t, v, s = re.findall(r'(.)=(\d+).(\d+).(\d+)', line)[0]
-
-            if char in [ '-', '|' ]:
-                print("Can't use - or | for entities!")
-                continue
-
-            t = int(t)
-            v = int(v)
-            s = int(s)
-            global entityXML
-            en = entityXML.find(f"entity[@ID='{t}'][@Subtype='{s}'][@Variant='{v}']")
-            if en == None or en.get('Invalid') == '1':
-                print(f"Invalid entity for character '{char}': '{en is None and 'UNKNOWN' or en.get('Name')}'! ({t}.{v}.{s})")
-                continue
-
-            entMap[char] = (t, v, s, 0)
-
-        shapeNames = {
-            '1x1': 1,
-            '2x2': 8,
-            'closet': 2,
-            'vertcloset': 3,
-            '1x2': 4,
-            'long': 7,
-            'longvert': 5,
-            '2x1': 6,
-            'l': 10,
-            'mirrorl': 9,
-            'r': 12,
-            'mirrorr': 11
-        }
-
-        ret = []
-
-        # Main section: room definitions
-        # First line: [id]: [name]
-        # Second line, in no particular order: [Weight,] [Shape (within tolerance),] [Difficulty,] [Type[=1],] [Subtype[=0],]
-        # Next [room height] lines: room layout
-        # horizontal walls are indicated with -, vertical with |
-        #   there will be no validation for this, but if lines are the wrong length it prints an error message and skips the line
-        # coordinates to entities are 1:1, entity ids can be at most 1 char
-        # place xs at door positions to turn them off
-        roomBegin += 1
-        while roomBegin < numLines:
-            # 2 lines
-            i = skipWS(roomBegin)
-            if i == numLines: break
-
-            id, name = text[i].split(':', 1)
-            name = name.strip()
-            id = int(id)
-
-            infoParts = re.sub(r'\s', '', text[i+1]).lower().split(',')
-            shape = 1
-            difficulty = 5
-            weight = 1
-            rtype = 1
-            rsubtype = 0
-            for part in infoParts:
-                prop, val = re.findall(r'(.+)=(.+)', part)[0]
-                if prop == 'shape': shape = shapeNames.get(val) or int(val)
-                elif prop == 'difficulty': difficulty = shapeNames.get(val) or int(val)
-                elif prop == 'weight': weight = float(val)
-                elif prop == 'type': rtype = int(val)
-                elif prop == 'subtype': rsubtype = int(val)
-
-            r = Room(name, None, difficulty, weight, rtype, id, rsubtype, shape)
-            width, height = r.info.dims
-            spawns = r.gridSpawns
-
-            i = skipWS(i + 2)
-            for j in range(i, i + height):
-                if j == numLines:
-                    print('Could not finish room!')
-                    break
-
-                y = j - i
-                row = text[j]
-                for x in range(len(row)):
-                    char = row[x]
-                    if char in [ '-', '|', ' ' ]:
-                        continue
-                    if char.lower() == 'x':
-                        changed = False
-                        for door in r.info.doors:
-                            if door[0] == x and door[1] == y:
-                                door[2] = False
-                                changed = True
-                        if changed: continue
-
-                    ent = entMap.get(char)
-                    if ent:
-                        spawns[Room.Info.gridIndex(x,y,width)].append(ent[:])
-                    else:
-                        print(f"Unknown entity! '{char}'")
-
-            ret.append(r)
-
-            i = skipWS(i + height)
-            if i == numLines: break
-
-            if not text[i].strip().startswith('---'):
-                print('Could not find separator after room!')
-                break
-
-            roomBegin = i + 1
-
-        return ret
+        return readTXTRooms(text)
 
     def saveMap(self, forceNewName=False):
         target = self.path
@@ -4383,122 +4966,89 @@ class MainWindow(QMainWindow):
             self.updateTitlebar()
 
         try:
-            self.save(self.roomList.getRooms())
+            self.save(self.roomList.getRooms(), background=True)
         except Exception as e:
             traceback.print_exception(*sys.exc_info())
             QMessageBox.warning(self, "Error", "Saving failed. Try saving to a new file instead.")
+            return
 
+        # the snapshot being saved is what's clean, anything edited from here on dirties it again
         self.clean()
         self.roomList.changeFilter()
 
     def saveMapAs(self):
         self.saveMap(True)
 
-    def save(self, rooms, path=None, updateRecent=True):
+    def save(self, rooms, path=None, updateRecent=True, append=False, background=False):
+        '''Saves rooms to path. With append set, rooms are added onto the end of the file if it already exists.
+        With background set, only a snapshot of the rooms is taken here, writing the file and running
+        the save hooks happens on a worker thread that reports back through saveProgress/saveFinished.
+        That's meant for saving the map itself, a failed background save marks the map dirty again once
+        saveFinished hears about it, or when the window is closed before then, which also keeps it open'''
         path = path or self.path
         path = os.path.splitext(path)[0] + '.stb'
 
         self.storeEntityList()
 
-        headerPacker = struct.Struct('<4sI')
-        roomBegPacker = struct.Struct('<IIIBH')
-        roomEndPacker = struct.Struct('<fBBB')
-        doorHeaderPacker = struct.Struct('<BH')
-        doorPacker = struct.Struct('<hh?')
-        stackPacker = struct.Struct('<hhB')
-        entPacker = struct.Struct('<HHHf')
+        snapshot = snapshotRooms(rooms)
 
-        totalBytes = headerPacker.size
-        totalBytes += len(rooms) * (roomBegPacker.size + roomEndPacker.size)
-        for room in rooms:
-            totalBytes += len(room.data(0x100))
-            totalBytes += doorHeaderPacker.size + doorPacker.size * len(room.info.doors)
-            totalBytes += room.getSpawnCount() * stackPacker.size
-            for stack, x, y in room.spawns():
-                totalBytes += len(stack) * entPacker.size
+        # if a save doesn't update the recent list, it's probably not a real save
+        # so only do hooks in this case
+        hooks = None
+        if updateRecent:
+            settings = QSettings('settings.ini', QSettings.IniFormat)
+            hooks = settings.value('HooksSave')
 
-        out = bytearray(totalBytes)
-        off = 0
-        headerPacker.pack_into(out, off, "STB1".encode(), len(rooms))
-        off += headerPacker.size
+        releaseSTB(path)
 
-        for room in rooms:
-            width, height = room.info.dims
-            roomBegPacker.pack_into(out, off, room.info.type, room.info.variant, room.info.subtype, room.difficulty, len(room.data(0x100)))
-            off += roomBegPacker.size
-            nameLen = len(room.data(0x100))
-            struct.pack_into(f'<{nameLen}s', out, off, room.data(0x100).encode())
-            off += nameLen
-            roomEndPacker.pack_into(out, off, room.weight, width - 2, height - 2, room.info.shape)
-            off += roomEndPacker.size
-
-            # Doors and Entities
-            doorHeaderPacker.pack_into(out, off, len(room.info.doors), room.getSpawnCount())
-            off += doorHeaderPacker.size
-
-            for door in room.info.doors:
-                doorPacker.pack_into(out, off, door[0] - 1, door[1] - 1, door[2])
-                off += doorPacker.size
-
-            for stack, x, y in room.spawns():
-                numEnts = len(stack)
-                stackPacker.pack_into(out, off, x - 1, y - 1, numEnts)
-                off += stackPacker.size
-
-                for entity in stack:
-                    entPacker.pack_into(out, off, entity[0], entity[1], entity[2], entity[3])
-                    off += entPacker.size
-
-        with open(path, 'wb') as stb:
-            stb.write(out)
+        task = MainWindow.SaveTask(path, snapshot, append, hooks)
+        task.signals.hookFinished.connect(self.saveHookFinished)
 
-        if updateRecent:
-            self.updateRecent(path)
+        if background:
+            task.signals.progress.connect(self.saveProgress)
+            task.signals.saved.connect(self.saveFinished)
+            self.pendingSaves.append(task)
+            self.savePool.start(task)
+            return
 
-            # if a save doesn't update the recent list, it's probably not a real save
-            # so only do hooks in this case
-            settings = QSettings('settings.ini', QSettings.IniFormat)
-            saveHooks = settings.value('HooksSave')
-            if saveHooks:
-                stbPath = os.path.abspath(path)
-                for hook in saveHooks:
-                    path, name = os.path.split(hook)
-                    try:
-                        subprocess.run([hook, stbPath, '--save'], cwd = path, timeout=60)
-                    except Exception as e:
-                        print('Save hook failed! Reason:', e)
+        # a background save could still be writing to the same file
+        self.savePool.waitForDone()
 
+        task.run()
+        if task.error:
+            raise task.error
 
-    def replaceEntities(self, replaced, replacement):
-        self.storeEntityList()
+        if updateRecent:
+            self.updateRecent(path)
 
-        numEnts = 0
-        numRooms = 0
+    def saveProgress(self, message):
+        self.statusBar().showMessage(message)
 
-        def checkEq(a, b):
-            return a[0] == b[0] \
-              and (b[1] < 0 or a[1] == b[1]) \
-              and (b[2] < 0 or a[2] == b[2])
+    def saveFinished(self, path, error):
+        # closing the window already dealt with every save that was still pending
+        if not self.pendingSaves:
+            return
+        self.pendingSaves.pop(0)
+
+        if error:
+            self.saveFailed(path, error)
+            return
 
-        def fixEnt(a, b):
-            a[0] = b[0]
-            if b[1] >= 0: a[1] = b[1]
-            if b[2] >= 0: a[2] = b[2]
+        self.statusBar().showMessage(f'Saved {path}', 5000)
+        self.updateRecent(path)
 
-        for i in range(self.roomList.list.count()):
-            currRoom = self.roomList.list.item(i)
+    def saveFailed(self, path, error):
+        self.statusBar().showMessage(f'Saving {path} failed')
+        self.dirt()
+        QMessageBox.warning(self, "Error", f"Saving failed: {error}\nTry saving to a new file instead.")
 
-            n = 0
-            for stack, x, y in currRoom.spawns():
-                for ent in stack:
-                    if checkEq(ent, replaced):
-                        fixEnt(ent, replacement)
-                        n += 1
+    def saveHookFinished(self, hook, result):
+        self.statusBar().showMessage(f'Save hook {os.path.basename(hook)} {result}', 5000)
 
+    def replaceEntities(self, replaced, replacement):
+        self.storeEntityList()
 
-            if n > 0:
-                numRooms += 1
-                numEnts += n
+        numEnts, numRooms = brcore.replaceEntities(self.roomList.getRooms(), replaced, replacement)
 
         room = self.roomList.selectedRoom()
         if room:
@@ -4511,41 +5061,23 @@ class MainWindow(QMainWindow):
                         or "No entities to replace!")
 
     def sortRoomIDs(self):
-        self.sortRoomsByKey(lambda x: (x.info.type,x.info.variant))
+        self.sortRoomsByKey(Room.IDSortKey)
 
     def sortRoomNames(self):
-        self.sortRoomsByKey(lambda x: (x.info.type,x.data(0x100),x.info.variant))
+        self.sortRoomsByKey(Room.NameSortKey)
 
     def sortRoomsByKey(self, key):
-        roomList = self.roomList.list
-        selection = roomList.currentItem()
-        roomList.setCurrentItem(None, QItemSelectionModel.ClearAndSelect)
-
-        rooms = sorted([ roomList.takeItem(roomList.count() - 1) for x in range(roomList.count()) ], key=key)
-
-        for room in rooms:
-            roomList.addItem(room)
+        # selection and the current room follow the rooms to their new rows
+        self.roomList.model.sortRooms(key)
 
         self.dirt()
-        roomList.setCurrentItem(selection, QItemSelectionModel.ClearAndSelect)
-        roomList.scrollToItem(selection)
+        self.roomList.scrollToRoom(self.roomList.selectedRoom())
 
 
     def recomputeRoomIDs(self):
-        roomsByType = {}
-
-        roomList = self.roomList.list
-
-        for i in range(roomList.count()):
-            room = roomList.item(i)
-
-            if room.info.type not in roomsByType:
-                roomsByType[room.info.type] = room.info.variant
+        brcore.recomputeRoomIDs(self.roomList.getRooms())
 
-            room.info.variant = roomsByType[room.info.type]
-            room.setToolTip()
-
-            roomsByType[room.info.type] += 1
+        self.roomList.model.updateAll()
 
         self.dirt()
         self.scene.update()
@@ -4631,7 +5163,7 @@ class MainWindow(QMainWindow):
     StageName = {strFix(floorInfo.get('Name'))},
     IsModStage = {floorInfo.get('BaseGamePath') is None and 'true' or 'false'},
     RoomFile = {strFix(str(Path(self.path)) or 'N/A')},
-    Name = {strFix(testRoom.data(0x100))},
+    Name = {strFix(testRoom.name)},
     Type = {testRoom.info.type},
     Variant = {testRoom.info.variant},
     Subtype = {testRoom.info.subtype},
@@ -4659,7 +5191,7 @@ class MainWindow(QMainWindow):
                 raise
 
             # Set the selected room to max weight, best spawn difficulty, default type, and enable all the doors
-            testRoom = Room(room.data(0x100), room.gridSpawns, 5, 1000.0, 1, room.info.variant, room.info.subtype, room.info.shape)
+            testRoom = Room(room.name, room.gridSpawns, 5, 1000.0, 1, room.info.variant, room.info.subtype, room.info.shape)
 
             # Always pad these rooms
             padMe = testRoom.info.shape in [2, 3, 5, 7]
@@ -4705,7 +5237,7 @@ class MainWindow(QMainWindow):
             startRoom = None
             rooms = self.open(roomPath, False)
             for room in rooms:
-                if "Start Room" in room.data(0x100):
+                if "Start Room" in room.name:
                     room.info.shape  = testRoom.info.shape
                     room.gridSpawns = testRoom.gridSpawns
                     startRoom = room
@@ -4811,7 +5343,7 @@ class MainWindow(QMainWindow):
             # Room header
             width, height = room.info.dims
             out.write('<room type="%d" variant="%d" subtype="%d" name="%s" difficulty="%d" weight="%g" width="%d" height="%d" shape="%d">\n' % (
-                room.info.type, room.info.variant, room.info.subtype, room.data(0x100), room.difficulty,
+                room.info.type, room.info.variant, room.info.subtype, room.name, room.difficulty,
                 room.weight, width - 2, height - 2, room.info.shape
             ))
 
@@ -5045,8 +5577,6 @@ class MainWindow(QMainWindow):
 
 if __name__ == '__main__':
 
-    import sys
-
     # Application
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon('resources/UI/BasementRenovator.png'))
@@ -5061,9 +5591,15 @@ if __name__ == '__main__':
 
     settings = QSettings('settings.ini', QSettings.IniFormat)
 
+    # Pixmaps shared by every room and entity, budget is in megabytes
+    imageCache = ImageCache(int(settings.value('ImageCacheSize', 64)) * 1024 * 1024)
+    imageCache.loadAtlas()
+
     # XML Globals
     entityXML = getEntityXML()
+    entityRegistry = EntityRegistry(entityXML)
     stageXML = getStageXML()
+    brcore.setData(entityXML, stageXML, entityRegistry)
     if settings.value('DisableMods') != '1':
         loadMods(settings.value('ModAutogen') == '1', findInstallPath(), settings.value('ResourceFolder', ''))
 
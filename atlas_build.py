@@ -0,0 +1,145 @@
+'''
+Packs the built in entity images into atlas pages for BR to load
+
+    python atlas_build.py [resources folder]
+
+Every png under resources/Entities goes onto a page per folder (Entities, Items, Trinkets),
+written to resources/Atlas along with atlas.json, which maps each image's path to its page
+and rect. BR decodes a page once and cuts images out of it instead of opening every file.
+Each image is stamped with its size and sha256, images that changed since the atlas was built
+are loaded from their own files, so this only needs running again to get the speed back.
+Mod icons stay as loose files.
+
+Needs PyQt5, same as the editor, the build scripts run it too.
+'''
+import json, os, sys, hashlib
+
+from PyQt5.QtGui import QImage
+
+AtlasVersion = 2
+
+PageWidth = 1024
+PageHeight = 2048
+
+def findImages(entities):
+    '''Returns { page name: [ image path ] }, one page per folder under entities'''
+    pages = {}
+    for dirpath, dirnames, filenames in os.walk(entities):
+        dirnames[:] = sorted(d for d in dirnames if d != 'ModTemp')
+
+        name = os.path.relpath(dirpath, entities)
+        name = name == '.' and os.path.basename(entities) or name.replace(os.sep, '-')
+
+        images = [ os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith('.png') ]
+        if images:
+            pages[name] = images
+
+    return pages
+
+def stamp(path):
+    '''(size, sha256) of the file at path, which survive checkouts and installs unlike modified times'''
+    with open(path, 'rb') as f:
+        data = f.read()
+    return [ len(data), hashlib.sha256(data).hexdigest() ]
+
+def pack(sizes):
+    '''Shelf packs (w, h) sizes, tallest first. Returns a list of pages, each a list of (index, x, y)'''
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0], i))
+
+    pages = []
+    page = None
+    x = y = shelf = 0
+    for i in order:
+        w, h = sizes[i]
+        if w > PageWidth or h > PageHeight:
+            raise ValueError(f'{w}x{h} is too big for a {PageWidth}x{PageHeight} atlas page')
+
+        # start a new shelf when this row is full, and a new page when that's full
+        if x + w > PageWidth:
+            x, y, shelf = 0, y + shelf, h
+
+        if page is None or y + h > PageHeight:
+            page = []
+            pages.append(page)
+            x, y, shelf = 0, 0, h
+
+        page.append((i, x, y))
+        x += w
+
+    return pages
+
+def copyImage(dest, image, x, y):
+    '''Copies image's pixels into dest as they are, painting would premultiply them'''
+    rowBytes = image.width() * 4
+    destLine = dest.bytesPerLine()
+
+    destBits = dest.bits()
+    destBits.setsize(dest.sizeInBytes())
+    destBits = memoryview(destBits)
+
+    for row in range(image.height()):
+        line = image.constScanLine(row)
+        line.setsize(rowBytes)
+
+        start = (y + row) * destLine + x * 4
+        destBits[start:start + rowBytes] = line.asstring()
+
+def buildPage(images, positions):
+    width = max(x + images[i].width() for i, x, y in positions)
+    height = max(y + images[i].height() for i, x, y in positions)
+
+    page = QImage(width, height, QImage.Format_ARGB32)
+    page.fill(0)
+
+    for i, x, y in positions:
+        copyImage(page, images[i], x, y)
+
+    return page
+
+def buildAtlas(resources='resources'):
+    entities = os.path.join(resources, 'Entities')
+    out = os.path.join(resources, 'Atlas')
+    os.makedirs(out, exist_ok=True)
+
+    index = {
+        'version': AtlasVersion,
+        'pages': [],
+        'images': {}
+    }
+
+    for name, paths in findImages(entities).items():
+        images = []
+        for path in paths:
+            image = QImage(path)
+            if image.isNull():
+                print('Skipping unreadable image', path)
+                continue
+            images.append((path, image.convertToFormat(QImage.Format_ARGB32)))
+
+        paths = [ path for path, image in images ]
+        images = [ image for path, image in images ]
+
+        pages = pack([ (image.width(), image.height()) for image in images ])
+        for n, positions in enumerate(pages):
+            pageFile = n and f'{name}-{n}.png' or f'{name}.png'
+            page = buildPage(images, positions)
+            if not page.save(os.path.join(out, pageFile)):
+                raise IOError(f'Could not write {pageFile}')
+
+            for i, x, y in positions:
+                index['images'][paths[i].replace(os.sep, '/')] = {
+                    'page': len(index['pages']),
+                    'rect': [ x, y, images[i].width(), images[i].height() ],
+                    'stamp': stamp(paths[i])
+                }
+
+            index['pages'].append(pageFile)
+            print(f'{pageFile}: {len(positions)} images, {page.width()}x{page.height()}')
+
+    with open(os.path.join(out, 'atlas.json'), 'w') as f:
+        json.dump(index, f)
+
+    return index
+
+if __name__ == '__main__':
+    buildAtlas(len(sys.argv) > 1 and sys.argv[1] or 'resources')
@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+###########################################
+#
+#    Basement Renovator batch processor
+#
+#    Runs the editor's room operations over whole trees of room files, without opening the editor:
+#
+#        python BasementRenovator.py batch --validate --sort ids --recompute-ids --report report.json mods/
+#
+#    Operations run in the order they're given, on every file. Files are spread over a process pool,
+#    each one gets an entry in the JSON report, and a throughput summary is printed at the end.
+#    Exits with 2 if any file failed, 3 if validation found problems.
+#
+
+import argparse, json, os, sys, time, io, contextlib, fnmatch, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import brcore
+
+
+class Op(argparse.Action):
+    '''Collects operations into one list, so they can be applied in command line order'''
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        ops = list(getattr(namespace, self.dest) or [])
+        ops.append((self.const, values))
+        setattr(namespace, self.dest, ops)
+
+def parseEnt(text):
+    '''type.variant.subtype, with -1 for any variant/subtype'''
+    try:
+        t, v, s = map(int, text.split('.'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' should look like type.variant.subtype")
+    return [ t, v, s ]
+
+def parseReplace(s):
+    replaced, sep, replacement = s.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"'{s}' should look like type.variant.subtype=type.variant.subtype")
+    return parseEnt(replaced), parseEnt(replacement)
+
+def makeParser():
+    parser = argparse.ArgumentParser(prog='BasementRenovator.py batch',
+        description='Applies room operations to every room file under the given paths')
+
+    parser.add_argument('paths', nargs='+', help='room files, or directories to search for them')
+
+    ops = parser.add_argument_group('operations', 'applied to each file in the order given')
+    ops.add_argument('--validate', dest='ops', action=Op, nargs=0, const='validate',
+        help='report unknown or invalid entities, bad doors, and duplicate room IDs')
+    ops.add_argument('--replace', dest='ops', action=Op, const='replace', type=parseReplace, metavar='T.V.S=T.V.S',
+        help='replace entities, like Edit > Replace Entities. -1 as a variant or subtype matches/keeps anything')
+    ops.add_argument('--sort', dest='ops', action=Op, const='sort', choices=[ 'ids', 'names' ],
+        help='sort rooms by type and variant, or by type and name')
+    ops.add_argument('--recompute-ids', dest='ops', action=Op, nargs=0, const='recompute',
+        help='renumber variants within each room type, like Edit > Recompute Room IDs')
+    ops.add_argument('--convert', dest='ops', action=Op, nargs=0, const='convert',
+        help='write .txt room files out as .stb')
+
+    parser.add_argument('--txt', action='store_true', help='also pick up .txt room files when searching directories')
+    parser.add_argument('--out', help='write results under this directory, mirroring the input tree, instead of in place')
+    parser.add_argument('--dry-run', action='store_true', help="run the operations but don't write anything")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(), help='worker processes, 1 runs everything in this process')
+    parser.add_argument('--report', help='where to write the JSON report, - for stdout')
+    parser.add_argument('--resources', default='resources', help='resource folder with the entity and stage xml')
+
+    return parser
+
+def findFiles(paths, txt=False):
+    '''Returns (file, root) for every room file, root being what the file's output path is relative to'''
+    patterns = [ '*.stb' ] + (txt and [ '*.txt' ] or [])
+
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append((path, os.path.dirname(path)))
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if any(fnmatch.fnmatch(name.lower(), pattern) for pattern in patterns):
+                    files.append((os.path.join(dirpath, name), path))
+
+    return files
+
+def outputPath(path, root, out):
+    path = os.path.splitext(path)[0] + '.stb'
+    if not out:
+        return path
+    return os.path.join(out, os.path.relpath(path, root))
+
+def initWorker(resources):
+    brcore.loadData(resources)
+
+def processFile(path, root, ops, out=None, dryRun=False):
+    '''Opens a room file, applies ops to it, and saves it if anything changed. Returns the report entry'''
+    start = time.perf_counter()
+
+    report = {
+        'path': path,
+        'output': None,
+        'rooms': 0,
+        'bytes': 0,
+        'changed': False,
+        'operations': [],
+        'problems': [],
+        'warnings': [],
+        'error': None
+    }
+
+    # the codec prints what it finds wrong while decoding, keep that with the file it came from
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            report['bytes'] = os.path.getsize(path)
+
+            isTXT = os.path.splitext(path)[1].lower() == '.txt'
+            if isTXT:
+                with open(path, encoding='utf-8') as f:
+                    rooms = brcore.readTXTRooms(f.read())
+            else:
+                rooms = brcore.openSTB(path)
+                if rooms is None:
+                    raise ValueError('not an STB file')
+
+            report['rooms'] = len(rooms)
+
+            changed = False
+            for op, arg in ops:
+                result = { 'op': op }
+
+                if op == 'validate':
+                    problems = brcore.validateRooms(rooms)
+                    report['problems'] += problems
+                    result['problems'] = len(problems)
+
+                elif op == 'replace':
+                    numEnts, numRooms = brcore.replaceEntities(rooms, *arg)
+                    result.update(entities=numEnts, rooms=numRooms)
+                    changed = changed or numEnts > 0
+
+                elif op == 'sort':
+                    key = arg == 'ids' and brcore.Room.IDSortKey or brcore.Room.NameSortKey
+                    order = sorted(rooms, key=key)
+                    moved = sum(a is not b for a, b in zip(order, rooms))
+                    rooms = order
+                    result['moved'] = moved
+                    changed = changed or moved > 0
+
+                elif op == 'recompute':
+                    numRooms = brcore.recomputeRoomIDs(rooms)
+                    result['rooms'] = numRooms
+                    changed = changed or numRooms > 0
+
+                elif op == 'convert':
+                    result['converted'] = isTXT
+                    changed = changed or isTXT
+
+                report['operations'].append(result)
+
+            # there's no writer for the text format, so text files are only saved when converting them
+            if isTXT and not any(op == 'convert' for op, arg in ops):
+                if changed:
+                    print('Not saved, .txt files are only written out with --convert')
+            elif changed or out:
+                target = outputPath(path, root, out)
+                report['changed'] = changed
+                report['output'] = target
+
+                if not dryRun:
+                    snapshot = brcore.snapshotRooms(rooms)
+                    brcore.releaseSTB(path)
+
+                    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+                    brcore.writeFileAtomic(target, lambda f: f.write(brcore.packSTB(snapshot)))
+
+            brcore.releaseSTB(path)
+    except Exception as e:
+        report['error'] = f'{type(e).__name__}: {e}'
+        print(traceback.format_exc(), file=log)
+
+    report['warnings'] = log.getvalue().splitlines()
+    report['seconds'] = round(time.perf_counter() - start, 4)
+
+    return report
+
+def run(files, ops, out=None, dryRun=False, jobs=None, resources='resources', progress=None):
+    '''Processes every (file, root), in worker processes unless jobs is 1. Returns the reports in file order'''
+    reports = []
+
+    if jobs == 1 or len(files) < 2:
+        initWorker(resources)
+        for path, root in files:
+            reports.append(processFile(path, root, ops, out, dryRun))
+            if progress: progress(reports[-1])
+        return reports
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initWorker, initargs=(resources,)) as pool:
+        futures = [ pool.submit(processFile, path, root, ops, out, dryRun) for path, root in files ]
+        for future in as_completed(futures):
+            if progress: progress(future.result())
+
+        reports = [ future.result() for future in futures ]
+
+    return reports
+
+def summarize(reports, seconds):
+    summary = {
+        'files': len(reports),
+        'failed': sum(1 for r in reports if r['error']),
+        'changed': sum(1 for r in reports if r['changed']),
+        'problems': sum(len(r['problems']) for r in reports),
+        'rooms': sum(r['rooms'] for r in reports),
+        'bytes': sum(r['bytes'] for r in reports),
+        'seconds': round(seconds, 3)
+    }
+
+    seconds = max(seconds, 1e-9)
+    summary['filesPerSecond'] = round(summary['files'] / seconds, 1)
+    summary['roomsPerSecond'] = round(summary['rooms'] / seconds, 1)
+    summary['mbPerSecond'] = round(summary['bytes'] / seconds / (1024 * 1024), 2)
+
+    return summary
+
+def main(argv=None):
+    args = makeParser().parse_args(argv)
+    ops = args.ops or []
+
+    files = findFiles(args.paths, args.txt)
+    if not files:
+        print('No room files found', file=sys.stderr)
+        return 1
+
+    def progress(report):
+        status = report['error'] and f"failed: {report['error']}" \
+              or report['problems'] and f"{len(report['problems'])} problems" \
+              or report['changed'] and 'changed' \
+              or 'ok'
+        print(f"{report['path']}: {report['rooms']} rooms, {status}", file=sys.stderr)
+
+    start = time.perf_counter()
+    reports = run(files, ops, args.out, args.dry_run, max(1, args.jobs or 1), args.resources, progress)
+    summary = summarize(reports, time.perf_counter() - start)
+
+    if args.report:
+        doc = json.dumps({ 'files': reports, 'summary': summary }, indent=2)
+        if args.report == '-':
+            print(doc)
+        else:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                f.write(doc)
+
+    print(f"{summary['files']} files, {summary['rooms']} rooms in {summary['seconds']}s: "
+          f"{summary['filesPerSecond']} files/s, {summary['roomsPerSecond']} rooms/s, {summary['mbPerSecond']} MB/s. "
+          f"{summary['changed']} changed, {summary['problems']} problems, {summary['failed']} failed",
+          file=sys.stderr)
+
+    return summary['failed'] and 2 or summary['problems'] and 3 or 0
+
+if __name__ == '__main__':
+    sys.exit(main())
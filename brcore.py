@@ -0,0 +1,1396 @@
+#!/usr/bin/python3
+###########################################
+#
+#    Basement Renovator core
+#
+#    The room model, file formats, and entity/stage data, without any Qt.
+#    BasementRenovator.py draws on top of this, scripts can import it directly:
+#
+#        import brcore
+#        brcore.loadData()
+#        rooms = brcore.openSTB('rooms.stb')
+#
+
+from itertools import islice
+
+import gc, mmap, weakref, struct, os, re, shutil, tempfile, contextlib, hashlib, marshal, bisect
+import xml.etree.ElementTree as ET
+
+########################
+#       XML Data       #
+########################
+
+# bump whenever the compiled format changes
+CompiledXMLVersion = 2
+
+# format version and sha256 of the xml, checked before the rest of a compiled file is read
+CompiledXMLHeader = struct.Struct('<I32s')
+
+def loadXML(path):
+    '''Parses an xml file of flat elements, like the entity and stage lists. The elements get compiled into
+    path + '.compiled' the first time, which is loaded instead of parsing for as long as the xml's hash matches.
+    The elements are stored with marshal, which only ever builds plain values, so a bad compiled file can't run anything'''
+
+    with open(path, 'rb') as f:
+        source = f.read()
+
+    sourceHash = hashlib.sha256(source).digest()
+    compiledPath = path + '.compiled'
+
+    try:
+        with open(compiledPath, 'rb') as f:
+            header = f.read(CompiledXMLHeader.size)
+            current = CompiledXMLHeader.unpack(header) == (CompiledXMLVersion, sourceHash)
+            if current:
+                tag, attrib, children = marshal.loads(f.read())
+
+        if current:
+            root = ET.Element(tag, attrib)
+            root.extend([ ET.Element(childTag, childAttrib) for childTag, childAttrib in children ])
+            return root
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f'Recompiling {path}:', e)
+
+    root = ET.fromstring(source)
+
+    # only attributes are kept, so anything with text or nested elements has to be parsed every time
+    if any(len(el) or (el.text or '').strip() for el in root):
+        return root
+
+    compiled = CompiledXMLHeader.pack(CompiledXMLVersion, sourceHash)
+    compiled += marshal.dumps((root.tag, dict(root.attrib), [ (el.tag, dict(el.attrib)) for el in root ]))
+    try:
+        writeFileAtomic(compiledPath, lambda f: f.write(compiled))
+    except OSError as e:
+        print(f'Could not save compiled {path}:', e)
+
+    return root
+
+def getEntityXML(resources='resources'):
+    return loadXML(os.path.join(resources, 'EntitiesAfterbirthPlus.xml'))
+
+def getStageXML(resources='resources'):
+    return loadXML(os.path.join(resources, 'StagesAfterbirthPlus.xml'))
+
+class EntityRegistry:
+    """Hashed lookups over the entity xml, so finding an entity doesn't mean scanning every node"""
+
+    def __init__(self, root):
+        self.root = root
+
+        # (type, variant, subtype) -> entities in document order; the first one wins, same as find()
+        self.byKey = {}
+        self.byKind = {}
+        self.byGroup = {}
+        self.byName = {}
+
+        # entities that can be in a room without it counting as non-empty, by (type, variant, subtype)
+        self.byInEmptyRooms = {}
+
+        # per-entity data derived by the editor (Entity.Definitions), dropped whenever the entity changes
+        self.definitions = {}
+
+        for en in root.findall('entity'):
+            self.index(en)
+
+    @staticmethod
+    def getKey(en):
+        try:
+            return (int(en.get('ID')), int(en.get('Variant')), int(en.get('Subtype')))
+        except (TypeError, ValueError):
+            return None
+
+    def _indexes(self, en):
+        return [
+            (self.byKey, EntityRegistry.getKey(en)),
+            (self.byKind, en.get('Kind')),
+            (self.byGroup, en.get('Group')),
+            (self.byName, en.get('Name')),
+            (self.byInEmptyRooms, en.get('InEmptyRooms') == '1' and EntityRegistry.getEmptyRoomKey(en) or None)
+        ]
+
+    @staticmethod
+    def getEmptyRoomKey(en):
+        # unlike getKey, a missing variant or subtype means 0 here
+        try:
+            return (int(en.get('ID')), int(en.get('Variant') or 0), int(en.get('Subtype') or 0))
+        except (TypeError, ValueError):
+            return None
+
+    def index(self, en):
+        self.definitions.pop(EntityRegistry.getKey(en), None)
+
+        for table, key in self._indexes(en):
+            if key is None: continue
+            table.setdefault(key, []).append(en)
+
+    def unindex(self, en):
+        self.definitions.pop(EntityRegistry.getKey(en), None)
+
+        for table, key in self._indexes(en):
+            ents = table.get(key)
+            if not ents: continue
+
+            ents.remove(en)
+            if not ents:
+                del table[key]
+
+    def find(self, t, v, s):
+        ents = self.byKey.get((int(t), int(v), int(s)))
+        return ents[0] if ents else None
+
+    def mirrored(self, t, v, s, axis):
+        '''Returns the (type, variant, subtype) the entity turns into when its room is flipped along axis ('X' or 'Y'), or None'''
+
+        en = self.find(t, v, s)
+        mirror = en is not None and en.get('Mirror' + axis)
+        return mirror and tuple(map(int, mirror.split('.'))) or None
+
+    def ofKind(self, kind):
+        return self.byKind.get(kind, [])
+
+    def ofGroup(self, group):
+        return self.byGroup.get(group, [])
+
+    def named(self, name):
+        return self.byName.get(name, [])
+
+    def inEmptyRooms(self):
+        '''(type, variant, subtype) of every entity marked InEmptyRooms, which don't stop a room from counting as empty'''
+        return set(self.byInEmptyRooms)
+
+    def add(self, en):
+        '''Adds an entity to the xml, overriding the current entry with the same type, variant, and subtype if there is one.
+        Returns the overridden entity.'''
+
+        key = EntityRegistry.getKey(en)
+        existing = self.find(*key) if key else None
+        if existing is not None:
+            self.remove(existing)
+
+        self.root.append(en)
+        self.index(en)
+
+        return existing
+
+    def remove(self, en):
+        self.root.remove(en)
+        self.unindex(en)
+
+class EntitySearch:
+    """Ranked, typo tolerant search over entities by name, group, kind, and type.variant.subtype.
+
+    Every word in those is indexed once up front. Prefixes are found with a binary search over the sorted
+    words, and a trigram index narrows down the words a query could be inside of or a typo away from,
+    so a search only looks at the few words that could match rather than at every entity."""
+
+    # how much a match in each field counts towards an entity's score
+    Fields = [ ('Name', 1.0), ('Group', 0.5), ('Kind', 0.4) ]
+    KeyWeight = 1.0
+
+    # how much each way of matching a word counts, typos lose a share per edit
+    Exact = 1.0
+    Prefix = 0.8
+    Substring = 0.6
+    Typo = 0.4
+
+    # words, or type.variant.subtype style numbers, apostrophes are dropped so "moms" finds "Mom's"
+    WordPattern = re.compile(r'\d+(?:\.\d+)*\.?|[^\W_]+')
+
+    def __init__(self, ents):
+        self.ents = list(ents)
+        self.nameLengths = [ len(en.get('Name') or '') for en in self.ents ]
+
+        # word -> { entity index: best field weight the word appears in }
+        self.postings = {}
+        for i, en in enumerate(self.ents):
+            fields = [ (EntitySearch.words(en.get(attr)), weight) for attr, weight in EntitySearch.Fields ]
+
+            key = EntityRegistry.getKey(en)
+            if key is not None:
+                fields.append(([ '.'.join(map(str, key)) ], EntitySearch.KeyWeight))
+
+            for words, weight in fields:
+                for word in words:
+                    found = self.postings.setdefault(word, {})
+                    if found.get(i, 0) < weight:
+                        found[i] = weight
+
+        self.sortedWords = sorted(self.postings)
+
+        # trigram -> words containing it
+        self.trigrams = {}
+        for word in self.sortedWords:
+            for gram in EntitySearch.trigramsOf(word):
+                self.trigrams.setdefault(gram, []).append(word)
+
+    @staticmethod
+    def words(text):
+        if not text: return []
+        return EntitySearch.WordPattern.findall(text.casefold().replace("'", ''))
+
+    @staticmethod
+    def trigramsOf(word):
+        padded = f' {word} '
+        return { padded[i:i + 3] for i in range(len(padded) - 2) }
+
+    @staticmethod
+    def maxTypos(word):
+        if len(word) < 4: return 0
+        return len(word) < 8 and 1 or 2
+
+    @staticmethod
+    def oneEdit(a, b):
+        '''Whether two different words are one insertion, deletion, substitution, or swap of neighbours apart'''
+        if abs(len(a) - len(b)) > 1:
+            return False
+
+        i = 0
+        while i < len(a) and i < len(b) and a[i] == b[i]:
+            i += 1
+
+        if len(a) > len(b): return a[i + 1:] == b[i:]
+        if len(a) < len(b): return a[i:] == b[i + 1:]
+
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+
+    @staticmethod
+    def distance(a, b, limit):
+        '''Edit distance counting swapped neighbours as one edit, or limit + 1 once it's clearly past limit'''
+        if abs(len(a) - len(b)) > limit:
+            return limit + 1
+
+        # the usual case, which doesn't need the whole table
+        if limit == 1:
+            return a != b and (EntitySearch.oneEdit(a, b) and 1 or 2) or 0
+
+        prev2 = None
+        prev = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            row = [ i ] + [ 0 ] * len(b)
+            for j in range(1, len(b) + 1):
+                cost = a[i - 1] != b[j - 1]
+                row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + cost)
+                if prev2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    row[j] = min(row[j], prev2[j - 2] + 1)
+
+            if min(row) > limit:
+                return limit + 1
+            prev2, prev = prev, row
+
+        return prev[-1]
+
+    def matchWord(self, query):
+        '''Returns { indexed word: score } for every word the query word could be'''
+        matches = {}
+
+        # numbers only match whole parts from the start, 10 finds 10.1.0 but not 100.1.0 or 110.1.0
+        numeric = query[0].isdigit()
+        wholeParts = numeric and not query.endswith('.')
+
+        # the query as the start of a word, which includes matching it exactly
+        start = bisect.bisect_left(self.sortedWords, query)
+        for word in islice(self.sortedWords, start, None):
+            if not word.startswith(query): break
+            if wholeParts and len(word) > len(query) and word[len(query)] != '.': continue
+            matches[word] = word == query and EntitySearch.Exact or EntitySearch.Prefix
+
+        if len(query) < 3 or numeric:
+            return matches
+
+        # anything inside a word has all the query's inner trigrams, and a typo can only spoil three
+        typos = EntitySearch.maxTypos(query)
+        grams = EntitySearch.trigramsOf(query)
+        needed = max(1, min(len(query) - 2, len(grams) - 3 * typos - 1))
+
+        shared = {}
+        for gram in grams:
+            for word in self.trigrams.get(gram, ()):
+                shared[word] = shared.get(word, 0) + 1
+
+        for word, count in shared.items():
+            if count < needed or word in matches: continue
+
+            if query in word:
+                matches[word] = EntitySearch.Substring
+
+            # typos are only looked for after the first letter, like most spell checkers, which rules out most words
+            elif typos and word[0] == query[0]:
+                # a typo in the start of a longer word counts as well
+                edits = EntitySearch.distance(query, word[:len(query)], typos)
+                if len(word) != len(query) and len(word) <= len(query) + typos:
+                    edits = min(edits, EntitySearch.distance(query, word, typos))
+
+                if edits <= typos:
+                    matches[word] = EntitySearch.Typo / edits
+
+        return matches
+
+    def search(self, query):
+        '''Returns the entities matching every word of the query, best first, then shortest name first'''
+        scores = None
+        for query in EntitySearch.words(query):
+            found = {}
+            for word, score in self.matchWord(query).items():
+                for i, weight in self.postings[word].items():
+                    if found.get(i, 0) < score * weight:
+                        found[i] = score * weight
+
+            if scores is None:
+                scores = found
+            else:
+                scores = { i: score + found[i] for i, score in scores.items() if i in found }
+
+            if not scores: return []
+
+        if scores is None: return []
+
+        return [ self.ents[i] for i in sorted(scores, key=lambda i: (-scores[i], self.nameLengths[i], i)) ]
+
+# the data rooms are checked against, set by loadData or by the editor through setData
+entityXML = None
+stageXML = None
+entityRegistry = None
+
+def setData(entities, stages, registry=None):
+    global entityXML, stageXML, entityRegistry
+
+    entityXML = entities
+    stageXML = stages
+    entityRegistry = registry or EntityRegistry(entities)
+
+def loadData(resources='resources'):
+    '''Loads the base game's entity and stage xml, mods aren't included'''
+    setData(getEntityXML(resources), getStageXML(resources))
+    return entityRegistry
+
+########################
+#        Rooms         #
+########################
+
+class Room:
+
+    # contains concrete room information necessary for examining a room's game qualities
+    # such as type, variant, subtype, and shape information
+    class Info:
+        ########## SHAPE DEFINITIONS
+        # w x h
+        # 1 = 1x1, 2 = 1x0.5, 3 = 0.5x1, 4 = 1x2, 5 = 0.5x2, 6 = 2x1, 7 = 2x0.5, 8 = 2x2
+        # 9 = DR corner, 10 = DL corner, 11 = UR corner, 12 = UL corner
+        # all coords must be offset -1, -1 when saving
+        Shapes = {
+            1: { # 1x1
+                'Doors': [[7, 0], [0, 4], [14, 4], [7, 8]],
+                # format: min, max on axis, cross axis coord, normal direction along cross axis
+                'Walls': {
+                    'X': [ (0, 14, 0, 1), (0, 14, 8, -1) ],
+                    'Y': [ (0, 8, 0, 1), (0, 8, 14, -1) ]
+                },
+                'Dims': (15, 9)
+            },
+            2: { # horizontal closet (1x0.5)
+                'Doors': [[0, 4], [14, 4]],
+                'Walls': {
+                    'X': [ (0, 14, 2, 1), (0, 14, 6, -1) ],
+                    'Y': [ (2, 6, 0, 1), (2, 6, 14, -1) ]
+                },
+                'TopLeft': 30, # Grid coord
+                'BaseShape': 1, # Base Room shape this is rendered over
+                'Dims': (15, 5)
+            },
+            3: { # vertical closet (0.5x1)
+                'Doors': [[7, 0], [7, 8]],
+                'Walls': {
+                    'X': [ (4, 10, 0, 1), (4, 10, 8, -1) ],
+                    'Y': [ (0, 8, 4, 1), (0, 8, 10, -1) ]
+                },
+                'TopLeft': 4,
+                'BaseShape': 1,
+                'Dims': (7, 9)
+            },
+            4: { # 1x2 room
+                'Doors': [[7, 0], [14, 4], [0, 4], [14, 11], [0, 11], [7, 15]],
+                'Walls': {
+                    'X': [ (0, 14, 0, 1), (0, 14, 15, -1) ],
+                    'Y': [ (0, 15, 0, 1), (0, 15, 14, -1) ]
+                },
+                'Dims': (15, 16)
+            },
+            5: { # tall closet (0.5x2)
+                'Doors': [[7, 0], [7, 15]],
+                'Walls': {
+                    'X': [ (4, 10, 0, 1), (4, 10, 15, -1) ],
+                    'Y': [ (0, 15, 4, 1), (0, 15, 10, -1) ]
+                },
+                'TopLeft': 4,
+                'BaseShape': 4,
+                'Dims': (7, 16)
+            },
+            6: { # 2x1 room
+                'Doors': [[7, 0], [0, 4], [7, 8], [20, 8], [27, 4], [20, 0]],
+                'Walls': {
+                    'X': [ (0, 27, 0, 1), (0, 27, 8, -1) ],
+                    'Y': [ (0, 8, 0, 1), (0, 8, 27, -1) ]
+                },
+                'Dims': (28, 9)
+            },
+            7: { # wide closet (2x0.5)
+                'Doors': [[0, 4], [27, 4]],
+                'Walls': {
+                    'X': [ (0, 27, 2, 1), (0, 27, 6, -1) ],
+                    'Y': [ (2, 6, 0, 1), (2, 6, 27, -1) ]
+                },
+                'TopLeft': 56,
+                'BaseShape': 6,
+                'Dims': (28, 5)
+            },
+            8: { # 2x2 room
+                'Doors': [[7, 0], [0, 4], [0, 11], [20, 0], [7, 15], [20, 15], [27, 4], [27, 11]],
+                'Walls': {
+                    'X': [ (0, 27, 0, 1), (0, 27, 15, -1) ],
+                    'Y': [ (0, 15, 0, 1), (0, 15, 27, -1) ]
+                },
+                'Dims': (28, 16)
+            },
+            9: { # mirrored L room
+                'Doors': [[20, 0], [27, 4], [7, 15], [20, 15], [13, 4], [0, 11], [27, 11], [7, 7]],
+                'Walls': {
+                    'X': [ (0, 13, 7, 1), (13, 27, 0, 1), (0, 27, 15, -1) ],
+                    'Y': [ (7, 15, 0, 1), (0, 7, 13, 1), (0, 15, 27, -1) ]
+                },
+                'BaseShape': 8,
+                'MirrorX': 10,
+                'MirrorY': 11,
+                'Dims': (28, 16)
+            },
+            10: { # L room
+                'Doors': [[0, 4], [14, 4], [7, 0], [20, 7], [7, 15], [20, 15], [0, 11], [27, 11]],
+                'Walls': {
+                    'X': [ (0, 14, 0, 1), (14, 27, 7, 1), (0, 27, 15, -1) ],
+                    'Y': [ (0, 15, 0, 1), (0, 7, 14, -1), (7, 15, 27, -1) ]
+                },
+                'BaseShape': 8,
+                'MirrorX': 9,
+                'MirrorY': 12,
+                'Dims': (28, 16)
+            },
+            11: { # mirrored r room
+                'Doors': [[0, 4], [7, 8], [7, 0], [13, 11], [20, 0], [27, 4], [20, 15], [27, 11]],
+                'Walls': {
+                    'X': [ (0, 27, 0, 1), (0, 13, 8, -1), (13, 27, 15, -1) ],
+                    'Y': [ (0, 8, 0, 1), (8, 15, 13, 1), (0, 15, 27, -1) ]
+                },
+                'BaseShape': 8,
+                'MirrorX': 12,
+                'MirrorY': 9,
+                'Dims': (28, 16)
+            },
+            12: { # r room
+                'Doors': [[0, 4], [7, 0], [20, 0], [14, 11], [27, 4], [7, 15], [0, 11], [20, 8]],
+                'Walls': {
+                    'X': [ (0, 27, 0, 1), (14, 27, 8, -1), (0, 14, 15, -1) ],
+                    'Y': [ (0, 15, 0, 1), (8, 15, 14, -1), (0, 8, 27, -1) ]
+                },
+                'BaseShape': 8,
+                'MirrorX': 11,
+                'MirrorY': 10,
+                'Dims': (28, 16)
+            }
+        }
+
+        for shape in Shapes.values():
+            for door in shape['Doors']:
+                door.append(True)
+
+        def __init__(self, t=0, v=0, s=0, shape=1):
+            # set by rooms whose doors haven't been decoded yet
+            self.loader = None
+
+            self.type = t
+            self.variant = v
+            self.subtype = s
+            self.shape = shape
+
+        @property
+        def doors(self):
+            if self.loader: self.loader()
+            return self._doors
+
+        @doors.setter
+        def doors(self, doors):
+            if self.loader: self.loader()
+            self._doors = doors
+
+        @property
+        def shape(self):
+            return self._shape
+
+        @shape.setter
+        def shape(self, val):
+            self._shape = val
+            self.shapeData = Room.Info.Shapes[self.shape]
+            bs = self.shapeData.get('BaseShape')
+            self.baseShapeData = bs and Room.Info.Shapes[bs]
+            self.makeNewDoors()
+
+        # represents the actual dimensions of the room, including out of bounds
+        @property
+        def dims(self): return (self.baseShapeData or self.shapeData)['Dims']
+
+        @property
+        def width(self): return self.shapeData['Dims'][0]
+
+        @property
+        def height(self): return self.shapeData['Dims'][1]
+
+        def makeNewDoors(self):
+            self.doors = [ door[:] for door in self.shapeData['Doors'] ]
+
+        def gridLen(self):
+            dims = self.dims
+            return dims[0] * dims[1]
+
+        def gridIndex(x,y,w):
+            return y * w + x
+
+        def _axisBounds(a, c, w):
+            wmin, wmax, wlvl, wdir = w
+            return a < wmin or a > wmax or ((c > wlvl) - (c < wlvl)) == wdir
+
+        BoundsCache = {}
+
+        def inBoundsCells(self):
+            '''The set of in bounds (x, y) within the room's dims, worked out once per shape'''
+            cells = Room.Info.BoundsCache.get(self.shape)
+            if cells is None:
+                w, h = self.dims
+                cells = Room.Info.BoundsCache[self.shape] = frozenset((x, y) for x in range(w) for y in range(h) if self.isInBounds(x, y))
+            return cells
+
+        def isInBounds(self, x,y):
+            return all(Room.Info._axisBounds(x,y,w) for w in self.shapeData['Walls']['X']) and \
+                   all(Room.Info._axisBounds(y,x,w) for w in self.shapeData['Walls']['Y'])
+
+        def snapToBounds(self, x,y,dist=1):
+            for w in self.shapeData['Walls']['X']:
+                if not Room.Info._axisBounds(x,y,w):
+                    y = w[2] + w[3] * dist
+
+            for w in self.shapeData['Walls']['Y']:
+                if not Room.Info._axisBounds(y,x,w):
+                    x = w[2] + w[3] * dist
+
+            return (x, y)
+
+
+    def __init__(self, name="New Room", spawns=[], difficulty=1, weight=1.0, mytype=1, variant=0, subtype=0, shape=1, doors=None, body=None):
+        """Initializes the room item. If body is given, doors and spawns are decoded from it on first use instead."""
+
+        self.name = name
+
+        self.model = None
+        self.entityIndex = None
+        self.marked = False
+
+        # cached by encodeRoomBody, reset whenever the contents change
+        self.encoded = None
+
+        self.difficulty = difficulty
+        self.weight = weight
+
+        self.info = Room.Info(mytype, variant, subtype, shape)
+
+        self.body = body
+        if body is not None:
+            self.info.loader = self.load
+        else:
+            self.setContents(spawns, doors)
+
+        # stage background, picked by setRoomBG the first time the room is shown
+        self.roomBG = None
+
+    def setContents(self, spawns, doors):
+        if doors:
+            if len(self.info.doors) != len(doors):
+                print(f'{self.name} ({self.info.variant}): Invalid doors!', doors)
+            self.info.doors = doors
+
+        self.gridSpawns = spawns or [ [] for x in range(self.info.gridLen()) ]
+        if self.info.gridLen() != len(self.gridSpawns):
+            print(f'{self.name} ({self.info.variant}): Invalid grid spawns!')
+
+    def load(self):
+        '''Decodes the doors and spawns of a room read from an STB file, if that hasn't happened yet'''
+        if self.body is not None:
+            decodeRoomBodies([ self ])
+
+    @property
+    def gridSpawns(self):
+        if self.body is not None: self.load()
+        return self._gridSpawns
+
+    @gridSpawns.setter
+    def gridSpawns(self, g):
+        if self.body is not None: self.load()
+        self._gridSpawns = g
+        self.updateSpawnInfo()
+
+    @property
+    def entities(self):
+        if self.body is not None: self.load()
+        return self._entities
+
+    def updateSpawnInfo(self):
+        '''Recounts the spawns and the set of entity types in the room, call after editing gridSpawns or doors in place'''
+
+        self.encoded = None
+
+        self._spawnCount = 0
+        entities = set()
+        for entStack in self.gridSpawns:
+            if entStack:
+                self._spawnCount += 1
+                for ent in entStack:
+                    entities.add((ent[0], ent[1], ent[2]))
+
+        self._entities = entities
+        if self.entityIndex:
+            self.entityIndex.update(self)
+
+    DoorSortKey = lambda door: (door[0], door[1])
+
+    def getSpawnCount(self):
+        if self.body is not None: self.load()
+        return self._spawnCount
+
+    def reshape(self, shape, doors=None):
+        spawnIter = self.spawns()
+
+        self.info.shape = shape
+        if doors: self.info.doors = doors
+        realWidth = self.info.dims[0]
+
+        gridLen = self.info.gridLen()
+        newGridSpawns = [ [] for x in range(gridLen) ]
+
+        for stack, x, y in spawnIter:
+            idx = Room.Info.gridIndex(x, y, realWidth)
+            if idx < gridLen:
+                newGridSpawns[idx] = stack
+
+        self.gridSpawns = newGridSpawns
+
+    def getDesc(info, name, difficulty, weight):
+        return f'{name} ({info.type}.{info.variant}.{info.subtype}) ({info.width-2}x{info.height-2}) - Difficulty: {difficulty}, Weight: {weight}, Shape: {info.shape}'
+
+    def update(self):
+        """Redraws the room's row in the room list, call after changing anything shown there"""
+        if self.model:
+            self.model.update(self)
+
+    def spawns(self):
+        '''Iterates (stack, x, y) for every non-empty grid square. The grid and its dimensions
+        are bound when this is called, so it can be used across a reshape'''
+        width, height = self.info.dims
+        return ( (stack, idx % width, idx // width) for idx, stack in enumerate(islice(self.gridSpawns, width * height)) if stack )
+
+    SpecialBG = [
+        "0a_library", "0b_shop", "0c_isaacsroom", "0d_barrenroom",
+        "0e_arcade", "0e_diceroom", "0f_secretroom"
+    ]
+
+    for i in range(len(SpecialBG)):
+        prefix = SpecialBG[i]
+        SpecialBG[i] = ET.Element('room', {
+            "OuterBG": os.path.join("resources/Backgrounds", prefix + ".png"),
+            "InnerBG": os.path.join("resources/Backgrounds", prefix + "Inner.png")
+        })
+
+    def setRoomBG(self, path=''):
+        '''Picks the stage background from the room's type, and from path, the file the room was opened from'''
+
+        roomsByStage = stageXML.findall('stage')
+
+        getBG = lambda name: stageXML.find(f'stage[@Name="{name}"]')
+
+        self.roomBG = getBG('Basement')
+
+        for room in roomsByStage:
+            if room.get('Pattern') in path:
+                self.roomBG = room
+
+        c = self.info.type
+        v = self.info.variant
+
+        if c == 12: # library
+            self.roomBG = Room.SpecialBG[0]
+        elif c == 2: # shop
+            self.roomBG = Room.SpecialBG[1]
+        elif c == 18: # bedroom
+            self.roomBG = Room.SpecialBG[2]
+        elif c == 19: # barren room
+            self.roomBG = Room.SpecialBG[3]
+        elif c == 9: # arcade
+            self.roomBG = Room.SpecialBG[4]
+        elif c == 21: # dice room
+            self.roomBG = Room.SpecialBG[5]
+        elif c == 7: # secret room
+            self.roomBG = Room.SpecialBG[6]
+
+        # curse, challenge, sacrifice, devil, boss rush, black market
+        elif c in [10, 11, 13, 14, 17, 22]:
+            self.roomBG = getBG('Sheol')
+        # angel
+        elif c in [15]:
+            self.roomBG = getBG('Cathedral')
+        # chest room
+        elif c in [20]:
+            self.roomBG = getBG('Chest')
+        # error, crawlspace
+        elif c in [3, 16]:
+            self.roomBG = getBG('Dark Room')
+
+        # super secret
+        elif c in [8]:
+            if v in [0, 11, 15]:
+                self.roomBG = getBG('Womb')
+            elif v in [1, 12, 16]:
+                self.roomBG = getBG('Cathedral')
+            elif v in [2, 13, 17]:
+                self.roomBG = getBG('Sheol')
+            elif v in [3]:
+                self.roomBG = getBG('Necropolis')
+            elif v in [4]:
+                self.roomBG = getBG('Cellar')
+            elif v in [5, 19]:
+                self.roomBG = getBG('Basement')
+            elif v in [6]:
+                self.roomBG = Room.SpecialBG[0]
+            elif v in [7]:
+                self.roomBG = getBG('Dark Room')
+            elif v in [8]:
+                self.roomBG = getBG('Burning Basement')
+            elif v in [9]:
+                self.roomBG = getBG('Flooded Caves')
+            elif v in [14, 18]:
+                self.roomBG = Room.SpecialBG[1]
+            else:
+                self.roomBG = getBG('Dark Room')
+        # grave rooms
+        elif c == 1 and v > 2 and 'special rooms' in path:
+            self.roomBG = getBG('Dark Room')
+
+    def mirrorX(self):
+        # Flip Spawns
+        width, height = self.info.dims
+        for y in range(height):
+            for x in range(int(width / 2)):
+                ox = Room.Info.gridIndex(x,y,width)
+                mx = Room.Info.gridIndex(width-x-1,y,width)
+                oxs = self.gridSpawns[ox]
+                self.gridSpawns[ox] = self.gridSpawns[mx]
+                self.gridSpawns[mx] = oxs
+
+        # Flip Doors
+        for door in self.info.doors:
+            door[0] = width - door[0] - 1
+
+        # Flip Directional Entities
+        for stack, x, y in self.spawns():
+            for spawn in stack:
+                mirror = entityRegistry.mirrored(spawn[0], spawn[1], spawn[2], 'X')
+                if mirror:
+                    spawn[:3] = mirror
+
+        self.updateSpawnInfo()
+
+        # Flip Shape
+        shape = self.info.shapeData.get('MirrorX')
+        if shape:
+            self.reshape(shape, self.info.doors)
+
+    def mirrorY(self):
+        # Flip Spawns
+        width, height = self.info.dims
+        for x in range(width):
+            for y in range(int(height / 2)):
+                oy = Room.Info.gridIndex(x,y,width)
+                my = Room.Info.gridIndex(x,height-y-1,width)
+                oys = self.gridSpawns[oy]
+                self.gridSpawns[oy] = self.gridSpawns[my]
+                self.gridSpawns[my] = oys
+
+
+        # Flip Doors
+        for door in self.info.doors:
+            door[1] = height - door[1] - 1
+
+        # Flip Directional Entities
+        for stack, x, y in self.spawns():
+            for spawn in stack:
+                mirror = entityRegistry.mirrored(spawn[0], spawn[1], spawn[2], 'Y')
+                if mirror:
+                    spawn[:3] = mirror
+
+        self.updateSpawnInfo()
+
+        # Flip Shape
+        shape = self.info.shapeData.get('MirrorY')
+        if shape:
+            self.reshape(shape, self.info.doors)
+
+    IDSortKey = lambda room: (room.info.type, room.info.variant)
+    NameSortKey = lambda room: (room.info.type, room.name, room.info.variant)
+
+def recomputeRoomIDs(rooms):
+    '''Renumbers rooms so variants count up within each room type, starting from the first room of that type.
+    Returns the number of rooms that changed'''
+    roomsByType = {}
+    changed = 0
+
+    for room in rooms:
+        if room.info.type not in roomsByType:
+            roomsByType[room.info.type] = room.info.variant
+
+        if room.info.variant != roomsByType[room.info.type]:
+            room.info.variant = roomsByType[room.info.type]
+            changed += 1
+
+        roomsByType[room.info.type] += 1
+
+    return changed
+
+def replaceEntities(rooms, replaced, replacement):
+    '''Swaps every entity matching replaced for replacement, a variant or subtype below 0 matches/keeps anything.
+    Returns (entities replaced, rooms changed)'''
+    decodeRoomBodies(rooms)
+
+    numEnts = 0
+    numRooms = 0
+
+    def checkEq(a, b):
+        return a[0] == b[0] \
+          and (b[1] < 0 or a[1] == b[1]) \
+          and (b[2] < 0 or a[2] == b[2])
+
+    def fixEnt(a, b):
+        a[0] = b[0]
+        if b[1] >= 0: a[1] = b[1]
+        if b[2] >= 0: a[2] = b[2]
+
+    for currRoom in rooms:
+
+        n = 0
+        for stack, x, y in currRoom.spawns():
+            for ent in stack:
+                if checkEq(ent, replaced):
+                    fixEnt(ent, replacement)
+                    n += 1
+
+        if n > 0:
+            currRoom.updateSpawnInfo()
+            numRooms += 1
+            numEnts += n
+
+    return numEnts, numRooms
+
+def validateRooms(rooms):
+    '''Returns a description of everything the game won't like about the rooms:
+    unknown or invalid entities, missing doors, and rooms sharing a type and variant'''
+    decodeRoomBodies(rooms)
+
+    problems = []
+    seenIDs = {}
+
+    # what's wrong with each entity type, None if nothing
+    verdicts = {}
+    def check(key):
+        if key not in verdicts:
+            en = entityRegistry.find(*key)
+            verdicts[key] = en is None and f'unknown entity {key[0]}.{key[1]}.{key[2]}' \
+                or en.get('Invalid') == '1' and f"invalid entity '{en.get('Name')}' ({key[0]}.{key[1]}.{key[2]})" \
+                or None
+        return verdicts[key]
+
+    for room in rooms:
+        desc = f'{room.name} ({room.info.type}.{room.info.variant}.{room.info.subtype})'
+
+        other = seenIDs.setdefault(Room.IDSortKey(room), room)
+        if other is not room:
+            problems.append(f'{desc}: same type and variant as {other.name}')
+
+        if len(room.info.doors) != len(room.info.shapeData['Doors']):
+            problems.append(f'{desc}: has {len(room.info.doors)} doors, shape {room.info.shape} needs {len(room.info.shapeData["Doors"])}')
+
+        # only look for where the bad entities are in the rooms that have some
+        if not any(check(key) for key in room.entities): continue
+
+        for stack, x, y in room.spawns():
+            for ent in stack:
+                verdict = check((ent[0], ent[1], ent[2]))
+                if verdict:
+                    problems.append(f'{desc}: {verdict} at {x}, {y}')
+
+    return problems
+
+########################
+#      STB Files       #
+########################
+
+# the fixed size parts of an STB file, x/y coordinates are stored one less than the editor's
+STBHeader = struct.Struct('<4sI')
+STBRoomBeg = struct.Struct('<IIIBH')
+STBRoomEnd = struct.Struct('<fBBBBH')
+STBDoor = struct.Struct('<hh?')
+STBStack = struct.Struct('<hhB')
+STBEntity = struct.Struct('<HHHf')
+
+# mappings of STB files that rooms are still being decoded from, by path
+STBMaps = {}
+
+def stbKey(path):
+    return os.path.normcase(os.path.realpath(path))
+
+def openSTB(path):
+    '''Reads the rooms in an STB file through a memory mapping, so only the headers and
+    whatever rooms get decoded are actually read in. The file stays mapped until every
+    room from it has been decoded or released with releaseSTB'''
+
+    with open(path, 'rb') as f:
+        # empty files can't be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return readSTBRooms(b'')
+        stb = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        rooms = readSTBRooms(stb)
+    except:
+        stb.close()
+        raise
+
+    if not rooms:
+        stb.close()
+        return rooms
+
+    releaseSTB(detachRooms=False)
+    STBMaps.setdefault(stbKey(path), []).append((stb, weakref.WeakSet(rooms)))
+    return rooms
+
+def releaseSTB(path=None, detachRooms=True):
+    '''Closes the mappings of path (or every file). Rooms that haven't been decoded from them yet
+    get a copy of just their own bytes first. Has to be done before writing to a file, its rooms
+    would read the new contents otherwise. With detachRooms off, only mappings that nothing
+    reads from anymore are closed'''
+
+    for key in [ stbKey(path) ] if path else list(STBMaps):
+        maps = STBMaps.pop(key, [])
+        for stb, rooms in maps:
+            pending = [ room for room in rooms if room.body is not None ]
+            if pending and not detachRooms:
+                STBMaps.setdefault(key, []).append((stb, rooms))
+                continue
+
+            for room in pending:
+                _, off, end, *rest = room.body
+                room.body = (stb[off:end], 0, end - off, *rest)
+            stb.close()
+
+def readSTBRooms(stb):
+    '''Reads the room headers out of an STB file. Doors and spawns are left in the buffer
+    and only decoded when something asks for them (see Room.load)'''
+
+    # Header
+    try:
+        header, rooms = STBHeader.unpack_from(stb, 0)
+        if header.decode() != "STB1":
+            return None
+    except:
+        return None
+
+    off = STBHeader.size
+    ret = []
+
+    # shared by every room in the file so each invalid entity is only reported once
+    seenSpawns = {}
+    for room in range(rooms):
+
+        # Room Type, Room Variant, Subtype, Difficulty, Length of Room Name String
+        rtype, rvariant, rsubtype, difficulty, nameLen = STBRoomBeg.unpack_from(stb, off)
+        off += STBRoomBeg.size
+
+        # Room Name
+        roomName = stb[off:off + nameLen].decode()
+        off += nameLen
+
+        # Weight, width, height, shape, number of doors, number of entities
+        rweight, width, height, shape, numDoors, numEnts = STBRoomEnd.unpack_from(stb, off)
+        off += STBRoomEnd.size
+
+        # skip over the doors and entity stacks, the stack header's last byte is its entity count
+        bodyOff = off
+        off += STBDoor.size * numDoors
+        for stack in range(numEnts):
+            off += STBStack.size + STBEntity.size * stb[off + 4]
+
+        body = (stb, bodyOff, off, shape, numDoors, numEnts, seenSpawns)
+        ret.append(Room(roomName, None, difficulty, rweight, rtype, rvariant, rsubtype, shape, body=body))
+
+    return ret
+
+@contextlib.contextmanager
+def pausedGC():
+    '''Holds off the cyclic garbage collector. Decoding or encoding a whole file allocates a list or a
+    struct per grid square, which would otherwise set it off over and over to scan every room for nothing'''
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gcEnabled:
+            gc.enable()
+
+def decodeRoomBodies(rooms):
+    '''Decodes the doors and spawns of rooms whose headers were read by readSTBRooms'''
+
+    rooms = [ room for room in rooms if room.body is not None ]
+    if not rooms: return
+
+    with pausedGC():
+        for room in rooms:
+            decodeRoomBody(room)
+
+def decodeRoomBody(room):
+    stb, off, end, shape, numDoors, numEnts, seenSpawns = room.body
+    room.body = None
+    room.info.loader = None
+
+    bodyOff = off
+    discarded = False
+
+    doors = []
+    for door in range(numDoors):
+        # X, Y, exists
+        doorX, doorY, exists = STBDoor.unpack_from(stb, off)
+        doors.append([ doorX + 1, doorY + 1, exists ])
+        off += STBDoor.size
+
+    def sameDoorLocs(a, b):
+        for ad, bd in zip(a, b):
+            if ad[0] != bd[0] or ad[1] != bd[1]:
+                return False
+        return True
+
+    roomInfo = Room.Info(room.info.type, room.info.variant, room.info.subtype, shape)
+    def getRoomPrefix():
+        return Room.getDesc(roomInfo, room.name, room.difficulty, room.weight)
+
+    normalDoors = sorted(roomInfo.shapeData['Doors'], key=Room.DoorSortKey)
+    sortedDoors = sorted(doors, key=Room.DoorSortKey)
+    if len(normalDoors) != numDoors or not sameDoorLocs(normalDoors, sortedDoors):
+        print (f'Invalid doors in room {getRoomPrefix()}: Expected {normalDoors}, Got {sortedDoors}')
+
+    inBounds = roomInfo.inBoundsCells()
+    realWidth = roomInfo.dims[0]
+    gridLen = roomInfo.gridLen()
+    spawns = [ [] for x in range(gridLen) ]
+    for entity in range(numEnts):
+        # x, y, number of entities at this position
+        ex, ey, stackedEnts = STBStack.unpack_from(stb, off)
+        ex += 1
+        ey += 1
+        off += STBStack.size
+
+        if (ex, ey) not in inBounds and not roomInfo.isInBounds(ex, ey):
+            print (f'Found entity with out of bounds spawn loc in room {getRoomPrefix()}: {ex-1}, {ey-1}')
+
+        idx = Room.Info.gridIndex(ex, ey, realWidth)
+        if idx >= gridLen:
+            print ('Discarding the current entity due to invalid position!')
+            discarded = True
+            off += STBEntity.size * stackedEnts
+            continue
+
+        spawnSquare = spawns[idx]
+
+        for spawn in range(stackedEnts):
+            #  type, variant, subtype, weight
+            etype, evariant, esubtype, eweight = STBEntity.unpack_from(stb, off)
+            spawnSquare.append([ etype, evariant, esubtype, eweight ])
+
+            if (etype, esubtype, evariant) not in seenSpawns:
+                en = entityRegistry.find(etype, evariant, esubtype)
+                if en == None or en.get('Invalid') == '1':
+                    print(f"Room {getRoomPrefix()} has invalid entity '{en is None and 'UNKNOWN' or en.get('Name')}'! ({etype}.{evariant}.{esubtype})")
+                seenSpawns[(etype, esubtype, evariant)] = en == None or en.get('Invalid') == '1'
+
+            off += STBEntity.size
+
+    room.setContents(spawns, doors)
+
+    # as long as nothing was thrown out, the file's bytes still describe the room and don't need encoding again.
+    # Rooms saved without doors get their shape's doors instead, which is what encoding them writes
+    if not discarded and room.info.doors == doors:
+        room.encoded = (numDoors, numEnts, stb[bodyOff:end])
+
+def encodeSTB(rooms):
+    '''Encodes rooms into the contents of an STB file'''
+    return packSTB(snapshotRooms(rooms))
+
+def snapshotRooms(rooms):
+    '''Takes everything needed to encode rooms, so packSTB/packRooms can finish the job
+    on another thread while the rooms keep getting edited'''
+
+    snapshot = []
+    with pausedGC():
+        for room in rooms:
+            numDoors, numEnts, body = encodeRoomBody(room)
+            width, height = room.info.dims
+            snapshot.append((room.info.type, room.info.variant, room.info.subtype, room.difficulty, room.name.encode(),
+                             room.weight, width - 2, height - 2, room.info.shape, numDoors, numEnts, body))
+    return snapshot
+
+def packSTB(snapshot):
+    return STBHeader.pack("STB1".encode(), len(snapshot)) + packRooms(snapshot)
+
+def packRooms(snapshot):
+    '''Encodes a room snapshot as it's laid out after an STB file's header'''
+
+    out = bytearray()
+
+    for rtype, rvariant, rsubtype, difficulty, name, weight, width, height, shape, numDoors, numEnts, body in snapshot:
+        out += STBRoomBeg.pack(rtype, rvariant, rsubtype, difficulty, len(name))
+        out += name
+        out += STBRoomEnd.pack(weight, width, height, shape, numDoors, numEnts)
+        out += body
+
+    return bytes(out)
+
+def encodeRoomBody(room):
+    '''Encodes a room's doors and entity stacks, returning (number of doors, number of stacks, bytes).
+    The result is kept until the room's contents change, rooms that haven't been decoded
+    are just copied out of the file they came from'''
+
+    if room.encoded is not None:
+        return room.encoded
+
+    if room.body is not None:
+        stb, off, end, shape, numDoors, numEnts, seenSpawns = room.body
+        if numDoors:
+            room.encoded = (numDoors, numEnts, stb[off:end])
+            return room.encoded
+
+        # without doors in the file the room takes its shape's doors when decoded, so it has to be saved that way too
+        decodeRoomBody(room)
+        if room.encoded is not None:
+            return room.encoded
+
+    out = bytearray()
+
+    # Doors and Entities
+    for door in room.info.doors:
+        out += STBDoor.pack(door[0] - 1, door[1] - 1, door[2])
+
+    numEnts = 0
+    for stack, x, y in room.spawns():
+        numEnts += 1
+        out += STBStack.pack(x - 1, y - 1, len(stack))
+        for entity in stack:
+            out += STBEntity.pack(entity[0], entity[1], entity[2], entity[3])
+
+    room.encoded = (len(room.info.doors), numEnts, bytes(out))
+    return room.encoded
+
+def appendSTB(path, snapshot):
+    '''Adds a room snapshot onto the end of an existing STB file without decoding the rooms already in it'''
+
+    with open(path, 'rb') as f:
+        data = f.read(STBHeader.size)
+
+    # an empty file has no rooms to keep
+    if not data:
+        stb = packSTB(snapshot)
+        writeFileAtomic(path, lambda f: f.write(stb))
+        return
+
+    if len(data) < STBHeader.size or not data.startswith(b'STB1'):
+        raise ValueError(f'{path} is not an STB file')
+    header, count = STBHeader.unpack(data)
+
+    def write(f):
+        with open(path, 'rb') as old:
+            shutil.copyfileobj(old, f)
+
+        f.write(packRooms(snapshot))
+
+        f.seek(0)
+        f.write(STBHeader.pack(header, count + len(snapshot)))
+
+    writeFileAtomic(path, write)
+
+def writeFileAtomic(path, write):
+    '''Has write fill in a temp file next to path, then swaps it in once it's safely on disk,
+    so a failure partway through leaves whatever was at path untouched. Mappings of path
+    have to be released beforehand (see releaseSTB)'''
+
+    fd, tempPath = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'r+b') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # temp files are only readable by their owner, match what a plain open would have done
+        if os.path.exists(path):
+            shutil.copymode(path, tempPath)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tempPath, 0o666 & ~umask)
+
+        os.replace(tempPath, path)
+    except:
+        os.remove(tempPath)
+        raise
+
+########################
+#      TXT Files       #
+########################
+
+# HA HA HA FUNNY MODE FUNNY MODE
+def readTXTRooms(text):
+    '''Parses rooms from the text format, see the comments below for the layout'''
+
+    text = text.splitlines()
+    numLines = len(text)
+
+    def skipWS(i):
+        for j in range(i, numLines):
+            if text[j]: return j
+        return numLines
+
+    entMap = {}
+
+    # Initial section: entity definitions
+    # [Character]=[type].[variant].[subtype]
+    # one per line, continues until it hits a line starting with ---
+    roomBegin = 0
+    for i in range(numLines):
+        line = text[i]
+        line = re.sub(r'\s', '', line)
+        roomBegin = i
+
+        if line.startswith('---'): break
+        if not line: continue
+
+        char, t, v, s = re.findall(r'(.)=(\d+).(\d+).(\d+)', line)[0]
+
+        if char in [ '-', '|' ]:
+            print("Can't use - or | for entities!")
+            continue
+
+        t = int(t)
+        v = int(v)
+        s = int(s)
+        en = entityRegistry.find(t, v, s)
+        if en == None or en.get('Invalid') == '1':
+            print(f"Invalid entity for character '{char}': '{en is None and 'UNKNOWN' or en.get('Name')}'! ({t}.{v}.{s})")
+            continue
+
+        entMap[char] = [ t, v, s, 0 ]
+
+    shapeNames = {
+        '1x1': 1,
+        '2x2': 8,
+        'closet': 2,
+        'vertcloset': 3,
+        '1x2': 4,
+        'long': 7,
+        'longvert': 5,
+        '2x1': 6,
+        'l': 10,
+        'mirrorl': 9,
+        'r': 12,
+        'mirrorr': 11
+    }
+
+    ret = []
+
+    # Main section: room definitions
+    # First line: [id]: [name]
+    # Second line, in no particular order: [Weight,] [Shape (within tolerance),] [Difficulty,] [Type[=1],] [Subtype[=0],]
+    # Next [room height] lines: room layout
+    # horizontal walls are indicated with -, vertical with |
+    #   there will be no validation for this, but if lines are the wrong length it prints an error message and skips the line
+    # coordinates to entities are 1:1, entity ids can be at most 1 char
+    # place xs at door positions to turn them off
+    roomBegin += 1
+    while roomBegin < numLines:
+        # 2 lines
+        i = skipWS(roomBegin)
+        if i == numLines: break
+
+        id, name = text[i].split(':', 1)
+        name = name.strip()
+        id = int(id)
+
+        infoParts = re.sub(r'\s', '', text[i+1]).lower().split(',')
+        shape = 1
+        difficulty = 5
+        weight = 1
+        rtype = 1
+        rsubtype = 0
+        for part in infoParts:
+            prop, val = re.findall(r'(.+)=(.+)', part)[0]
+            if prop == 'shape': shape = shapeNames.get(val) or int(val)
+            elif prop == 'difficulty': difficulty = shapeNames.get(val) or int(val)
+            elif prop == 'weight': weight = float(val)
+            elif prop == 'type': rtype = int(val)
+            elif prop == 'subtype': rsubtype = int(val)
+
+        r = Room(name, None, difficulty, weight, rtype, id, rsubtype, shape)
+        width, height = r.info.dims
+        spawns = r.gridSpawns
+
+        i = skipWS(i + 2)
+        for j in range(i, i + height):
+            if j == numLines:
+                print('Could not finish room!')
+                break
+
+            y = j - i
+            row = text[j]
+            for x in range(len(row)):
+                char = row[x]
+                if char in [ '-', '|', ' ' ]:
+                    continue
+                if char.lower() == 'x':
+                    changed = False
+                    for door in r.info.doors:
+                        if door[0] == x and door[1] == y:
+                            door[2] = False
+                            changed = True
+                    if changed: continue
+
+                ent = entMap.get(char)
+                if ent:
+                    spawns[Room.Info.gridIndex(x,y,width)].append(ent[:])
+                else:
+                    print(f"Unknown entity! '{char}'")
+
+        r.updateSpawnInfo()
+        ret.append(r)
+
+        i = skipWS(i + height)
+        if i == numLines: break
+
+        if not text[i].strip().startswith('---'):
+            print('Could not find separator after room!')
+            break
+
+        roomBegin = i + 1
+
+    return ret
@@ -14,6 +14,11 @@ if os.path.exists('dist'):
 # IMPORTANT - Read this
 print ("Run with 'python3.5 mac_setup.py py2app -A --packages=PyQt5' if you're having troubles.")
 
+# Pack the entity images so the bundled resources include the atlas
+# atlas_build reads and writes images through PyQt5's QImage, so PyQt5 has to be installed in the Python running this build
+import atlas_build
+atlas_build.buildAtlas()
+
 setup(
 	name="Basement Renovator",
 	version="0.1",
@@ -0,0 +1,91 @@
+'''
+Loads a small mod through the editor's mod loader, with and without the mod cache
+
+    python -m unittest discover tests
+'''
+import os, sys, shutil, tempfile, unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from PyQt5.QtCore import QSettings
+from PyQt5.QtGui import QImage
+from PyQt5.QtWidgets import QApplication
+
+import BasementRenovator as BR
+
+Files = {
+    'metadata.xml': '<metadata><name>Test Mod</name></metadata>',
+    'content/entities2.xml': '''<entities anm2root="gfx/">
+<entity id="601" variant="0" name="Mod Thing" anm2path="a.anm2" baseHP="5"/>
+<entity id="601" variant="1" subtype="2" name="Mod Boss" anm2path="a.anm2" boss="1"/>
+</entities>''',
+    'basementrenovator/EntitiesMod.xml': '''<data>
+<entity ID="601" Variant="0" Subtype="0" Name="Mod Thing" Kind="Enemies" Image="icon.png"/>
+<entity ID="601" Variant="1" Subtype="2" Name="Mod Boss" Kind="Bosses" Group="Mod Bosses" Image="icon.png"/>
+</data>''',
+    'basementrenovator/StagesMod.xml': '<data><stage Name="Mod Stage" Stage="1" StageType="5" BGPrefix="bg" Pattern="modstage"/></data>'
+}
+
+class ModLoadTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+        cls.cwd = os.getcwd()
+        os.chdir(root)
+
+        cls.temp = tempfile.mkdtemp()
+        modPath = os.path.join(cls.temp, 'mods', 'testmod')
+        for name, text in Files.items():
+            path = os.path.join(modPath, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(text)
+
+        icon = QImage(16, 16, QImage.Format_ARGB32)
+        icon.fill(0xffff0000)
+        icon.save(os.path.join(modPath, 'basementrenovator', 'icon.png'))
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.temp)
+
+    def loadMods(self, disableCache):
+        # the mod cache goes next to the settings file
+        BR.settings = QSettings(os.path.join(self.temp, 'settings.ini'), QSettings.IniFormat)
+        BR.settings.setValue('ModsFolder', os.path.join(self.temp, 'mods'))
+        BR.settings.setValue('DisableModCache', disableCache and '1' or '0')
+
+        BR.entityXML = BR.getEntityXML()
+        BR.stageXML = BR.getStageXML()
+        BR.entityRegistry = BR.EntityRegistry(BR.entityXML)
+
+        BR.loadMods(False, '', '')
+
+        ents = [ dict(en.attrib) for en in BR.entityRegistry.ofGroup('(Mod) Test Mod') + BR.entityRegistry.ofGroup('Mod Bosses') ]
+        stages = [ dict(stage.attrib) for stage in BR.stageXML if stage.get('Name') == 'Mod Stage' ]
+        return ents, stages
+
+    def test_cache_disabled(self):
+        ents, stages = self.loadMods(True)
+
+        self.assertEqual([ en['Name'] for en in ents ], [ 'Mod Thing', 'Mod Boss' ])
+        self.assertEqual([ en['Group'] for en in ents ], [ '(Mod) Test Mod', 'Mod Bosses' ])
+        self.assertTrue(all(os.path.isfile(en['Image']) for en in ents))
+        self.assertEqual(len(stages), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.temp, 'modcache.sqlite')))
+
+    def test_cache_matches_xml(self):
+        uncached = self.loadMods(True)
+
+        # the first load fills the cache, the second reads from it
+        self.assertEqual(self.loadMods(False), uncached)
+        self.assertTrue(os.path.exists(os.path.join(self.temp, 'modcache.sqlite')))
+        self.assertEqual(self.loadMods(False), uncached)
+
+if __name__ == '__main__':
+    unittest.main()
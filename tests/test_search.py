@@ -0,0 +1,54 @@
+'''
+Checks the entity palette's search over the base game's entities
+
+    python -m unittest discover tests
+'''
+import os, sys, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import brcore
+
+class EntitySearchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        brcore.loadData(os.path.join(root, 'resources'))
+        cls.ents = brcore.entityXML.findall('entity')
+        cls.search = brcore.EntitySearch(cls.ents)
+
+    def keys(self, query):
+        return { brcore.EntityRegistry.getKey(en) for en in self.search.search(query) }
+
+    def test_numbers_match_whole_parts(self):
+        for query in [ '10', '10.' ]:
+            keys = self.keys(query)
+            self.assertTrue(keys)
+            self.assertTrue(all(key[0] == 10 for key in keys), query)
+
+        self.assertTrue(all(key[:2] == (10, 1) for key in self.keys('10.1')))
+        self.assertEqual(self.keys('1000'), { (1000, 0, 0) })
+
+    def test_short_queries_match_word_starts(self):
+        for en in self.search.search('a'):
+            words = [ word for attr, weight in brcore.EntitySearch.Fields for word in brcore.EntitySearch.words(en.get(attr)) ]
+            self.assertTrue(any(word.startswith('a') for word in words), en.get('Name'))
+
+    def test_typos(self):
+        names = [ en.get('Name') for en in self.search.search('gpaer') ]
+        self.assertIn('Gaper', names[:3])
+
+    def test_ungrouped(self):
+        # the palette tabs only have entities with a group, the search has the rest too
+        names = [ en.get('Name') for en in self.search.search('blood tear') ]
+        self.assertEqual(names[0], 'Blood Tear')
+        self.assertIn("Mega Satan's Right Hand", [ en.get('Name') for en in self.search.search('mega satan hand') ])
+
+    def test_every_word(self):
+        names = [ en.get('Name') for en in self.search.search('attack fly') ]
+        self.assertEqual(names[0], 'Attack Fly')
+        self.assertTrue(all('Fly' in name for name in names))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+'''
+Checks the STB codec in brcore against the writer it replaced, which lived in MainWindow.save
+
+    python -m unittest discover tests
+'''
+import os, struct, sys, tempfile, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import brcore
+from brcore import Room
+
+def encodeOld(rooms):
+    '''MainWindow.save from before the codec was split out, minus the file writing'''
+
+    headerPacker = struct.Struct('<4sI')
+    roomBegPacker = struct.Struct('<IIIBH')
+    roomEndPacker = struct.Struct('<fBBB')
+    doorHeaderPacker = struct.Struct('<BH')
+    doorPacker = struct.Struct('<hh?')
+    stackPacker = struct.Struct('<hhB')
+    entPacker = struct.Struct('<HHHf')
+
+    totalBytes = headerPacker.size
+    totalBytes += len(rooms) * (roomBegPacker.size + roomEndPacker.size)
+    for room in rooms:
+        totalBytes += len(room.name)
+        totalBytes += doorHeaderPacker.size + doorPacker.size * len(room.info.doors)
+        totalBytes += room.getSpawnCount() * stackPacker.size
+        for stack, x, y in room.spawns():
+            totalBytes += len(stack) * entPacker.size
+
+    out = bytearray(totalBytes)
+    off = 0
+    headerPacker.pack_into(out, off, "STB1".encode(), len(rooms))
+    off += headerPacker.size
+
+    for room in rooms:
+        width, height = room.info.dims
+        roomBegPacker.pack_into(out, off, room.info.type, room.info.variant, room.info.subtype, room.difficulty, len(room.name))
+        off += roomBegPacker.size
+        nameLen = len(room.name)
+        struct.pack_into(f'<{nameLen}s', out, off, room.name.encode())
+        off += nameLen
+        roomEndPacker.pack_into(out, off, room.weight, width - 2, height - 2, room.info.shape)
+        off += roomEndPacker.size
+
+        # Doors and Entities
+        doorHeaderPacker.pack_into(out, off, len(room.info.doors), room.getSpawnCount())
+        off += doorHeaderPacker.size
+
+        for door in room.info.doors:
+            doorPacker.pack_into(out, off, door[0] - 1, door[1] - 1, door[2])
+            off += doorPacker.size
+
+        for stack, x, y in room.spawns():
+            numEnts = len(stack)
+            stackPacker.pack_into(out, off, x - 1, y - 1, numEnts)
+            off += stackPacker.size
+
+            for entity in stack:
+                entPacker.pack_into(out, off, entity[0], entity[1], entity[2], entity[3])
+                off += entPacker.size
+
+    return bytes(out)
+
+def makeRoom(name, shape=1, variant=0, doors=None, spawns=()):
+    '''spawns is a list of (x, y, [ [ type, variant, subtype, weight ] ])'''
+    room = Room(name, None, 5, 1.5, 1, variant, 0, shape)
+
+    width = room.info.dims[0]
+    for x, y, stack in spawns:
+        room.gridSpawns[Room.Info.gridIndex(x, y, width)] = stack
+    room.updateSpawnInfo()
+
+    # setContents doesn't take an empty door list, it means the shape's doors there
+    if doors is not None:
+        room.info.doors = doors
+        room.encoded = None
+
+    return room
+
+def makeRooms():
+    return [
+        makeRoom('Empty'),
+        makeRoom('Gapers', variant=1, spawns=[
+            (1, 1, [ [ 10, 0, 0, 1.0 ] ]),
+            (5, 3, [ [ 10, 0, 0, 0.5 ], [ 10, 1, 0, 0.5 ] ]),
+            (13, 7, [ [ 1000, 0, 0, 1.0 ] ])
+        ]),
+        makeRoom('Closed Doors', variant=2, doors=[ [ 7, 0, False ], [ 0, 4, True ], [ 14, 4, False ], [ 7, 8, True ] ], spawns=[
+            (7, 4, [ [ 5, 100, 0, 1.0 ] ])
+        ]),
+        makeRoom('No Doors', variant=3, doors=[], spawns=[
+            (2, 2, [ [ 1000, 0, 0, 1.0 ] ])
+        ]),
+        makeRoom('Big', shape=8, variant=4, spawns=[
+            (1, 1, [ [ 10, 0, 0, 1.0 ] ]),
+            (26, 14, [ [ 1000, 0, 0, 1.0 ] ])
+        ]),
+        makeRoom('L Room', shape=9, variant=5, spawns=[
+            (20, 12, [ [ 1000, 0, 0, 1.0 ] ])
+        ])
+    ]
+
+class STBTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        brcore.loadData(os.path.join(root, 'resources'))
+
+    def assertSameRooms(self, a, b):
+        self.assertEqual(len(a), len(b))
+        for ra, rb in zip(a, b):
+            self.assertEqual(ra.name, rb.name)
+            self.assertEqual((ra.info.type, ra.info.variant, ra.info.subtype, ra.info.shape),
+                             (rb.info.type, rb.info.variant, rb.info.subtype, rb.info.shape))
+            self.assertEqual((ra.difficulty, ra.weight), (rb.difficulty, rb.weight))
+            self.assertEqual(ra.info.doors, rb.info.doors)
+            self.assertEqual(list(ra.spawns()), list(rb.spawns()))
+
+    def test_matches_old_encoder(self):
+        rooms = makeRooms()
+        self.assertEqual(brcore.encodeSTB(rooms), encodeOld(rooms))
+
+    def test_decode_encode(self):
+        rooms = makeRooms()
+        rooms = [ room for room in rooms if room.info.doors ]
+        stb = brcore.encodeSTB(rooms)
+
+        # rooms that were never decoded, rooms that were, and rooms encoded again from scratch
+        read = brcore.readSTBRooms(stb)
+        self.assertEqual(brcore.encodeSTB(read), stb)
+
+        brcore.decodeRoomBodies(read)
+        self.assertSameRooms(read, rooms)
+        self.assertEqual(brcore.encodeSTB(read), stb)
+
+        for room in read:
+            room.encoded = None
+        self.assertEqual(brcore.encodeSTB(read), stb)
+        self.assertEqual(encodeOld(read), stb)
+
+    def test_no_doors(self):
+        # rooms saved without doors get their shape's doors once they're read back in,
+        # and should save that way whether they were decoded first or not
+        stb = brcore.encodeSTB([ room for room in makeRooms() if not room.info.doors ])
+
+        undecoded = brcore.readSTBRooms(stb)
+        decoded = brcore.readSTBRooms(stb)
+        brcore.decodeRoomBodies(decoded)
+
+        self.assertEqual(decoded[0].info.doors, decoded[0].info.shapeData['Doors'])
+        self.assertEqual(brcore.encodeSTB(undecoded), encodeOld(decoded))
+        self.assertEqual(brcore.encodeSTB(decoded), encodeOld(decoded))
+
+    def test_non_ascii_names(self):
+        # the old writer stored the name's length in characters instead of bytes, cutting these short
+        rooms = [ makeRoom('Café'), makeRoom('ボス部屋', variant=1, spawns=[ (3, 3, [ [ 10, 0, 0, 1.0 ] ]) ]) ]
+        stb = brcore.encodeSTB(rooms)
+
+        read = brcore.readSTBRooms(stb)
+        self.assertEqual([ room.name for room in read ], [ 'Café', 'ボス部屋' ])
+        self.assertEqual(brcore.encodeSTB(read), stb)
+
+        brcore.decodeRoomBodies(read)
+        self.assertSameRooms(read, rooms)
+        for room in read:
+            room.encoded = None
+        self.assertEqual(brcore.encodeSTB(read), stb)
+
+    def test_append(self):
+        rooms = makeRooms()
+        with tempfile.TemporaryDirectory() as temp:
+            path = os.path.join(temp, 'rooms.stb')
+
+            # an empty file is just written over
+            open(path, 'wb').close()
+            brcore.appendSTB(path, brcore.snapshotRooms(rooms[:2]))
+            brcore.appendSTB(path, brcore.snapshotRooms(rooms[2:]))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), brcore.encodeSTB(rooms))
+
+            for contents in [ b'STB', b'STB0' + bytes(4), b'\xff' * 16 ]:
+                with open(path, 'wb') as f:
+                    f.write(contents)
+
+                with self.assertRaisesRegex(ValueError, 'not an STB file'):
+                    brcore.appendSTB(path, brcore.snapshotRooms(rooms))
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.read(), contents)
+
+if __name__ == '__main__':
+    unittest.main()
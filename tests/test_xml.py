@@ -0,0 +1,49 @@
+'''
+Checks the compiled copies loadXML keeps of the entity and stage xml
+
+    python -m unittest discover tests
+'''
+import os, sys, shutil, tempfile, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import brcore
+
+def dump(el):
+    return (el.tag, el.attrib, [ (child.tag, child.attrib) for child in el ])
+
+class CompiledXMLTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp, 'Entities.xml')
+        shutil.copy(os.path.join(root, 'resources', 'EntitiesAfterbirthPlus.xml'), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def test_compiled_matches_xml(self):
+        parsed = brcore.loadXML(self.path)
+        self.assertTrue(os.path.isfile(self.path + '.compiled'))
+        self.assertEqual(dump(brcore.loadXML(self.path)), dump(parsed))
+
+    def test_edited_xml(self):
+        brcore.loadXML(self.path)
+
+        with open(self.path, 'w') as f:
+            f.write('<data><entity ID="1" Variant="0" Subtype="0" Name="Only"/></data>')
+
+        self.assertEqual([ en.get('Name') for en in brcore.loadXML(self.path) ], [ 'Only' ])
+        self.assertEqual([ en.get('Name') for en in brcore.loadXML(self.path) ], [ 'Only' ])
+
+    def test_bad_compiled_file(self):
+        # files from other versions, or anything else, are compiled again rather than loaded
+        for contents in [ b'', b'junk', b'\x80\x04\x95' + bytes(64) ]:
+            with open(self.path + '.compiled', 'wb') as f:
+                f.write(contents)
+
+            self.assertEqual(dump(brcore.loadXML(self.path)), dump(brcore.ET.parse(self.path).getroot()))
+
+if __name__ == '__main__':
+    unittest.main()
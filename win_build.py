@@ -6,6 +6,11 @@ sys.argv.append('py2exe')
 if os.path.exists('dist'):
 	shutil.rmtree('dist')
 
+# Pack the entity images so the bundled resources include the atlas
+# atlas_build reads and writes images through PyQt5's QImage, so PyQt5 has to be installed in the Python running this build
+import atlas_build
+atlas_build.buildAtlas()
+
 setup(
 	name="Basement Renovator",
 	version="0.1",